@@ -0,0 +1,97 @@
+# app/background_task.py
+
+'''
+Фоновая задача для долгих операций (импорт/экспорт), чтобы окно не "зависало".
+Рабочий поток перебирает генератор job() и кладет его результаты в ограниченную очередь,
+а поток Tk забирает их по таймеру root.after и вызывает обработчики (on_result, on_progress, on_done, on_error).
+Менять state и виджеты можно только в обработчиках: они всегда выполняются в потоке Tk.
+Очередь ограничена по длине - если интерфейс не успевает, рабочий поток ждет, и память не растет.
+'''
+
+import queue
+import threading
+import time
+
+class BackgroundTask:
+    def __init__(self, root, job, on_result, on_progress=None, on_done=None, on_error=None,
+                 poll_ms=30, max_queue=4, frame_budget=0.03):
+        self.root = root
+        # job() -> генератор пар (прогресс 0..1, результат)
+        self.job = job
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.on_done = on_done        # on_done(cancelled)
+        self.on_error = on_error      # on_error(исключение)
+        self.poll_ms = poll_ms
+        self.frame_budget = frame_budget  # Сколько секунд за один тик Tk можно тратить на обработку результатов
+
+        self.cancel_event = threading.Event()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._finished = False
+
+    def start(self):
+        self._thread.start()
+        self.root.after(self.poll_ms, self._poll)
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    # --- РАБОЧИЙ ПОТОК ---
+
+    def _put(self, item):
+        # Ждем места в очереди, но не дольше, чем до отмены
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self.cancelled and item[0] == 'result':
+                    return False
+
+    def _run(self):
+        results = self.job()
+        try:
+            for progress, result in results:
+                if self.cancelled: break
+                if not self._put(('result', progress, result)): break
+        except Exception as e:
+            self._put(('error', e))
+            return
+        finally:
+            # Закрываем генератор сразу (например, чтобы освободить открытый файл)
+            results.close()
+        self._put(('done', None))
+
+    # --- ПОТОК TK ---
+
+    def _poll(self):
+        deadline = time.perf_counter() + self.frame_budget
+        while time.perf_counter() < deadline:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = item[0]
+            if kind == 'result':
+                # После отмены оставшиеся результаты просто выбрасываем
+                if self.cancelled: continue
+                _, progress, result = item
+                self.on_result(result)
+                if self.on_progress: self.on_progress(progress)
+            elif kind == 'error':
+                self._finished = True
+                if self.on_error: self.on_error(item[1])
+                return
+            else:
+                self._finished = True
+                if self.on_done: self.on_done(self.cancelled)
+                return
+
+        self.root.after(self.poll_ms, self._poll)
@@ -7,13 +7,31 @@
 '''
 
 import tkinter as tk
-from tkinter import messagebox, colorchooser
+from tkinter import messagebox, colorchooser, filedialog
 import math
+import os
+from array import array
 from logic.geometry import Point, Segment
 from logic.converter import CoordinateConverter
 from ui.renderer import Renderer
 from logic.styles import GOST_STYLES
 from ui.style_manager import StyleManagerWindow
+from app.redraw_scheduler import RedrawScheduler
+from logic.history import AddSegments, RemoveSegments, ChangeAttributes, DeleteStyle
+from logic.selection import ids_in_screen_rect
+from logic.snapping import SnapEngine, SNAP_TOLERANCE_PX
+from logic.drawing_file import save_drawing, load_drawing, DrawingFileError, FILE_EXTENSION
+from logic.dxf_import import read_dxf_segments, DxfImportError
+from logic.exporters import export_dxf, export_svg
+from app.background_task import BackgroundTask
+from app.profiler import FrameProfiler
+from ui.progress_dialog import ProgressDialog
+
+# Сколько пикселей нужно протащить мышь, чтобы щелчок стал рамкой выделения
+BAND_MIN_DRAG_PX = 4
+
+# Пауза между порциями раскладки пространственного индекса (мс): события ввода успевают обработаться между ними
+INDEX_BUILD_DELAY_MS = 1
 
 class Callbacks:
     def __init__(self, root, state, view):
@@ -27,9 +45,36 @@ class Callbacks:
         self._drag_start_x = 0
         self._drag_start_y = 0
 
+        # Последние мировые координаты курсора (выводятся в строке состояния) и его экранная позиция
+        self._mouse_world = None
+        self._mouse_screen = None
+
+        # Объектная привязка при построении отрезков
+        self.snapper = SnapEngine(state)
+
+        # Выделение рамкой: экранная точка начала и элемент холста с рамкой
+        self._band_start = None
+        self._band_item = None
+
+        # Перерисовка откладывается и схлопывается до одной за кадр
+        self.scheduler = RedrawScheduler(root, {
+            'info': self.update_info_panel,
+            'canvas': self._render_canvas,
+            'snap': self._update_snap,
+            'status': self.update_status_bar,
+        }, fps=self.state.max_fps)
+
+        # Отложенный шаг раскладки пространственного индекса (id таймера root.after или None)
+        self._index_build_job = None
+
+        # Профилировщик кадров; подключается к планировщику и рендереру только при включении (меню "Вид")
+        self.profiler = FrameProfiler()
+
     def initialize_view(self):
         self.converter = CoordinateConverter(self.state, self.view.canvas)
         self.renderer = Renderer(self.view.canvas, self.state, self.converter)
+        # Число элементов - из списка команд последнего кадра рендерера, без обхода всего холста
+        self.profiler.item_counter = lambda: len(self.renderer.display_list or ())
         
         self.view.canvas.config(background=self.state.bg_color)
         self.view.bg_swatch.config(background=self.state.bg_color)
@@ -60,6 +105,7 @@ class Callbacks:
                 entry.delete(0, tk.END)
                 entry.config(state=entry_state)
             self.state.preview_segment = None
+            self.state.snap_point = None
             self.state.active_p1 = None
             self.state.active_p2 = None
 
@@ -86,8 +132,10 @@ class Callbacks:
             self.view.canvas.config(cursor="fleur")
 
         else:
-            # В режиме IDLE работает выделение
-            self.view.canvas.bind("<Button-1>", self.on_selection_click)
+            # В режиме IDLE работает выделение: щелчок или рамка
+            self.view.canvas.bind("<Button-1>", self.on_selection_press)
+            self.view.canvas.bind("<B1-Motion>", self.on_selection_drag)
+            self.view.canvas.bind("<ButtonRelease-1>", self.on_selection_release)
             self.view.canvas.config(cursor="arrow")
         
         self.redraw_all()
@@ -99,35 +147,72 @@ class Callbacks:
         hit_threshold_pixels = 8 
         hit_threshold_world = hit_threshold_pixels / self.state.zoom
         
-        found_segment = None
-        for segment in self.state.segments:
-            dist = segment.distance_to_point(wx, wy)
-            if dist < hit_threshold_world:
-                found_segment = segment
-                break 
+        # Проверяем только отрезки рядом с курсором и берем ближайший из них
+        found_segment = self.state.find_nearest_segment(wx, wy, hit_threshold_world)
         
         # Проверка нажатия Ctrl (бит 0x0004)
         ctrl_pressed = (event.state & 0x0004)
         
         if found_segment:
             if ctrl_pressed:
-                # Если Ctrl зажат - добавляем или убираем из списка
-                if found_segment in self.state.selected_segments:
-                    self.state.selected_segments.remove(found_segment)
-                else:
-                    self.state.selected_segments.append(found_segment)
+                # Если Ctrl зажат - добавляем или убираем из выделения
+                self.state.selected_segments.toggle(found_segment)
             else:
                 # Если Ctrl НЕ зажат - выбираем только этот (сброс остальных)
-                self.state.selected_segments = [found_segment]
+                self.state.selected_segments.replace([found_segment.id])
         else:
             # Если клик в пустоту и Ctrl НЕ зажат - сбрасываем всё
             if not ctrl_pressed:
-                self.state.selected_segments = []
+                self.state.selected_segments.clear()
         
         # Синхронизируем UI (список стилей, превью) с тем, что мы выделили
         self._sync_ui_with_selection()
         self.redraw_all()
 
+    # --- ВЫДЕЛЕНИЕ РАМКОЙ ---
+    # Рамка слева направо - "окно" (только целиком внутри), справа налево - "секущая" (все, что касается)
+
+    def on_selection_press(self, event):
+        self._band_start = (event.x, event.y)
+        self._band_item = None
+
+    def on_selection_drag(self, event):
+        if self._band_start is None: return
+        x0, y0 = self._band_start
+        canvas = self.view.canvas
+        if self._band_item is None:
+            # Мелкое дрожание руки при щелчке рамкой не считаем
+            if abs(event.x - x0) < BAND_MIN_DRAG_PX and abs(event.y - y0) < BAND_MIN_DRAG_PX:
+                return
+            self._band_item = canvas.create_rectangle(x0, y0, x0, y0, tags=('band',))
+
+        crossing = event.x < x0
+        canvas.coords(self._band_item, x0, y0, event.x, event.y)
+        canvas.itemconfig(self._band_item, outline='green' if crossing else 'blue', dash=(4, 2) if crossing else '')
+        canvas.tag_raise(self._band_item)
+
+    def on_selection_release(self, event):
+        start, self._band_start = self._band_start, None
+        if start is None: return
+        if self._band_item is None:
+            # Рамки не было - это обычный щелчок
+            self.on_selection_click(event)
+            return
+
+        self.view.canvas.delete(self._band_item)
+        self._band_item = None
+        x0, y0 = start
+        seg_ids = ids_in_screen_rect(self.state.segments, self.state.spatial_index, self.converter.get_transform(),
+                                     x0, y0, event.x, event.y, crossing=event.x < x0)
+        # С Ctrl рамка добавляет к выделению, без него - заменяет его
+        if event.state & 0x0004:
+            self.state.selected_segments.update(seg_ids)
+        else:
+            self.state.selected_segments.replace(seg_ids)
+
+        self._sync_ui_with_selection()
+        self.redraw_all()
+
     def _sync_ui_with_selection(self):
         """Обновляет панель свойств в зависимости от выделения."""
         sel = self.state.selected_segments
@@ -141,7 +226,7 @@ class Callbacks:
             return
 
         # Собираем все уникальные стили выделенных объектов
-        unique_styles = {seg.style_name for seg in sel}
+        unique_styles = sel.style_names()
         
         if len(unique_styles) == 1:
             # Все объекты одного стиля
@@ -149,7 +234,7 @@ class Callbacks:
             self.view.set_style_selection(style_name)
             
             # Цвет (берем у первого)
-            first_color = sel[0].color
+            first_color = sel.first().color
             self.view.segment_swatch.config(bg=first_color)
             
             # Обновляем глобальное состояние, чтобы новые линии рисовались так же
@@ -163,9 +248,9 @@ class Callbacks:
 
     def on_style_selected(self, event=None):
         # Получаем индекс выбранного элемента
-        idx = self.view.style_combobox.current()
+        idx = self.view.style_index
         
-        # Если индекс -1, значит ничего не выбрано или текст введен вручную (например "Разные")
+        # Если индекс -1, значит ничего не выбрано (например, показано "Разные")
         if idx == -1:
             return 
 
@@ -178,8 +263,7 @@ class Callbacks:
         self.state.current_style_name = new_style_name
         
         if self.state.selected_segments:
-            for seg in self.state.selected_segments:
-                seg.style_name = new_style_name
+            self._change_selection_attribute('style', new_style_name)
             self._sync_ui_with_selection()
         else:
             self.view.update_style_preview(new_style_name)
@@ -207,7 +291,7 @@ class Callbacks:
             )
         except (ValueError, tk.TclError):
             self.state.preview_segment = None
-        self.redraw_all()
+        self.request_redraw('info', 'canvas')
 
     def finalize_segment(self, event=None):
         if self.state.preview_segment:
@@ -217,7 +301,8 @@ class Callbacks:
                 style_name=self.state.current_style_name,
                 color=self.state.current_color
             )
-            self.state.segments.append(final_segment)
+            segment = self.state.add_segment(final_segment)
+            self.state.history.push(AddSegments([segment.id]))
             self.set_app_state('IDLE')
 
     def on_escape_key(self, event=None):
@@ -225,7 +310,7 @@ class Callbacks:
             self.set_app_state('IDLE')
         elif self.state.selected_segments:
             # Если есть выделение - снимаем его
-            self.state.selected_segments = []
+            self.state.selected_segments.clear()
             self._sync_ui_with_selection()
             self.redraw_all()
         elif self.state.app_mode == 'IDLE' and messagebox.askyesno("Выход", "Выйти из программы?"): 
@@ -233,12 +318,15 @@ class Callbacks:
 
     def on_delete_segment(self, event=None):
         if self.state.selected_segments:
-            for seg in self.state.selected_segments:
-                if seg in self.state.segments:
-                    self.state.segments.remove(seg)
-            self.state.selected_segments = []
+            seg_ids = list(self.state.selected_segments.ids())
+            self.state.selected_segments.clear()
         elif self.state.segments:
-            self.state.segments.pop()
+            seg_ids = [self.state.segments.last_id()]
+        else:
+            seg_ids = []
+
+        if seg_ids:
+            self.state.history.execute(self.state, RemoveSegments(self.state.segments, seg_ids))
         
         self._sync_ui_with_selection()
         self.redraw_all()
@@ -248,9 +336,18 @@ class Callbacks:
             new_step = int(self.view.grid_step_var.get())
             if new_step <= 0: raise ValueError
             self.state.grid_step = new_step
-            self.redraw_all()
+            self.request_redraw('canvas')
         except ValueError: messagebox.showerror("Ошибка", "Шаг сетки должен быть > 0")
 
+    def on_apply_history_budget(self):
+        try:
+            budget_mb = int(self.view.history_budget_var.get())
+            if budget_mb <= 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Ошибка", "Память истории должна быть целым числом МБ > 0")
+            return
+        self.state.set_history_budget(budget_mb)
+
     def on_coord_system_change(self):
         new_system = self.view.coord_system.get()
         self.view.p2_label1.config(text="R₂:" if new_system == 'polar' else "X₂:")
@@ -272,7 +369,7 @@ class Callbacks:
         self.redraw_all()
 
     def on_lmb_click(self, event):
-        wx, wy = self.converter.screen_to_world(event.x, event.y)
+        wx, wy = self._snapped_world(event.x, event.y)
         if self.state.points_clicked == 0:
             self._update_p1_entries(wx, wy)
             self.state.points_clicked = 1
@@ -297,7 +394,7 @@ class Callbacks:
         dx, dy = event.x - self._drag_start_x, event.y - self._drag_start_y
         self.state.pan_x += dx; self.state.pan_y += dy
         self._drag_start_x, self._drag_start_y = event.x, event.y
-        self.redraw_all()
+        self.request_redraw('canvas', 'status')
 
     def _perform_zoom(self, factor, center_screen_x, center_screen_y):
         wx, wy = self.converter.screen_to_world(center_screen_x, center_screen_y)
@@ -305,19 +402,21 @@ class Callbacks:
         sx_new, sy_new = self.converter.world_to_screen(wx, wy)
         self.state.pan_x += center_screen_x - sx_new
         self.state.pan_y += center_screen_y - sy_new
-        self.redraw_all()
+        self.request_redraw('canvas', 'status')
 
     def on_mouse_wheel(self, event):
         factor = 1.2 if (hasattr(event, 'delta') and event.delta > 0) or event.num == 4 else 1/1.2
         self._perform_zoom(factor, event.x, event.y)
 
     def on_zoom_in(self, event=None):
-        cx, cy = self.view.canvas.winfo_width() / 2, self.view.canvas.winfo_height() / 2
+        w, h = self.converter.canvas_size()
+        cx, cy = w / 2, h / 2
         self._perform_zoom(1.2, cx, cy)
         self.view.canvas.focus_set()
 
     def on_zoom_out(self, event=None):
-        cx, cy = self.view.canvas.winfo_width() / 2, self.view.canvas.winfo_height() / 2
+        w, h = self.converter.canvas_size()
+        cx, cy = w / 2, h / 2
         self._perform_zoom(1/1.2, cx, cy)
         self.view.canvas.focus_set()
 
@@ -328,16 +427,14 @@ class Callbacks:
             self.redraw_all()
             self.view.canvas.focus_set()
             return
-        xs = [s.p1.x for s in self.state.segments] + [s.p2.x for s in self.state.segments]
-        ys = [s.p1.y for s in self.state.segments] + [s.p2.y for s in self.state.segments]
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
+        min_x, min_y, max_x, max_y = self.state.segments.bounds()
         world_w = max_x - min_x
         world_h = max_y - min_y
         center_wx = (min_x + max_x) / 2
         center_wy = (min_y + max_y) / 2
-        screen_w = self.view.canvas.winfo_width() * 0.9
-        screen_h = self.view.canvas.winfo_height() * 0.9
+        canvas_w, canvas_h = self.converter.canvas_size()
+        screen_w = canvas_w * 0.9
+        screen_h = canvas_h * 0.9
         if world_w == 0: world_w = 1
         if world_h == 0: world_h = 1
         scale_x = screen_w / world_w
@@ -362,12 +459,14 @@ class Callbacks:
             self.state.rotation = math.radians(target_deg)
         else:
             self.state.rotation += math.radians(angle_delta_deg)
-        self.redraw_all()
+        self.request_redraw('canvas', 'status')
         self.view.canvas.focus_set()
 
     def on_rotate_left(self, event=None): self.rotate_view(1, event)
     def on_rotate_right(self, event=None): self.rotate_view(-1, event)
-    def on_canvas_resize(self, event): self.redraw_all()
+    def on_canvas_resize(self, event):
+        self.converter.set_canvas_size(event.width, event.height)
+        self.request_redraw('canvas', 'status')
     
     def toggle_fullscreen(self, event=None):
         self.state.is_fullscreen = not self.state.is_fullscreen
@@ -381,15 +480,15 @@ class Callbacks:
 
     def on_choose_grid_color(self):
         _, c = colorchooser.askcolor(initialcolor=self.state.grid_color)
-        if c: self.state.grid_color = c; self.view.grid_swatch.config(bg=c); self.redraw_all()
+        if c: self.state.grid_color = c; self.view.grid_swatch.config(bg=c); self.request_redraw('canvas')
 
     def on_choose_segment_color(self):
         _, c = colorchooser.askcolor(initialcolor=self.state.current_color)
         if c: 
             self.state.current_color = c
             self.view.segment_swatch.config(bg=c)
-            for seg in self.state.selected_segments:
-                seg.color = c
+            if self.state.selected_segments:
+                self._change_selection_attribute('color', c)
             self.redraw_all()
 
     def _create_points_from_entries(self):
@@ -423,16 +522,28 @@ class Callbacks:
             if self.state.app_mode == 'IDLE': entry.config(state='disabled')
 
     def redraw_all(self):
-        self.update_info_panel()
-        self.update_status_bar()
+        """Помечает весь интерфейс к перерисовке (выполнится в ближайшем кадре)."""
+        self.scheduler.request()
+
+    def request_redraw(self, *parts):
+        """Помечает к перерисовке только указанные части: 'info', 'canvas', 'status'."""
+        self.scheduler.request(*parts)
+
+    def _render_canvas(self):
         if self.renderer:
             self.renderer.render_scene()
+            # Удаление самого длинного отрезка оставило индексу пересчет - доделываем его в простое
+            if self.state.spatial_index.building:
+                self.schedule_index_build()
+            # Часть цепочек штрихов не успела достроиться за кадр - достраиваем в следующем
+            if self.state.chains.deferred:
+                self.request_redraw('canvas')
     
     def update_info_panel(self):
         self.state.active_p1, self.state.active_p2 = None, None
 
         if self.state.selected_segments:
-            seg = self.state.selected_segments[0]
+            seg = self.state.selected_segments.first()
             self.state.active_p1, self.state.active_p2 = seg.p1, seg.p2
             self.view.p1_coord_var.set(f"P1({seg.p1.x:.2f}, {seg.p1.y:.2f})")
             self.view.p2_coord_var.set(f"P2({seg.p2.x:.2f}, {seg.p2.y:.2f})")
@@ -484,10 +595,43 @@ class Callbacks:
         self.view.canvas.focus_set()
 
     def on_mouse_move_stats(self, event):
-        wx, wy = self.converter.screen_to_world(event.x, event.y)
-        self.view.status_coords.config(text=f"X: {wx:.2f}  Y: {wy:.2f}")
+        self._mouse_screen = (event.x, event.y)
+        self._mouse_world = self.converter.screen_to_world(event.x, event.y)
+        if self.state.app_mode == 'CREATING_SEGMENT' or self.state.snap_point is not None:
+            # Привязка ищется один раз за кадр для последней позиции мыши
+            self.request_redraw('snap', 'status')
+        else:
+            self.request_redraw('status')
+
+    # --- ОБЪЕКТНАЯ ПРИВЯЗКА ---
+
+    def _find_snap(self, screen_x, screen_y):
+        if not self.state.snap_enabled or self.state.app_mode != 'CREATING_SEGMENT':
+            return None
+        wx, wy = self.converter.screen_to_world(screen_x, screen_y)
+        return self.snapper.snap(wx, wy, SNAP_TOLERANCE_PX / self.state.zoom)
+
+    def _snapped_world(self, screen_x, screen_y):
+        """Мировые координаты точки под курсором с учетом привязки."""
+        snap = self._find_snap(screen_x, screen_y)
+        if snap is not None:
+            return snap.x, snap.y
+        return self.converter.screen_to_world(screen_x, screen_y)
+
+    def _update_snap(self):
+        self.state.snap_point = self._find_snap(*self._mouse_screen) if self._mouse_screen else None
+        if self.renderer:
+            self.renderer.draw_snap_marker()
+
+    def on_toggle_snap(self, event=None):
+        self.state.snap_enabled = not self.state.snap_enabled
+        self.request_redraw('snap', 'status')
 
     def update_status_bar(self):
+        if self._mouse_world:
+            wx, wy = self._mouse_world
+            self.view.status_coords.config(text=f"X: {wx:.2f}  Y: {wy:.2f}")
+
         zoom_pct = int((self.state.zoom / 10.0) * 100)
         self.view.status_zoom.config(text=f"Zoom: {zoom_pct}%")
         deg = math.degrees(self.state.rotation)
@@ -498,19 +642,244 @@ class Callbacks:
         else:
             modes = {'IDLE': "Ожидание", 'CREATING_SEGMENT': "Создание отрезка", 'PANNING': "Панорамирование"}
             mode_text = modes.get(self.state.app_mode, self.state.app_mode)
+            if self.state.app_mode == 'CREATING_SEGMENT':
+                mode_text += " | привязка: " + ("вкл" if self.state.snap_enabled else "выкл")
         
         self.view.status_mode.config(text=f"Режим: {mode_text}")
 
+        if self.renderer:
+            r = self.renderer
+            self.view.status_render.config(
+                text=f"Отрезки: {r.drawn_count} (LOD -{r.skipped_count}, в {r.aggregate_cells} ячейках +{r.aggregated_count})"
+                     f" / отсечено {r.culled_count} | элементов за кадр: {r.submitted_count}")
+
+        if self.scheduler.profiler is not None:
+            self.view.status_profile.config(text=self.profiler.summary())
+
+    # --- ПРОФИЛИРОВАНИЕ ---
+
+    def on_toggle_profiler(self, event=None):
+        enabled = self.scheduler.profiler is None
+        profiler = self.profiler if enabled else None
+        if enabled: self.profiler.clear()
+        self.scheduler.profiler = profiler
+        if self.renderer: self.renderer.profiler = profiler
+        self.view.profiler_var.set(enabled)
+        self.view.show_profile_status(enabled)
+        self.redraw_all()
+
+    def on_dump_profile(self, event=None):
+        if not self.profiler.frames:
+            messagebox.showinfo("Профиль", "Нет записанных кадров: включите профилирование (меню \"Вид\").")
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Сохранить профиль кадров", defaultextension=".json",
+            filetypes=[("JSON", "*.json")])
+        if not path: return
+        try:
+            self.profiler.dump(path)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить профиль:\n{e}")
+
     def show_context_menu(self, event):
         if self.state.app_mode != 'CREATING_SEGMENT':
             self.view.context_menu.post(event.x_root, event.y_root)
         else:
             self.on_rmb_click(event)
 
+    # --- ВЫДЕЛЕНИЕ ПО СТИЛЮ / ЦВЕТУ ---
+
+    def on_select_by_style(self):
+        """Выделяет все отрезки стиля первого выделенного отрезка (без выделения - текущего стиля)."""
+        first = self.state.selected_segments.first()
+        style_name = first.style_name if first else self.state.current_style_name
+        self._select_ids(self.state.segments.ids_with_style(style_name))
+
+    def on_select_by_color(self):
+        """Выделяет все отрезки цвета первого выделенного отрезка (без выделения - текущего цвета)."""
+        first = self.state.selected_segments.first()
+        color = first.color if first else self.state.current_color
+        self._select_ids(self.state.segments.ids_with_color(color))
+
+    def _select_ids(self, seg_ids):
+        # Ответ берется из обратного индекса хранилища - без прохода по всему чертежу. Индекс отдает
+        # неупорядоченное множество, а порядок выделения виден (первый отрезок - в панели свойств), поэтому сортируем
+        if self.state.app_mode == 'CREATING_SEGMENT':
+            self.set_app_state('IDLE')
+        self.state.selected_segments.replace(sorted(seg_ids))
+        self._sync_ui_with_selection()
+        self.redraw_all()
+
+    # --- ОТМЕНА / ПОВТОР ---
+
+    def _change_selection_attribute(self, attribute, value):
+        """Меняет стиль ('style') или цвет ('color') всех выделенных отрезков одним действием истории."""
+        seg_ids = self.state.selected_segments.ids()
+        self.state.history.execute(self.state, ChangeAttributes(self.state.segments, seg_ids, attribute, value))
+
+    def _typing_in_entry(self, event):
+        """Сочетание нажато в поле ввода (координаты, шаг сетки) - это правка текста, а не чертежа."""
+        return event is not None and isinstance(self.root.focus_get(), tk.Entry)
+
+    def on_undo(self, event=None):
+        if self._typing_in_entry(event): return
+        self._apply_history(self.state.history.undo)
+
+    def on_redo(self, event=None):
+        if self._typing_in_entry(event): return
+        self._apply_history(self.state.history.redo)
+
+    def _apply_history(self, action):
+        if self.state.app_mode == 'CREATING_SEGMENT':
+            self.set_app_state('IDLE')
+        command = action(self.state)
+        if command is None: return
+
+        # Отмененное добавление могло убрать выделенные отрезки
+        self.state.selected_segments.prune()
+        if isinstance(command, DeleteStyle):
+            self.view.refresh_style_picker(self.state.line_styles)
+        self._sync_ui_with_selection()
+        self.redraw_all()
+
+    # --- ФАЙЛЫ ---
+
+    def on_open_file(self, event=None):
+        path = filedialog.askopenfilename(
+            parent=self.root, title="Открыть чертеж",
+            filetypes=[("Чертеж MyPerfectCAD", "*" + FILE_EXTENSION), ("Все файлы", "*.*")])
+        if not path: return
+
+        try:
+            drawing = load_drawing(path)
+        except (DrawingFileError, OSError, ValueError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось открыть файл:\n{e}")
+            return
+
+        self.state.replace_drawing(drawing['styles'], drawing['base_thickness_mm'], drawing['columns'],
+                                   drawing['style_names'], drawing['color_names'])
+        self.schedule_index_build()
+        self.set_app_state('IDLE')
+        # Все отрезки новые - старые элементы холста больше не соответствуют ID
+        self.renderer.invalidate()
+        self.view.refresh_style_picker(self.state.line_styles)
+        self._sync_ui_with_selection()
+        self.on_fit_to_view()
+
+    def schedule_index_build(self):
+        """Доводит раскладку индекса после rebuild порциями в простое, а не в первом клике или сдвиге."""
+        if self._index_build_job is not None: return
+
+        def step():
+            self._index_build_job = None
+            if self.state.spatial_index.build_step():
+                self._index_build_job = self.root.after(INDEX_BUILD_DELAY_MS, step)
+
+        self._index_build_job = self.root.after(INDEX_BUILD_DELAY_MS, step)
+
+    def on_save_file(self, event=None):
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Сохранить чертеж", defaultextension=FILE_EXTENSION,
+            filetypes=[("Чертеж MyPerfectCAD", "*" + FILE_EXTENSION)])
+        if not path: return
+
+        try:
+            save_drawing(path, self.state)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить файл:\n{e}")
+
+    def on_import_dxf(self, event=None):
+        path = filedialog.askopenfilename(
+            parent=self.root, title="Импорт DXF",
+            filetypes=[("Чертеж DXF", "*.dxf"), ("Все файлы", "*.*")])
+        if not path: return
+
+        available = set(self.state.line_styles)
+        # Прочитанные колонки (x1s, y1s, x2s, y2s, стили, цвета) копятся здесь и попадают в чертеж одним вызовом
+        # в конце - при отмене откатывать нечего
+        imported = (array('d'), array('d'), array('d'), array('d'), [], [])
+
+        def on_result(batch):
+            for column, part in zip(imported, batch):
+                column.extend(part)
+
+        def on_done(cancelled):
+            dialog.close()
+            if cancelled or not imported[0]: return
+            seg_ids = self.state.add_segment_columns(*imported)
+            # Весь импорт отменяется одним действием
+            self.state.history.push(AddSegments(seg_ids))
+            self.schedule_index_build()
+            self.on_fit_to_view()
+
+        def on_error(error):
+            on_done(True)
+            if isinstance(error, (DxfImportError, OSError, UnicodeError)):
+                messagebox.showerror("Ошибка", f"Не удалось импортировать DXF:\n{error}")
+            else:
+                raise error
+
+        task = BackgroundTask(self.root, lambda: read_dxf_segments(path, available),
+                              on_result, on_done=on_done, on_error=on_error)
+        dialog = ProgressDialog(self.root, "Импорт DXF", "Чтение файла...", task.cancel)
+        task.on_progress = lambda fraction: dialog.set_progress(fraction, f"Прочитано отрезков: {len(imported[0])}")
+        task.start()
+
+    def _export_colors(self):
+        """Цвета Tk (имена и #rgb) всех отрезков -> '#rrggbb'. Считается в потоке Tk до запуска экспорта."""
+        colors = {}
+        for name in self.state.segments.color_names:
+            try:
+                r, g, b = self.root.winfo_rgb(name)
+                colors[name] = f"#{r >> 8:02x}{g >> 8:02x}{b >> 8:02x}"
+            except tk.TclError:
+                colors[name] = '#000000'
+        return colors
+
+    def on_export(self, event=None):
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Экспорт чертежа", defaultextension=".dxf",
+            filetypes=[("Чертеж DXF", "*.dxf"), ("Рисунок SVG", "*.svg")])
+        if not path: return
+
+        # Снимки стилей и цветов делаем здесь: рабочий поток не должен трогать Tk и изменяемые словари
+        store = self.state.segments
+        line_styles = dict(self.state.line_styles)
+        colors = self._export_colors()
+        if path.lower().endswith('.svg'):
+            export = export_svg(path, store, line_styles, colors, self.state.base_thickness_mm)
+        else:
+            export = export_dxf(path, store, line_styles, colors)
+
+        def job():
+            try:
+                for progress in export:
+                    yield progress, None
+            finally:
+                export.close()
+
+        def on_done(cancelled):
+            dialog.close()
+            if cancelled and os.path.exists(path):
+                # Недописанный файл не оставляем
+                os.remove(path)
+
+        def on_error(error):
+            dialog.close()
+            if isinstance(error, OSError):
+                messagebox.showerror("Ошибка", f"Не удалось экспортировать чертеж:\n{error}")
+            else:
+                raise error
+
+        task = BackgroundTask(self.root, job, lambda result: None, on_done=on_done, on_error=on_error)
+        dialog = ProgressDialog(self.root, "Экспорт", f"Экспорт {len(store)} отрезков...", task.cancel)
+        task.on_progress = dialog.set_progress
+        task.start()
+
     # НОВЫЙ МЕТОД: Вызывается, когда в Менеджере нажали "Применить"
     def on_styles_updated(self):
         # 1. Обновляем список в главном окне (чтобы появился новый стиль)
-        self.view.refresh_style_combobox_values(self.state.line_styles)
+        self.view.refresh_style_picker(self.state.line_styles)
         
         # 2. Перерисовываем холст
         self.redraw_all()
@@ -521,7 +890,7 @@ class Callbacks:
     # ИСПРАВЛЕННЫЙ МЕТОД открытия окна
     def on_open_style_manager(self):
         # Передаем НЕ redraw_all, а наш новый метод
-        StyleManagerWindow(self.root, self.state, self.on_styles_updated)
+        StyleManagerWindow(self.root, self.state, self.on_styles_updated, self.view.style_thumbnails)
 
     # НОВЫЙ МЕТОД: Обработка кнопок быстрого доступа
     def on_quick_style_set(self, style_key):
@@ -533,9 +902,8 @@ class Callbacks:
         
         # Если есть выделенные объекты -> меняем стиль им всем
         if self.state.selected_segments:
-            for seg in self.state.selected_segments:
-                seg.style_name = style_key
-            # Синхронизируем UI (Combobox и превью обновятся сами)
+            self._change_selection_attribute('style', style_key)
+            # Синхронизируем UI (список стилей и превью обновятся сами)
             self._sync_ui_with_selection()
         else:
             # Если нет выделения -> просто обновляем UI для будущего рисования
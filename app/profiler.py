@@ -0,0 +1,95 @@
+# app/profiler.py
+
+'''
+Профилировщик кадров (включается из меню "Вид").
+Кадр - один проход RedrawScheduler.flush. Время кадра делится на этапы отметками mark(имя):
+каждая отметка записывает время, прошедшее с предыдущей. Этапы приходят из двух мест:
+    - Renderer.render_scene: grid, segments, halo, preview, points, submit (отправка команд в Tk),
+    - RedrawScheduler: info, canvas (остаток отрисовки холста), snap, status.
+Кадры лежат в кольцевом буфере (deque с maxlen) - память ограничена, старые кадры вытесняются.
+
+Выключенный профилировщик ничего не стоит: планировщик и рендерер держат ссылку на него
+только пока он включен (иначе None), и весь учет сводится к проверке "is not None".
+'''
+
+import json
+import time
+from collections import deque
+
+# Сколько последних кадров хранить
+PROFILE_CAPACITY = 600
+
+# За сколько последних кадров считать FPS и средние времена этапов в строке состояния
+PROFILE_WINDOW = 60
+
+class FrameProfiler:
+    def __init__(self, capacity=PROFILE_CAPACITY, item_counter=None):
+        self.frames = deque(maxlen=capacity)
+        # Функция, возвращающая число элементов холста, созданных кадром (вызывается после замера кадра)
+        self.item_counter = item_counter
+        self._stages = None
+        self._frame_start = 0.0
+        self._last_mark = 0.0
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        self._frame_start = self._last_mark = now
+        self._stages = {}
+
+    def mark(self, stage):
+        """Засчитывает этапу stage время с предыдущей отметки (или с начала кадра)."""
+        if self._stages is None: return
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + (now - self._last_mark)
+        self._last_mark = now
+
+    def end_frame(self):
+        if self._stages is None: return
+        total = time.perf_counter() - self._frame_start
+        # Подсчет элементов не входит во время кадра
+        items = self.item_counter() if self.item_counter else None
+        self.frames.append({'start': self._frame_start, 'total': total,
+                            'stages': self._stages, 'items': items})
+        self._stages = None
+
+    def clear(self):
+        self.frames.clear()
+        self._stages = None
+
+    def fps(self, window=PROFILE_WINDOW):
+        """Достижимая частота кадров по длительностям последних window кадров (0, если кадров нет).
+        Считается по времени самих кадров, а не по частоте вызовов: простой между кадрами
+        (ожидание ввода, ограничение max_fps) ее не занижает."""
+        recent = list(self.frames)[-window:]
+        busy = sum(frame['total'] for frame in recent)
+        return len(recent) / busy if busy > 0 else 0.0
+
+    def averages(self, window=PROFILE_WINDOW):
+        """Средние времена этапов (мс) по последним window кадрам, от самого дорогого."""
+        recent = list(self.frames)[-window:]
+        if not recent: return []
+        totals = {}
+        for frame in recent:
+            for stage, seconds in frame['stages'].items():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        return sorted(((stage, total * 1000 / len(recent)) for stage, total in totals.items()),
+                      key=lambda item: item[1], reverse=True)
+
+    def summary(self, top=3):
+        """Короткая строка для строки состояния: FPS, среднее время кадра и самые дорогие этапы."""
+        if not self.frames: return "Профиль: нет кадров"
+        recent = list(self.frames)[-PROFILE_WINDOW:]
+        frame_ms = sum(frame['total'] for frame in recent) * 1000 / len(recent)
+        stages = ', '.join(f"{stage} {ms:.1f}" for stage, ms in self.averages()[:top])
+        items = recent[-1]['items']
+        text = f"FPS {self.fps():.0f} | кадр {frame_ms:.1f} мс | {stages}"
+        return text + (f" | создано элементов {items}" if items is not None else "")
+
+    def dump(self, path):
+        """Сохраняет буфер кадров в JSON (время в секундах, start - от первого кадра буфера)."""
+        frames = list(self.frames)
+        origin = frames[0]['start'] if frames else 0.0
+        data = {'fps': self.fps(), 'averages_ms': dict(self.averages()),
+                'frames': [dict(frame, start=frame['start'] - origin) for frame in frames]}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
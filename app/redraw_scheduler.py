@@ -0,0 +1,59 @@
+# app/redraw_scheduler.py
+
+'''
+Планировщик перерисовки.
+Обработчики событий не рисуют сразу, а только помечают части интерфейса "грязными" (request).
+Сама перерисовка выполняется через root.after не чаще одного раза за кадр (ограничение fps),
+поэтому пачка событий мыши между кадрами схлопывается в одну отрисовку.
+Части (холст, инфо-панель, маркер привязки, строка состояния) помечаются независимо: движение мыши,
+обновляющее координаты в строке состояния, не заставляет перерисовывать холст.
+'''
+
+import time
+
+# Порядок важен: инфо-панель выставляет активные точки для холста, маркер привязки рисуется поверх холста,
+# а строка состояния показывает статистику только что отрисованного кадра
+PARTS = ('info', 'canvas', 'snap', 'status')
+
+class RedrawScheduler:
+    def __init__(self, root, handlers, fps=60):
+        self.root = root
+        self.handlers = handlers  # имя части -> функция перерисовки
+        self.fps = fps
+
+        self._dirty = set()
+        self._pending = None
+        self._last_flush = 0.0
+
+        # FrameProfiler, пока профилирование включено (иначе None - учет ничего не стоит)
+        self.profiler = None
+
+    def request(self, *parts):
+        """Помечает части как требующие перерисовки (без аргументов - все)."""
+        self._dirty.update(parts or PARTS)
+        if self._pending is None:
+            # Ждем остаток текущего кадра, чтобы не превысить fps
+            frame = 1.0 / self.fps if self.fps > 0 else 0.0
+            delay = max(0.0, self._last_flush + frame - time.perf_counter())
+            self._pending = self.root.after(int(delay * 1000), self.flush)
+
+    def flush(self):
+        """Немедленно выполняет все отложенные перерисовки."""
+        if self._pending is not None:
+            self.root.after_cancel(self._pending)
+            self._pending = None
+        dirty, self._dirty = self._dirty, set()
+        profiler = self.profiler
+        if profiler is not None:
+            # Строка состояния показывает сводку профиля - обновляем ее в каждом кадре
+            dirty.add('status')
+            profiler.begin_frame()
+        for part in PARTS:
+            if part in dirty:
+                self.handlers[part]()
+                if profiler is not None: profiler.mark(part)
+        if profiler is not None: profiler.end_frame()
+        self._last_flush = time.perf_counter()
+
+    def is_dirty(self, part):
+        return part in self._dirty
@@ -0,0 +1,68 @@
+# benchmarks/memory_segments.py
+
+'''
+Бенчмарк памяти: сколько байт занимает один отрезок в разных представлениях.
+    legacy  - прежние Point/Segment с __dict__ у каждого экземпляра ("до"),
+    slots   - текущие Point/Segment из logic.geometry на __slots__ ("после"),
+    store   - колоночное хранилище logic.segment_store.SegmentStore.
+Запуск из корня проекта:
+    python -m benchmarks.memory_segments [количество_отрезков]   (по умолчанию 1 000 000)
+'''
+
+import gc
+import sys
+import tracemalloc
+from logic.geometry import Point, Segment
+from logic.segment_store import SegmentStore
+
+DEFAULT_COUNT = 1_000_000
+
+# Копия прежней раскладки классов (до перехода на __slots__) - точка отсчета "до"
+class LegacyPoint:
+    def __init__(self, x=0.0, y=0.0):
+        self.x = float(x)
+        self.y = float(y)
+
+class LegacySegment:
+    def __init__(self, p1, p2, style_name='solid_main', color='black'):
+        self.p1 = p1
+        self.p2 = p2
+        self.style_name = style_name
+        self.color = color
+
+def _build_legacy(count):
+    return [LegacySegment(LegacyPoint(i, i * 0.5), LegacyPoint(i + 1.0, i * 0.5 + 1.0)) for i in range(count)]
+
+def _build_slots(count):
+    return [Segment(Point(i, i * 0.5), Point(i + 1.0, i * 0.5 + 1.0)) for i in range(count)]
+
+def _build_store(count):
+    store = SegmentStore()
+    for i in range(count):
+        store.add(float(i), i * 0.5, i + 1.0, i * 0.5 + 1.0)
+    return store
+
+def measure(builder, count):
+    """Возвращает число байт на отрезок, которое удерживает результат builder(count)."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = builder(count)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return used / count
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else DEFAULT_COUNT
+    print(f"Отрезков: {count}")
+    results = {}
+    for name, builder in (('legacy', _build_legacy), ('slots', _build_slots), ('store', _build_store)):
+        results[name] = measure(builder, count)
+        print(f"{name:>7}: {results[name]:8.1f} байт/отрезок, {results[name] * count / 2**20:8.1f} МБ")
+    print(f"slots/legacy: {results['slots'] / results['legacy']:.2f}, store/legacy: {results['store'] / results['legacy']:.2f}")
+    return results
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,290 @@
+# benchmarks/run_benchmarks.py
+
+'''
+Бенчмарк отрисовки без дисплея: синтетические чертежи от 1 тыс. до 1 млн отрезков со всеми стилями GOST_STYLES.
+Renderer рисует на RecordingCanvas (benchmarks/stub_canvas.py) - Tk не нужен, а число созданных элементов считается.
+
+Этапы для каждого размера чертежа:
+    build           - заполнение SegmentStore,
+    index_rebuild   - пакетная перестройка пространственного индекса,
+    index_first_query - поиск по клику сразу после перестройки (раскладка по ячейкам еще не начата),
+    index_build_idle  - раскладка индекса по ячейкам порциями build_step (в программе идет в простое),
+    converter_many  - CoordinateConverter.world_to_screen_many по всем концам отрезков,
+    converter_point - world_to_screen по одной точке (CONVERTER_POINTS вызовов),
+    distance        - Segment.distance_to_point на выборке отрезков,
+    pattern_*       - движок штрихов, волны и зигзага (logic/patterns.py) на выборке в пикселях,
+    render_*        - Renderer.render_scene: первый кадр, сдвиг и зум (retained-режим)
+                      для вида "весь чертеж" (fit, работает LOD) и крупного плана (detail);
+                      *_submit - повторная отправка списка команд первого кадра на холст (только Tk-часть).
+Для каждого этапа - время (с), элементы холста (создано/удалено) и пик памяти процесса (ru_maxrss);
+с --trace-memory дополнительно пик выделений Python на этапе (tracemalloc, замедляет замеры).
+
+Результат - JSON (в stdout или в файл --output), чтобы сравнивать прогоны между коммитами.
+Запуск из корня проекта:
+    python -m benchmarks.run_benchmarks [размеры...] [--output файл.json] [--trace-memory] [--seed N]
+    (по умолчанию размеры 1000 10000 100000 1000000)
+'''
+
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from logic.state import AppState
+from logic.converter import CoordinateConverter
+from logic.geometry import Point, Segment
+from logic.styles import GOST_STYLES, expand_dash_pattern
+from logic.patterns import dash_batch, wave_batch, zigzag_batch
+from ui.renderer import Renderer, LOD_MAX_POINTS
+from ui.display_list import TkSubmitter
+from benchmarks.stub_canvas import RecordingCanvas
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# Версия формата JSON: менять при несовместимых изменениях структуры отчета
+SCHEMA_VERSION = 1
+
+CANVAS_WIDTH = 1280
+CANVAS_HEIGHT = 800
+
+# Средняя площадь мира на один отрезок и диапазон длин отрезков (мировые единицы)
+AREA_PER_SEGMENT = 400.0
+MIN_LENGTH = 2.0
+MAX_LENGTH = 40.0
+
+COLORS = ('black', 'red', 'blue', 'green')
+
+# Зум крупного плана (как в приложении по умолчанию) и сдвиг камеры между кадрами (пиксели)
+DETAIL_ZOOM = 5.0
+PAN_STEP_PX = 40
+ZOOM_STEP = 1.25
+
+# Размеры выборок для этапов, которые не зависят от размера чертежа
+CONVERTER_POINTS = 100_000
+DISTANCE_SAMPLE = 100_000
+PATTERN_SAMPLE = 5_000
+
+def build_state(count, seed):
+    """AppState с count случайными отрезками в квадрате постоянной плотности; стили идут по кругу."""
+    rng = random.Random(seed)
+    side = math.sqrt(count * AREA_PER_SEGMENT)
+    half = side / 2
+    styles = list(GOST_STYLES)
+    state = AppState()
+    add = state.segments.add
+    for i in range(count):
+        x = rng.uniform(-half, half)
+        y = rng.uniform(-half, half)
+        length = rng.uniform(MIN_LENGTH, MAX_LENGTH)
+        angle = rng.uniform(0.0, math.pi)
+        add(x, y, x + length * math.cos(angle), y + length * math.sin(angle),
+            styles[i % len(styles)], COLORS[i % len(COLORS)])
+    return state
+
+def fit_zoom(state):
+    min_x, min_y, max_x, max_y = state.segments.bounds()
+    return min(CANVAS_WIDTH / max(max_x - min_x, 1e-9), CANVAS_HEIGHT / max(max_y - min_y, 1e-9))
+
+def _max_rss_mb():
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return round(rss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+class StageRecorder:
+    """Замеряет этапы: время, элементы холста и память. Результаты копятся в self.stages."""
+
+    def __init__(self, canvas, trace_memory=False):
+        self.canvas = canvas
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, func, *args, **extra):
+        gc.collect()
+        self.canvas.reset_counters()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+
+        stage = {'seconds': round(seconds, 6),
+                 'items_created': self.canvas.created,
+                 'items_deleted': self.canvas.deleted,
+                 'items_alive': self.canvas.item_count(),
+                 'max_rss_mb': _max_rss_mb()}
+        if self.trace_memory:
+            stage['peak_alloc_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            tracemalloc.stop()
+        stage.update(extra)
+        self.stages[name] = stage
+        return result
+
+# --- ЭТАПЫ ---
+
+def _converter_many(converter, state):
+    x1, y1, x2, y2, _, _ = state.segments.compact_columns()
+    converter.world_to_screen_many(x1, y1)
+    converter.world_to_screen_many(x2, y2)
+
+def _converter_point(converter, xs, ys):
+    world_to_screen = converter.world_to_screen
+    for x, y in zip(xs, ys):
+        world_to_screen(x, y)
+
+def _distance(segments, px, py):
+    for seg, x, y in zip(segments, px, py):
+        seg.distance_to_point(x, y)
+
+def _pattern_dashed(screen, patterns):
+    # Группы по паттерну - как рендерер, один вызов движка на группу
+    groups = {}
+    for coords, pattern in zip(screen, patterns):
+        groups.setdefault(pattern, []).append(coords)
+    for pattern, members in groups.items():
+        dash_batch(*zip(*members), pattern)
+
+def _pattern_wave(screen, zoom):
+    wave_batch(*zip(*screen), zoom, LOD_MAX_POINTS)
+
+def _pattern_zigzag(screen, zoom):
+    zigzag_batch(*zip(*screen), zoom, LOD_MAX_POINTS)
+
+def _pan(state, renderer):
+    state.pan_x += PAN_STEP_PX
+    renderer.render_scene()
+
+def _zoom(state, renderer):
+    state.zoom *= ZOOM_STEP
+    renderer.render_scene()
+
+def _render_series(recorder, prefix, state, renderer, zoom):
+    """Первый кадр с нуля, затем сдвиг и зум поверх уже нарисованного."""
+    renderer.invalidate()
+    state.pan_x, state.pan_y, state.zoom = 0, 0, zoom
+    recorder.run(prefix + '_first', renderer.render_scene)
+    recorder.stages[prefix + '_first']['visible_segments'] = renderer.visible_count
+    recorder.stages[prefix + '_first']['drawn_segments'] = renderer.drawn_count
+    recorder.stages[prefix + '_first']['aggregated_segments'] = renderer.aggregated_count
+    recorder.stages[prefix + '_first']['commands'] = len(renderer.display_list)
+    replayed = recorder.run(prefix + '_submit', TkSubmitter(recorder.canvas).submit, renderer.display_list)
+    recorder.canvas.delete(*replayed)
+    recorder.run(prefix + '_pan', _pan, state, renderer)
+    recorder.run(prefix + '_zoom', _zoom, state, renderer)
+
+def benchmark_size(count, seed=0, trace_memory=False):
+    """Все этапы для чертежа из count отрезков; возвращает словарь для JSON."""
+    canvas = RecordingCanvas(CANVAS_WIDTH, CANVAS_HEIGHT)
+    recorder = StageRecorder(canvas, trace_memory)
+
+    state = recorder.run('build', build_state, count, seed)
+    recorder.run('index_rebuild', state.rebuild_spatial_index)
+    min_x, min_y, max_x, max_y = state.segments.bounds()
+    recorder.run('index_first_query', state.spatial_index.nearest, (min_x + max_x) / 2, (min_y + max_y) / 2, 1.0)
+    recorder.run('index_build_idle', state.spatial_index.finish_build)
+
+    converter = CoordinateConverter(state, canvas)
+    converter.set_canvas_size(CANVAS_WIDTH, CANVAS_HEIGHT)
+    renderer = Renderer(canvas, state, converter)
+    state.zoom = DETAIL_ZOOM
+
+    recorder.run('converter_many', _converter_many, converter, state, points=2 * count)
+
+    rng = random.Random(seed + 1)
+    min_x, min_y, max_x, max_y = state.segments.bounds()
+    xs = [rng.uniform(min_x, max_x) for _ in range(CONVERTER_POINTS)]
+    ys = [rng.uniform(min_y, max_y) for _ in range(CONVERTER_POINTS)]
+    recorder.run('converter_point', _converter_point, converter, xs, ys, points=CONVERTER_POINTS)
+
+    # Выборки отрезков для этапов, не зависящих от размера чертежа (ID берем по кругу)
+    store = state.segments
+    ids = list(store.ids())
+    sample = [ids[i % len(ids)] for i in range(DISTANCE_SAMPLE)]
+    segments = [Segment(Point(store.x1[i], store.y1[i]), Point(store.x2[i], store.y2[i])) for i in sample]
+    recorder.run('distance', _distance, segments, xs, ys, calls=len(segments))
+    del segments, xs, ys
+
+    # Паттерны - в пикселях при DETAIL_ZOOM, как их вызывает рендерер
+    by_kind = {'dashed': [], 'wave': [], 'zigzag': []}
+    for seg_id in ids:
+        style = state.line_styles[store.get_style(seg_id)]
+        kind = 'dashed' if expand_dash_pattern(style) else style.base_type
+        bucket = by_kind.get(kind)
+        if bucket is not None and len(bucket) < PATTERN_SAMPLE:
+            bucket.append(seg_id)
+        if all(len(b) >= PATTERN_SAMPLE for b in by_kind.values()): break
+
+    zoom = state.zoom
+    screen = {kind: renderer._ids_to_screen(bucket) for kind, bucket in by_kind.items()}
+    dash_patterns = [state.style_cache.resolve(store.get_style(seg_id), zoom, state.base_thickness_mm).dash_pattern_px
+                     for seg_id in by_kind['dashed']]
+    recorder.run('pattern_dashed', _pattern_dashed, screen['dashed'], dash_patterns, calls=len(dash_patterns))
+    recorder.run('pattern_wave', _pattern_wave, screen['wave'], zoom, calls=len(screen['wave']))
+    recorder.run('pattern_zigzag', _pattern_zigzag, screen['zigzag'], zoom, calls=len(screen['zigzag']))
+
+    _render_series(recorder, 'render_fit', state, renderer, fit_zoom(state))
+    _render_series(recorder, 'render_detail', state, renderer, DETAIL_ZOOM)
+
+    return {'segments': count, 'stages': recorder.stages}
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run_benchmarks',
+                                     description="Бенчмарк отрисовки на заглушке холста (JSON-отчет)")
+    parser.add_argument('sizes', nargs='*', type=int, default=list(DEFAULT_SIZES),
+                        help="Размеры чертежей (число отрезков)")
+    parser.add_argument('--output', '-o', help="Файл для JSON-отчета (по умолчанию stdout)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Пик выделений памяти на этапе через tracemalloc (замедляет замеры)")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора чертежа")
+    return parser.parse_args(argv)
+
+def main(argv):
+    args = parse_args(argv[1:])
+    report = {
+        'schema': SCHEMA_VERSION,
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'canvas': [CANVAS_WIDTH, CANVAS_HEIGHT],
+            'seed': args.seed,
+            'trace_memory': args.trace_memory,
+        },
+        'runs': [],
+    }
+    for count in args.sizes:
+        print(f"Отрезков: {count}...", file=sys.stderr)
+        report['runs'].append(benchmark_size(count, args.seed, args.trace_memory))
+        gc.collect()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv)
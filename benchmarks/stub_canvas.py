@@ -0,0 +1,115 @@
+# benchmarks/stub_canvas.py
+
+'''
+Заглушка tk.Canvas для бенчмарков без дисплея.
+Повторяет ту часть интерфейса холста, которой пользуется Renderer (create_*, delete, move, scale,
+tag_lower/tag_raise, coords, itemconfig, winfo_*), ничего не рисует, а только ведет учет элементов и вызовов:
+сколько элементов создано и удалено, сколько всего вызовов каждого метода.
+'''
+
+from collections import Counter
+
+class RecordingCanvas:
+    def __init__(self, width=1280, height=800):
+        self.width = width
+        self.height = height
+
+        self._next_id = 1
+        self._items = {}  # ID элемента -> (тип, кортеж тегов)
+        self._tags = {}   # тег -> множество ID
+        self.calls = Counter()
+        self.created = 0
+        self.deleted = 0
+
+    # --- СЧЕТЧИКИ ---
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.created = 0
+        self.deleted = 0
+
+    def item_count(self):
+        return len(self._items)
+
+    # --- СОЗДАНИЕ ---
+
+    def _create(self, kind, kwargs):
+        self.calls['create_' + kind] += 1
+        item = self._next_id
+        self._next_id += 1
+        tags = kwargs.get('tags', ())
+        if isinstance(tags, str): tags = (tags,)
+        self._items[item] = (kind, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(item)
+        self.created += 1
+        return item
+
+    def create_line(self, *coords, **kwargs):
+        return self._create('line', kwargs)
+
+    def create_text(self, *coords, **kwargs):
+        return self._create('text', kwargs)
+
+    def create_oval(self, *coords, **kwargs):
+        return self._create('oval', kwargs)
+
+    def create_rectangle(self, *coords, **kwargs):
+        return self._create('rectangle', kwargs)
+
+    def create_polygon(self, *coords, **kwargs):
+        return self._create('polygon', kwargs)
+
+    def create_image(self, *coords, **kwargs):
+        return self._create('image', kwargs)
+
+    # --- ИЗМЕНЕНИЕ ---
+
+    def _resolve(self, tag_or_id):
+        if tag_or_id == 'all':
+            return list(self._items)
+        if isinstance(tag_or_id, int):
+            return [tag_or_id] if tag_or_id in self._items else []
+        return list(self._tags.get(tag_or_id, ()))
+
+    def delete(self, *tags_or_ids):
+        self.calls['delete'] += 1
+        for tag_or_id in tags_or_ids:
+            for item in self._resolve(tag_or_id):
+                _, tags = self._items.pop(item)
+                for tag in tags:
+                    bucket = self._tags.get(tag)
+                    if bucket is not None:
+                        bucket.discard(item)
+                self.deleted += 1
+
+    def move(self, tag_or_id, dx, dy):
+        self.calls['move'] += 1
+
+    def scale(self, tag_or_id, x, y, sx, sy):
+        self.calls['scale'] += 1
+
+    def coords(self, tag_or_id, *coords):
+        self.calls['coords'] += 1
+
+    def itemconfig(self, tag_or_id, **kwargs):
+        self.calls['itemconfig'] += 1
+
+    def tag_lower(self, tag_or_id, below=None):
+        self.calls['tag_lower'] += 1
+
+    def tag_raise(self, tag_or_id, above=None):
+        self.calls['tag_raise'] += 1
+
+    def config(self, **kwargs):
+        pass
+
+    configure = config
+
+    # --- РАЗМЕРЫ ---
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
@@ -0,0 +1,294 @@
+# logic/chains.py
+
+'''
+Цепочки связанных отрезков для непрерывных штрихов.
+Контур из тысяч коротких отрезков, у каждого из которых паттерн начинается заново, выглядит
+как сплошная линия из обрубков. Поэтому отрезки одного стиля, соединенные концами, собираются в цепочки,
+и фаза паттерна переносится с отрезка на отрезок вдоль всей цепочки.
+
+Цепочка продолжается через точку, только если в ней сходятся ровно два отрезка одного стиля
+(в развилке, на конце и при смене стиля цепочка обрывается). Соседи ищутся через SpatialIndex
+по маленькому прямоугольнику вокруг конца отрезка.
+
+Цепочки строятся лениво - при первом запросе одного из ее отрезков (рендерер спрашивает только о видимых
+штриховых отрезках), и кэшируются вместе с таблицами штрихов для каждого паттерна. Таблица хранит
+положения штрихов как доли длины отрезка (в мировых единицах), поэтому при смене зума она не пересчитывается -
+рендерер только умножает доли на новые экранные концы отрезка.
+
+Направление и начало цепочки не зависят от того, с какого отрезка ее нашли:
+незамкнутая цепочка начинается с того конца, чей крайний отрезок имеет меньший ID,
+замкнутая - с отрезка с наименьшим ID в его собственном направлении.
+
+Рендерер ограничивает построение шагами на кадр (begin_frame/end_frame): длинную цепочку он достраивает
+за несколько кадров, а до тех пор ее отрезки получают фазу 0 (phase возвращает None). Когда такая цепочка
+достроена, растет version - рендерер по нему пересчитывает подписи и перерисовывает отрезки с верной фазой.
+
+Изменения чертежа сообщаются через discard(seg_id) (AppState при добавлении/удалении отрезка)
+и discard_many(ids) (смена стиля) - сбрасываются только затронутые цепочки; reset() сбрасывает все.
+'''
+
+import math
+from array import array
+from logic.patterns import dash_table, dash_spans
+
+# Концы считаются совпадающими, если расходятся не больше чем на столько (мировые единицы)
+CHAIN_EPS = 1e-6
+
+# Предел длины цепочки в отрезках; дальше цепочка обрывается (фаза начинается заново)
+MAX_CHAIN_SEGMENTS = 100_000
+
+# Сколько шагов обхода (поисков соседа через индекс, около 20 мкс каждый) можно сделать за один кадр
+MAX_CHAIN_STEPS_PER_FRAME = 1000
+
+class Chain:
+    __slots__ = ('ids', 'reversed', 'offsets', 'closed', 'tables')
+
+    def __init__(self, ids, reversed_flags, offsets, closed):
+        self.ids = ids                  # ID отрезков по порядку обхода
+        self.reversed = reversed_flags  # 1 - отрезок проходится от p2 к p1
+        self.offsets = offsets          # Расстояние вдоль цепочки до начала каждого отрезка (по обходу)
+        self.closed = closed
+        self.tables = {}                # паттерн (мировые единицы) -> [доли штрихов каждого отрезка]
+
+class _ChainBuild:
+    """Незаконченное построение цепочки: обход вперед от seg_id, затем назад."""
+    __slots__ = ('seg_id', 'seen', 'forward', 'backward', 'current', 'leave_p2', 'stage', 'closed', 'deferred')
+
+    def __init__(self, seg_id):
+        self.seg_id = seg_id
+        self.seen = {seg_id}
+        self.forward = []           # (ID, входит ли он своим p2) по обходу от p2 исходного
+        self.backward = []          # То же от p1 исходного
+        self.current, self.leave_p2 = seg_id, True
+        self.stage = 'forward'      # 'forward', 'backward' или None - обход закончен
+        self.closed = False
+        self.deferred = False       # Отрезки цепочки уже рисовались с фазой 0
+
+class ChainIndex:
+    def __init__(self, store, spatial_index):
+        self.store = store
+        self.spatial_index = spatial_index
+        self._chains = {}  # ID отрезка -> (Chain, позиция в цепочке)
+        self._builds = {}  # ID отрезка -> _ChainBuild, в котором он уже найден
+
+        # Остаток шагов обхода в текущем кадре (None - без ограничения, вне кадра рендерера)
+        self._steps_left = None
+        # В этом кадре кому-то досталась фаза 0 - нужен еще кадр, чтобы достроить цепочки
+        self.deferred = False
+        # Растет, когда достраивается цепочка, чьи отрезки рисовались с фазой 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self._chains)
+
+    # --- КАДР ---
+
+    def begin_frame(self, steps=MAX_CHAIN_STEPS_PER_FRAME):
+        """Начинает кадр рендерера: построение цепочек ограничено steps шагами обхода."""
+        if not self.deferred:
+            # Прошлому кадру недостроенные цепочки не понадобились - не держим их
+            self._builds.clear()
+        self._steps_left = steps
+        self.deferred = False
+
+    def end_frame(self):
+        self._steps_left = None
+
+    # --- СБРОС ---
+
+    def reset(self):
+        self._chains.clear()
+        self._builds.clear()
+
+    def discard(self, seg_id):
+        """Сбрасывает цепочки отрезка и его соседей по концам. Вызывать, пока отрезок еще в индексе
+        (перед удалением) или уже в нем (после добавления) - соседи ищутся через SpatialIndex."""
+        # Незаконченные обходы могли пройти через изменившееся место - начинаем их заново
+        self._builds.clear()
+        if not self._chains or not self.store.is_alive(seg_id): return
+        x1, y1, x2, y2 = self.store.coords(seg_id)
+        self._drop(seg_id)
+        for x, y in ((x1, y1), (x2, y2)):
+            for other in self._touching(x, y):
+                self._drop(other)
+
+    def discard_many(self, seg_ids):
+        """Сбрасывает цепочки группы отрезков (например, после смены их стиля)."""
+        self._builds.clear()
+        if not self._chains: return
+        for seg_id in seg_ids:
+            self.discard(seg_id)
+
+    def _drop(self, seg_id):
+        entry = self._chains.get(seg_id)
+        if entry is None: return
+        for member in entry[0].ids:
+            del self._chains[member]
+
+    # --- ПОСТРОЕНИЕ ---
+
+    def _touching(self, x, y):
+        """ID живых отрезков, у которых один из концов совпадает с точкой (x, y)."""
+        eps = CHAIN_EPS
+        store = self.store
+        result = []
+        for seg_id in self.spatial_index.query_rect(x - eps, y - eps, x + eps, y + eps):
+            x1, y1, x2, y2 = store.coords(seg_id)
+            if (abs(x1 - x) <= eps and abs(y1 - y) <= eps) or (abs(x2 - x) <= eps and abs(y2 - y) <= eps):
+                result.append(seg_id)
+        return result
+
+    def _next(self, seg_id, at_p2, seen):
+        """Следующий отрезок цепочки за концом at_p2 (True - p2, False - p1) отрезка seg_id:
+        (ID, входит ли он своим p2) или None, если цепочка здесь обрывается."""
+        store = self.store
+        x1, y1, x2, y2 = store.coords(seg_id)
+        x, y = (x2, y2) if at_p2 else (x1, y1)
+        others = [other for other in self._touching(x, y) if other != seg_id]
+        if len(others) != 1: return None
+        other = others[0]
+        if other in seen or store.style_ids[other] != store.style_ids[seg_id]: return None
+        ox1, oy1, ox2, oy2 = store.coords(other)
+        # Отрезок, замыкающийся сам на себя обоими концами, не продолжает цепочку
+        enters_p1 = abs(ox1 - x) <= CHAIN_EPS and abs(oy1 - y) <= CHAIN_EPS
+        enters_p2 = abs(ox2 - x) <= CHAIN_EPS and abs(oy2 - y) <= CHAIN_EPS
+        if enters_p1 and enters_p2: return None
+        return other, enters_p2
+
+    def _advance(self, build):
+        """Продолжает обход цепочки, пока есть шаги кадра. True - обход закончен."""
+        while build.stage is not None:
+            if self._steps_left is not None:
+                if self._steps_left <= 0: return False
+                self._steps_left -= 1
+            if build.stage == 'forward':
+                walk, limit = build.forward, MAX_CHAIN_SEGMENTS - 1
+            else:
+                walk, limit = build.backward, MAX_CHAIN_SEGMENTS - 1 - len(build.forward)
+            step = self._next(build.current, build.leave_p2, build.seen) if len(walk) < limit else None
+            # Уперлись в уже построенную (обрезанную пределом) цепочку - сторона тоже закончилась
+            if step is not None and step[0] not in self._chains:
+                current, enters_p2 = step
+                build.seen.add(current)
+                self._builds[current] = build
+                walk.append(step)
+                build.current, build.leave_p2 = current, not enters_p2
+                continue
+
+            if build.stage == 'forward' and build.forward:
+                # Вернулись ли к началу: последний отрезок касается p1 исходного
+                last, last_enters_p2 = build.forward[-1]
+                step = self._next(last, not last_enters_p2, set())
+                build.closed = step is not None and step[0] == build.seg_id and not step[1]
+            if build.stage == 'forward' and not build.closed:
+                build.stage = 'backward'
+                build.current, build.leave_p2 = build.seg_id, False
+            else:
+                build.stage = None
+        return True
+
+    def _finish(self, build):
+        """Собирает Chain из законченного обхода и регистрирует ее отрезки."""
+        seg_id, closed = build.seg_id, build.closed
+        # Порядок обхода: назад (развернутый), сам отрезок, вперед
+        order = [(other, not enters_p2) for other, enters_p2 in reversed(build.backward)]
+        order.append((seg_id, False))
+        order.extend(build.forward)
+
+        if closed:
+            # Замкнутая: начинаем с наименьшего ID в его собственном направлении
+            start = min(range(len(order)), key=lambda i: order[i][0])
+            order = order[start:] + order[:start]
+            if order[0][1]:
+                order = [(other, not rev) for other, rev in order[:1] + order[:0:-1]]
+        elif order[-1][0] < order[0][0]:
+            order = [(other, not rev) for other, rev in reversed(order)]
+
+        store = self.store
+        ids = array('q', (other for other, _ in order))
+        flags = bytearray(rev for _, rev in order)
+        offsets = array('d', [0.0])
+        for other in ids:
+            x1, y1, x2, y2 = store.coords(other)
+            offsets.append(offsets[-1] + math.hypot(x2 - x1, y2 - y1))
+        chain = Chain(ids, flags, offsets, closed)
+        for position, other in enumerate(ids):
+            self._chains[other] = (chain, position)
+        return chain
+
+    def _entry(self, seg_id):
+        """(Chain, позиция) или None, если цепочку не удалось достроить в шагах этого кадра."""
+        entry = self._chains.get(seg_id)
+        if entry is not None: return entry
+
+        build = self._builds.get(seg_id)
+        if build is None:
+            if self._steps_left is not None and self._steps_left <= 0:
+                # Шаги кадра кончились - новый обход начнем в следующем кадре
+                self.deferred = True
+                return None
+            build = self._builds[seg_id] = _ChainBuild(seg_id)
+        if not self._advance(build):
+            build.deferred = True
+            self.deferred = True
+            return None
+
+        for member in build.seen:
+            self._builds.pop(member, None)
+        self._finish(build)
+        if build.deferred:
+            self.version += 1
+        return self._chains[seg_id]
+
+    # --- ЗАПРОСЫ ---
+
+    def chain_of(self, seg_id):
+        """Цепочка отрезка или None, пока она строится (см. begin_frame)."""
+        entry = self._entry(seg_id)
+        return entry[0] if entry is not None else None
+
+    def phase(self, seg_id):
+        """(расстояние вдоль цепочки до начала отрезка, проходится ли он от p2 к p1) или None,
+        пока цепочка строится. Меняется, когда меняется цепочка - рендерер кладет это в подпись отрезка."""
+        entry = self._entry(seg_id)
+        if entry is None: return None
+        chain, position = entry
+        return chain.offsets[position], chain.reversed[position]
+
+    def dash_fractions(self, seg_id, pattern):
+        """Штрихи отрезка с фазой, непрерывной вдоль цепочки: array('d') пар (fa, fb) -
+        доли длины отрезка от p1, между которыми рисуется штрих. pattern - в мировых единицах.
+        Пока цепочка строится - штрихи одного отрезка с фазой 0."""
+        entry = self._entry(seg_id)
+        if entry is None:
+            x1, y1, x2, y2 = self.store.coords(seg_id)
+            return self._segment_dashes(math.hypot(x2 - x1, y2 - y1), *dash_table(pattern))
+        chain, position = entry
+        table = chain.tables.get(pattern)
+        if table is None:
+            table = chain.tables[pattern] = self._dash_table(chain, pattern)
+        return table[position]
+
+    @staticmethod
+    def _dash_table(chain, pattern):
+        """Доли штрихов всех отрезков цепочки одним проходом (фаза переносится с отрезка на отрезок)."""
+        period, intervals = dash_table(pattern)
+        offsets = chain.offsets
+        return [ChainIndex._segment_dashes(offsets[position + 1] - offsets[position], period, intervals,
+                                           offsets[position], reversed_flag)
+                for position, reversed_flag in enumerate(chain.reversed)]
+
+    @staticmethod
+    def _segment_dashes(length, period, intervals, phase=0.0, reversed_flag=False):
+        """Доли штрихов одного отрезка длины length, чей паттерн начинается с фазы phase."""
+        fractions = array('d')
+        if period <= 0 or length == 0:
+            # Вырожденный паттерн - сплошной отрезок; нулевой отрезок - без штрихов
+            if length: fractions.extend((0.0, 1.0))
+            return fractions
+        for a, b in dash_spans(length, period, intervals, phase):
+            if reversed_flag:
+                fractions.extend((1.0 - b / length, 1.0 - a / length))
+            else:
+                fractions.extend((a / length, b / length))
+        return fractions
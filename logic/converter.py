@@ -3,51 +3,117 @@
 '''
 Мост между бесконечным миром и экраном монитора.
 Он содержит математику преобразования координат.
-world_to_screen: 
+world_to_screen:
     Превращает математические координаты (например, x=50, y=50) в пиксели на экране с учетом зума, сдвига и поворота.
-screen_to_world: 
+screen_to_world:
     Наоборот, переводит клик мыши в пикселях в реальные координаты чертежа.
+world_to_screen_many / screen_to_world_many:
+    Пакетные версии для целых массивов координат: матрица считается один раз на весь кадр.
+ViewTransform:
+    Неизменяемый снимок камеры (матрица 2x3 и обратная к ней). Пересобирается только
+    при изменении pan/zoom/rotation (счетчик state.view_version) или размера холста.
 '''
 
 import math
+from array import array
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class ViewTransform:
+    # Мир -> экран: sx = a*x + b*y + e, sy = c*x + d*y + f
+    a: float
+    b: float
+    c: float
+    d: float
+    e: float
+    f: float
+    # Экран -> мир (обратная матрица)
+    ia: float
+    ib: float
+    ic: float
+    id: float
+    ie: float
+    if_: float
+    # Параметры камеры, из которых собрана матрица
+    zoom: float
+    rotation: float
+    width: int
+    height: int
+
+    @classmethod
+    def from_camera(cls, pan_x, pan_y, zoom, rotation, width, height):
+        cos_a, sin_a = math.cos(rotation), math.sin(rotation)
+
+        # 1. Поворот (Rotation), 2. Масштабирование (Scale) и инверсия Y, 3. Сдвиг к центру холста + pan
+        a, b = zoom * cos_a, -zoom * sin_a
+        c, d = -zoom * sin_a, -zoom * cos_a
+        e, f = width / 2 + pan_x, height / 2 + pan_y
+
+        # Обратная матрица: определитель = -zoom^2, при zoom > 0 никогда не 0
+        det = a * d - b * c
+        ia, ib, ic, id_ = d / det, -b / det, -c / det, a / det
+        ie = -(ia * e + ib * f)
+        if_ = -(ic * e + id_ * f)
+        return cls(a, b, c, d, e, f, ia, ib, ic, id_, ie, if_, zoom, rotation, width, height)
+
+    def apply(self, x, y):
+        return self.a * x + self.b * y + self.e, self.c * x + self.d * y + self.f
+
+    def invert(self, sx, sy):
+        return self.ia * sx + self.ib * sy + self.ie, self.ic * sx + self.id * sy + self.if_
+
+    def apply_many(self, xs, ys):
+        a, b, c, d, e, f = self.a, self.b, self.c, self.d, self.e, self.f
+        screen_xs = array('d', [a * x + b * y + e for x, y in zip(xs, ys)])
+        screen_ys = array('d', [c * x + d * y + f for x, y in zip(xs, ys)])
+        return screen_xs, screen_ys
+
+    def invert_many(self, screen_xs, screen_ys):
+        a, b, c, d, e, f = self.ia, self.ib, self.ic, self.id, self.ie, self.if_
+        xs = array('d', [a * sx + b * sy + e for sx, sy in zip(screen_xs, screen_ys)])
+        ys = array('d', [c * sx + d * sy + f for sx, sy in zip(screen_xs, screen_ys)])
+        return xs, ys
 
 class CoordinateConverter:
     def __init__(self, state, canvas):
         self.state = state
         self.canvas = canvas
 
+        # Размер холста приходит из события <Configure> (см. set_canvas_size), чтобы не опрашивать Tk
+        self._canvas_size = None
+        self._transform = None
+        self._transform_key = None
+
+    def set_canvas_size(self, width, height):
+        self._canvas_size = (width, height)
+
+    def canvas_size(self):
+        if self._canvas_size is not None:
+            return self._canvas_size
+        # До первого <Configure> холст еще не размещен - спрашиваем Tk напрямую
+        return self.canvas.winfo_width(), self.canvas.winfo_height()
+
+    def get_transform(self):
+        width, height = self.canvas_size()
+        key = (self.state.view_version, width, height)
+        if key != self._transform_key:
+            s = self.state
+            self._transform = ViewTransform.from_camera(s.pan_x, s.pan_y, s.zoom, s.rotation, width, height)
+            self._transform_key = key
+        return self._transform
+
     # Из мировых (World) в экранные (Screen)
     def world_to_screen(self, world_x, world_y):
-        cx = self.canvas.winfo_width() / 2
-        cy = self.canvas.winfo_height() / 2
-        
-        # 1. Поворот (Rotation)
-        # Формула поворота точки (wx, wy) вокруг (0,0)
-        angle = self.state.rotation
-        rx = world_x * math.cos(angle) - world_y * math.sin(angle)
-        ry = world_x * math.sin(angle) + world_y * math.cos(angle)
-        
-        # 2. Масштабирование (Scale) и перевод в экранные (инверсия Y)
-        screen_x = cx + self.state.pan_x + (rx * self.state.zoom)
-        screen_y = cy + self.state.pan_y - (ry * self.state.zoom)
-        
-        return screen_x, screen_y
+        return self.get_transform().apply(world_x, world_y)
 
     # Из экранных (Screen) в мировые (World) - ОБРАТНОЕ ПРЕОБРАЗОВАНИЕ
     def screen_to_world(self, screen_x, screen_y):
-        cx = self.canvas.winfo_width() / 2
-        cy = self.canvas.winfo_height() / 2
-        
-        # 1. Убираем сдвиг и масштаб (обратный порядок)
-        # (screen_x - cx - pan) / zoom
-        unscaled_x = (screen_x - cx - self.state.pan_x) / self.state.zoom
-        unscaled_y = -(screen_y - cy - self.state.pan_y) / self.state.zoom # минус из-за инверсии Y
-        
-        # 2. Обратный поворот (Rotate back)
-        # Чтобы повернуть обратно, используем тот же угол со знаком минус
-        # cos(-a) = cos(a), sin(-a) = -sin(a)
-        angle = -self.state.rotation
-        world_x = unscaled_x * math.cos(angle) - unscaled_y * math.sin(angle)
-        world_y = unscaled_x * math.sin(angle) + unscaled_y * math.cos(angle)
-        
-        return world_x, world_y
\ No newline at end of file
+        return self.get_transform().invert(screen_x, screen_y)
+
+    # Пакетное преобразование: массивы мировых X и Y -> массивы экранных X и Y
+    def world_to_screen_many(self, xs, ys):
+        return self.get_transform().apply_many(xs, ys)
+
+    # Пакетное обратное преобразование: массивы экранных X и Y -> массивы мировых X и Y
+    def screen_to_world_many(self, screen_xs, screen_ys):
+        return self.get_transform().invert_many(screen_xs, screen_ys)
@@ -0,0 +1,130 @@
+# logic/drawing_file.py
+
+'''
+Собственный двоичный формат чертежа (*.mpcad).
+Структура файла (little-endian):
+    1) Заголовок фиксированной длины (HEADER): сигнатура, версия, длины таблиц, толщина S, число отрезков.
+    2) Таблица стилей (JSON, UTF-8) - все LineStyle из state.line_styles.
+    3) Таблица цветов (JSON, UTF-8) - список строк цветов Tk.
+    4) Записи отрезков фиксированной ширины (RECORD_SIZE байт на отрезок), разложенные по колонкам:
+       x1[n], y1[n], x2[n], y2[n] (float64), style[n], color[n] (uint32 - индексы в таблицах).
+Таблицы выровнены по 8 байт. Благодаря колоночной раскладке при открытии каждая колонка
+целиком копируется из отображенного в память (mmap) файла в array - без разбора отдельных записей на Python.
+'''
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from dataclasses import asdict
+from logic.styles import LineStyle
+
+MAGIC = b'MPCADBIN'
+VERSION = 1
+FILE_EXTENSION = '.mpcad'
+
+# сигнатура, версия, длина таблицы стилей, длина таблицы цветов, резерв, толщина S, число отрезков
+HEADER = struct.Struct('<8sIIIIdQ')
+
+# Колонки записи отрезка: (имя, typecode array)
+RECORD_COLUMNS = (('x1', 'd'), ('y1', 'd'), ('x2', 'd'), ('y2', 'd'), ('style', 'I'), ('color', 'I'))
+RECORD_SIZE = sum(array(code).itemsize for _, code in RECORD_COLUMNS)
+
+class DrawingFileError(Exception):
+    pass
+
+def _padded(blob):
+    return blob + b'\0' * (-len(blob) % 8)
+
+def _style_from_dict(data):
+    try:
+        # Кортежи в JSON превращаются в списки - возвращаем обратно
+        for field in ('dash_pattern', 'limits'):
+            if data.get(field) is not None:
+                data[field] = tuple(data[field])
+        return LineStyle(**data)
+    except (TypeError, KeyError, AttributeError) as e:
+        # Лишние/недостающие поля или не тот тип - поврежденная таблица стилей, а не ошибка программы
+        raise DrawingFileError(f"Файл поврежден: неверное описание стиля ({e})") from e
+
+def save_drawing(path, state):
+    store = state.segments
+    styles = list(state.line_styles.values())
+    style_index = {style.name: i for i, style in enumerate(styles)}
+    fallback = style_index.get('solid_main', 0)
+
+    # Перекодируем ID стилей хранилища в индексы таблицы стилей файла (через таблицу перекодировки, без цикла по отрезкам)
+    remap = [style_index.get(name, fallback) for name in store.style_names]
+    x1, y1, x2, y2, style_ids, color_ids = store.compact_columns()
+    file_style_ids = array('I', map(remap.__getitem__, style_ids))
+
+    style_blob = _padded(json.dumps([asdict(s) for s in styles], ensure_ascii=False).encode('utf-8'))
+    color_blob = _padded(json.dumps(store.color_names, ensure_ascii=False).encode('utf-8'))
+
+    columns = [x1, y1, x2, y2, file_style_ids, color_ids]
+    if sys.byteorder == 'big':
+        columns = [array(col.typecode, col) for col in columns]
+        for col in columns: col.byteswap()
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(style_blob), len(color_blob), 0,
+                            float(state.base_thickness_mm), len(x1)))
+        f.write(style_blob)
+        f.write(color_blob)
+        for col in columns:
+            col.tofile(f)
+
+def load_drawing(path):
+    """Читает файл и возвращает словарь: styles (dict имя -> LineStyle), base_thickness_mm,
+    columns (x1, y1, x2, y2, style_ids, color_ids), style_names, color_names."""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise DrawingFileError("Файл пуст")
+
+    with mm:
+        if len(mm) < HEADER.size:
+            raise DrawingFileError("Файл поврежден: слишком короткий заголовок")
+        magic, version, style_len, color_len, _, thickness, count = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise DrawingFileError("Это не файл чертежа MyPerfectCAD")
+        if version != VERSION:
+            raise DrawingFileError(f"Неподдерживаемая версия формата: {version}")
+
+        offset = HEADER.size
+        expected = offset + style_len + color_len + count * RECORD_SIZE
+        if len(mm) < expected:
+            raise DrawingFileError("Файл поврежден: данные обрезаны")
+
+        style_data = json.loads(bytes(mm[offset:offset + style_len]).rstrip(b'\0').decode('utf-8'))
+        offset += style_len
+        color_names = json.loads(bytes(mm[offset:offset + color_len]).rstrip(b'\0').decode('utf-8'))
+        offset += color_len
+
+        # Каждая колонка - один непрерывный блок: копируем его целиком
+        columns = []
+        view = memoryview(mm)
+        try:
+            for _, code in RECORD_COLUMNS:
+                col = array(code)
+                size = count * col.itemsize
+                col.frombytes(view[offset:offset + size])
+                if sys.byteorder == 'big': col.byteswap()
+                columns.append(col)
+                offset += size
+        finally:
+            view.release()
+
+    styles = [_style_from_dict(data) for data in style_data]
+    style_ids, color_ids = columns[4], columns[5]
+    if count and (max(style_ids) >= len(styles) or max(color_ids) >= len(color_names)):
+        raise DrawingFileError("Файл поврежден: ссылка на несуществующий стиль или цвет")
+    return {
+        'styles': {style.name: style for style in styles},
+        'base_thickness_mm': thickness,
+        'columns': columns,
+        'style_names': [style.name for style in styles],
+        'color_names': color_names,
+    }
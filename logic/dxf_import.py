@@ -0,0 +1,184 @@
+# logic/dxf_import.py
+
+'''
+Потоковое чтение DXF (ASCII) без загрузки файла в память.
+DXF - это последовательность пар строк "групповой код / значение". Генератор iter_group_codes
+читает их по одной, а read_dxf_segments идет по секциям:
+    1) TABLES  - запоминает тип линии и цвет каждого слоя (LAYER),
+    2) ENTITIES - превращает LINE и LWPOLYLINE (по звеньям) в отрезки.
+Отрезки отдаются пачками колонок (x1, y1, x2, y2, стили, цвета) - как их хранит SegmentStore,
+без объекта Segment на каждый отрезок.
+В памяти держится только текущий примитив и пачка готовых отрезков, поэтому размер файла не важен.
+Дуговые звенья полилиний (bulge, код 42) заменяются хордами.
+'''
+
+import os
+from array import array
+
+# Сколько отрезков отдавать за раз (пачки собираются в потоке Tk и добавляются в чертеж одним вызовом)
+BATCH_SIZE = 5000
+
+# Типы линий DXF -> ключи GOST_STYLES (суффиксы вариантов вроде DASHED2 / HIDDENX2 отбрасываются)
+LINETYPE_STYLES = {
+    'CONTINUOUS': 'solid_main',
+    'DASHED': 'dashed',
+    'HIDDEN': 'dashed',
+    'ACAD_ISO02W100': 'dashed',
+    'ACAD_ISO03W100': 'dashed',
+    'CENTER': 'dash_dot_thin',
+    'DASHDOT': 'dash_dot_thin',
+    'ACAD_ISO04W100': 'dash_dot_thin',
+    'ACAD_ISO08W100': 'dash_dot_thin',
+    'ACAD_ISO10W100': 'dash_dot_thin',
+    'PHANTOM': 'dash_dot_dot',
+    'DIVIDE': 'dash_dot_dot',
+    'ACAD_ISO05W100': 'dash_dot_dot',
+    'ACAD_ISO12W100': 'dash_dot_dot',
+}
+
+# Стандартные цвета AutoCAD (ACI) 1..7; 7 - "белый/черный", на белом фоне рисуем черным
+ACI_COLORS = {1: 'red', 2: 'yellow', 3: 'green', 4: 'cyan', 5: 'blue', 6: 'magenta', 7: 'black'}
+
+DEFAULT_STYLE = 'solid_main'
+DEFAULT_COLOR = 'black'
+
+class DxfImportError(Exception):
+    pass
+
+def iter_group_codes(f):
+    """Генератор пар (код, значение) из двоичного файла DXF."""
+    while True:
+        code_line = f.readline()
+        if not code_line: return
+        value_line = f.readline()
+        try:
+            code = int(code_line)
+        except ValueError:
+            raise DxfImportError(f"Некорректный групповой код: {code_line[:40]!r}")
+        yield code, value_line.strip().decode('utf-8', 'replace')
+
+def linetype_to_style(linetype, available=None):
+    """Ключ стиля для типа линии DXF (или None, если тип не распознан)."""
+    # Типы линий, записанные нашим экспортом, называются по ключу стиля
+    if available is not None and linetype.lower() in available:
+        return linetype.lower()
+    name = linetype.upper()
+    style = LINETYPE_STYLES.get(name) or LINETYPE_STYLES.get(name.rstrip('0123456789').removesuffix('X'))
+    if style is not None and available is not None and style not in available:
+        return None
+    return style
+
+def _aci_to_color(value):
+    return ACI_COLORS.get(abs(value))
+
+def _true_color(value):
+    return f"#{value & 0xFFFFFF:06x}"
+
+def _entity_attributes(pairs, layers, available):
+    """Стиль и цвет примитива с учетом BYLAYER."""
+    layer_style, layer_color = layers.get(pairs.get(8, '0'), (None, None))
+
+    linetype = pairs.get(6, 'BYLAYER')
+    if linetype.upper() == 'BYLAYER':
+        style = layer_style
+    else:
+        style = linetype_to_style(linetype, available)
+
+    if 420 in pairs:
+        color = _true_color(int(pairs[420]))
+    elif 62 in pairs and int(pairs[62]) not in (0, 256):
+        color = _aci_to_color(int(pairs[62]))
+    else:
+        color = layer_color
+    return style or DEFAULT_STYLE, color or DEFAULT_COLOR
+
+def _new_batch():
+    """Пустая пачка колонок: (x1s, y1s, x2s, y2s, стили, цвета)."""
+    return array('d'), array('d'), array('d'), array('d'), [], []
+
+def _append_line(batch, pairs, style, color):
+    x1s, y1s, x2s, y2s, styles, colors = batch
+    x1s.append(float(pairs.get(10, 0))); y1s.append(float(pairs.get(20, 0)))
+    x2s.append(float(pairs.get(11, 0))); y2s.append(float(pairs.get(21, 0)))
+    styles.append(style); colors.append(color)
+
+def _append_polyline(batch, vertices, closed, style, color):
+    if closed and len(vertices) > 2:
+        vertices = vertices + vertices[:1]
+    count = len(vertices) - 1
+    if count <= 0: return
+    x1s, y1s, x2s, y2s, styles, colors = batch
+    x1s.extend(x for x, _ in vertices[:-1]); y1s.extend(y for _, y in vertices[:-1])
+    x2s.extend(x for x, _ in vertices[1:]); y2s.extend(y for _, y in vertices[1:])
+    styles.extend([style] * count); colors.extend([color] * count)
+
+def _read_entity(pairs, collect_vertices=False):
+    """Собирает пары примитива до следующего кода 0.
+    Возвращает (словарь последних значений по коду, вершины LWPOLYLINE, следующая пара)."""
+    values = {}
+    vertices = []
+    for pair in pairs:
+        code, value = pair
+        if code == 0:
+            return values, vertices, pair
+        if collect_vertices:
+            if code == 10:
+                vertices.append([float(value), 0.0])
+            elif code == 20 and vertices:
+                vertices[-1][1] = float(value)
+        values[code] = value
+    return values, vertices, None
+
+def read_dxf_segments(path, available_styles=None, batch_size=BATCH_SIZE):
+    """Генератор пачек (доля прочитанного файла 0..1, (x1s, y1s, x2s, y2s, стили, цвета)).
+    available_styles - множество существующих ключей стилей: неизвестные типы линий заменяются на solid_main."""
+    total = os.path.getsize(path) or 1
+    layers = {}  # имя слоя -> (стиль, цвет)
+    batch = _new_batch()
+
+    with open(path, 'rb') as f:
+        pairs = iter_group_codes(f)
+        section = None
+        pair = next(pairs, None)
+        while pair is not None:
+            code, value = pair
+            if code != 0:
+                if code == 2 and section == '':
+                    section = value
+                pair = next(pairs, None)
+                continue
+
+            if value == 'SECTION':
+                section = ''
+                pair = next(pairs, None)
+            elif value == 'ENDSEC':
+                section = None
+                pair = next(pairs, None)
+            elif value == 'EOF':
+                break
+            elif section == 'TABLES' and value == 'LAYER':
+                values, _, pair = _read_entity(pairs)
+                if 2 in values:
+                    color = int(values[62]) if 62 in values else 7
+                    style = linetype_to_style(values.get(6, 'CONTINUOUS'), available_styles)
+                    layers[values[2]] = (style, _aci_to_color(color))
+            elif section == 'ENTITIES' and value in ('LINE', 'LWPOLYLINE'):
+                try:
+                    values, vertices, pair = _read_entity(pairs, collect_vertices=(value == 'LWPOLYLINE'))
+                    style, color = _entity_attributes(values, layers, available_styles)
+                    if value == 'LINE':
+                        _append_line(batch, values, style, color)
+                    else:
+                        closed = bool(int(values.get(70, 0)) & 1)
+                        _append_polyline(batch, vertices, closed, style, color)
+                except ValueError:
+                    raise DxfImportError(f"Некорректные данные примитива {value}")
+
+                if len(batch[0]) >= batch_size:
+                    yield f.tell() / total, batch
+                    batch = _new_batch()
+            else:
+                # Прочие примитивы и записи таблиц пропускаем целиком
+                _, _, pair = _read_entity(pairs)
+
+        yield 1.0, batch
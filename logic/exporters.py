@@ -0,0 +1,171 @@
+# logic/exporters.py
+
+'''
+Потоковый экспорт чертежа в DXF (R12, ASCII) и SVG.
+Отрезки читаются из state.segments по одному, текст копится в небольшом буфере
+и записывается в файл пачками по CHUNK_SIZE отрезков - весь документ в памяти не строится.
+Экспортеры - генераторы: после каждой пачки они отдают долю выполненной работы (0..1),
+поэтому их можно крутить в BackgroundTask и прерывать между пачками.
+
+Стили:
+    - штриховые стили -> таблица LTYPE в DXF (по expand_dash_pattern) и stroke-dasharray в SVG,
+    - волнистая и линия с изломами -> ломаные из logic/patterns.py в мировых координатах.
+В DXF R12 нет произвольных цветов и толщин: цвет приводится к ближайшему стандартному (ACI 1..7).
+'''
+
+from logic.styles import expand_dash_pattern
+from logic.patterns import wave_coords, zigzag_coords
+
+# Сколько отрезков записывать за одну пачку
+CHUNK_SIZE = 2000
+
+# Предел точек ломаной волны/зигзага на отрезок (память на один примитив ограничена)
+EXPORT_MAX_POINTS = 20000
+
+# Поля вокруг чертежа в SVG (мировые единицы)
+SVG_MARGIN = 5.0
+
+# Стандартные цвета AutoCAD (ACI) в RGB; 7 на белом фоне - черный
+ACI_RGB = {1: (255, 0, 0), 2: (255, 255, 0), 3: (0, 255, 0), 4: (0, 255, 255),
+           5: (0, 0, 255), 6: (255, 0, 255), 7: (0, 0, 0)}
+
+def rgb_to_aci(rgb):
+    """Ближайший стандартный цвет ACI для (r, g, b) 0..255."""
+    r, g, b = rgb
+    return min(ACI_RGB, key=lambda aci: (ACI_RGB[aci][0] - r) ** 2 + (ACI_RGB[aci][1] - g) ** 2 + (ACI_RGB[aci][2] - b) ** 2)
+
+def hex_to_rgb(color):
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+def linetype_name(style):
+    return 'CONTINUOUS' if expand_dash_pattern(style) is None else style.name.upper()
+
+def _polyline(style, x1, y1, x2, y2):
+    """Ломаная для волнистых/изломанных стилей (или None для обычных)."""
+    if style is None: return None
+    if style.base_type == 'wave':
+        return wave_coords(x1, y1, x2, y2, 1.0, EXPORT_MAX_POINTS)
+    if style.base_type == 'zigzag':
+        return zigzag_coords(x1, y1, x2, y2, 1.0, EXPORT_MAX_POINTS)
+    return None
+
+def _export_chunks(f, store, write_segment):
+    """Общий цикл экспортеров: пишет отрезки пачками и отдает прогресс.
+    Хранилище читается по ходу, без копии колонок."""
+    total = len(store) or 1
+    buffer = []
+    done = 0
+    for seg_id in store.ids():
+        write_segment(buffer, seg_id)
+        done += 1
+        if done % CHUNK_SIZE == 0:
+            f.write(''.join(buffer))
+            buffer.clear()
+            yield done / total
+    f.write(''.join(buffer))
+
+# --- DXF ---
+
+def _dxf_pairs(*pairs):
+    return ''.join(f"{code}\n{value}\n" for code, value in pairs)
+
+def _dxf_ltype(style):
+    pattern = expand_dash_pattern(style) if style is not None else None
+    if pattern is None:
+        return _dxf_pairs((0, 'LTYPE'), (2, 'CONTINUOUS'), (70, 0), (3, 'Solid line'),
+                          (72, 65), (73, 0), (40, 0.0))
+    # Четные элементы - штрихи (положительные), нечетные - пробелы (отрицательные)
+    elements = [(49, value if i % 2 == 0 else -value) for i, value in enumerate(pattern)]
+    return _dxf_pairs((0, 'LTYPE'), (2, linetype_name(style)), (70, 0), (3, style.display_name),
+                      (72, 65), (73, len(pattern)), (40, float(sum(pattern))), *elements)
+
+def export_dxf(path, store, line_styles, colors):
+    """Генератор: пишет DXF и отдает прогресс 0..1.
+    line_styles - снимок словаря стилей, colors - имя цвета Tk -> '#rrggbb'."""
+    aci = {name: rgb_to_aci(hex_to_rgb(value)) for name, value in colors.items()}
+    ltypes = {'CONTINUOUS': None}
+    for style in line_styles.values():
+        ltypes.setdefault(linetype_name(style), style)
+
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(_dxf_pairs((0, 'SECTION'), (2, 'HEADER'), (9, '$ACADVER'), (1, 'AC1009'), (0, 'ENDSEC')))
+        f.write(_dxf_pairs((0, 'SECTION'), (2, 'TABLES'), (0, 'TABLE'), (2, 'LTYPE'), (70, len(ltypes))))
+        for style in ltypes.values():
+            f.write(_dxf_ltype(style))
+        f.write(_dxf_pairs((0, 'ENDTAB'),
+                           (0, 'TABLE'), (2, 'LAYER'), (70, 1),
+                           (0, 'LAYER'), (2, '0'), (70, 0), (62, 7), (6, 'CONTINUOUS'),
+                           (0, 'ENDTAB'), (0, 'ENDSEC')))
+        f.write(_dxf_pairs((0, 'SECTION'), (2, 'ENTITIES')))
+
+        x1s, y1s, x2s, y2s = store.x1, store.y1, store.x2, store.y2
+
+        def write_segment(buffer, seg_id):
+            style = line_styles.get(store.get_style(seg_id))
+            ltype = linetype_name(style) if style is not None else 'CONTINUOUS'
+            color = aci.get(store.get_color(seg_id), 7)
+            x1, y1, x2, y2 = x1s[seg_id], y1s[seg_id], x2s[seg_id], y2s[seg_id]
+            coords = _polyline(style, x1, y1, x2, y2)
+            if coords is None:
+                buffer.append(_dxf_pairs((0, 'LINE'), (8, '0'), (6, ltype), (62, color),
+                                         (10, x1), (20, y1), (30, 0.0), (11, x2), (21, y2), (31, 0.0)))
+            else:
+                # R12 не знает LWPOLYLINE - используем POLYLINE/VERTEX
+                buffer.append(_dxf_pairs((0, 'POLYLINE'), (8, '0'), (6, ltype), (62, color), (66, 1), (70, 0)))
+                for i in range(0, len(coords), 2):
+                    buffer.append(_dxf_pairs((0, 'VERTEX'), (8, '0'), (10, coords[i]), (20, coords[i + 1]), (30, 0.0)))
+                buffer.append(_dxf_pairs((0, 'SEQEND'), (8, '0')))
+
+        yield from _export_chunks(f, store, write_segment)
+        f.write(_dxf_pairs((0, 'ENDSEC'), (0, 'EOF')))
+    yield 1.0
+
+# --- SVG ---
+
+def _svg_number(value):
+    return f"{value:.6g}"
+
+def export_svg(path, store, line_styles, colors, base_thickness_mm):
+    """Генератор: пишет SVG (1 мировая единица = 1 мм) и отдает прогресс 0..1.
+    Толщина и штрихи каждого стиля описаны один раз CSS-классом, а не у каждой линии."""
+    bounds = store.bounds() or (0.0, 0.0, 0.0, 0.0)
+    min_x, min_y = bounds[0] - SVG_MARGIN, bounds[1] - SVG_MARGIN
+    width, height = bounds[2] - bounds[0] + 2 * SVG_MARGIN, bounds[3] - bounds[1] + 2 * SVG_MARGIN
+
+    style_classes = {name: f"s{i}" for i, name in enumerate(line_styles)}
+    css = []
+    for name, style in line_styles.items():
+        stroke_width = base_thickness_mm if style.is_main else base_thickness_mm / 2
+        rule = f"stroke-width:{_svg_number(stroke_width)}"
+        pattern = expand_dash_pattern(style)
+        if pattern:
+            rule += ";stroke-dasharray:" + ' '.join(_svg_number(v) for v in pattern)
+        css.append(f".{style_classes[name]}{{{rule}}}")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{_svg_number(width)}mm" height="{_svg_number(height)}mm" '
+                f'viewBox="{_svg_number(min_x)} {_svg_number(-min_y - height)} {_svg_number(width)} {_svg_number(height)}">\n')
+        f.write('<style>\n' + '\n'.join(css) + '\n</style>\n')
+        # Ось Y чертежа направлена вверх, а в SVG - вниз
+        f.write('<g transform="scale(1,-1)" fill="none" stroke-linecap="round" stroke-linejoin="round">\n')
+
+        x1s, y1s, x2s, y2s = store.x1, store.y1, store.x2, store.y2
+        n = _svg_number
+
+        def write_segment(buffer, seg_id):
+            style_name = store.get_style(seg_id)
+            style = line_styles.get(style_name)
+            css_class = style_classes.get(style_name, '')
+            color = colors.get(store.get_color(seg_id), '#000000')
+            x1, y1, x2, y2 = x1s[seg_id], y1s[seg_id], x2s[seg_id], y2s[seg_id]
+            coords = _polyline(style, x1, y1, x2, y2)
+            if coords is None:
+                buffer.append(f'<line class="{css_class}" stroke="{color}" x1="{n(x1)}" y1="{n(y1)}" x2="{n(x2)}" y2="{n(y2)}"/>\n')
+            else:
+                points = ' '.join(f"{n(coords[i])},{n(coords[i + 1])}" for i in range(0, len(coords), 2))
+                buffer.append(f'<polyline class="{css_class}" stroke="{color}" points="{points}"/>\n')
+
+        yield from _export_chunks(f, store, write_segment)
+        f.write('</g>\n</svg>\n')
+    yield 1.0
@@ -7,7 +7,75 @@
 
 import math
 
+# Расстояние от точки (mx, my) до отрезка (x1, y1)-(x2, y2)
+def point_segment_distance(mx, my, x1, y1, x2, y2):
+    # Длина отрезка в квадрате
+    l2 = (x1 - x2)**2 + (y1 - y2)**2
+    if l2 == 0: 
+        # Отрезок - это точка
+        return math.sqrt((mx - x1)**2 + (my - y1)**2)
+
+    # Проекция точки на прямую (параметр t от 0 до 1)
+    t = ((mx - x1) * (x2 - x1) + (my - y1) * (y2 - y1)) / l2
+    
+    # Ограничиваем t, чтобы не улететь за границы отрезка
+    t = max(0, min(1, t))
+    
+    # Координаты ближайшей точки на отрезке
+    proj_x = x1 + t * (x2 - x1)
+    proj_y = y1 + t * (y2 - y1)
+    
+    # Расстояние от курсора до проекции
+    return math.sqrt((mx - proj_x)**2 + (my - proj_y)**2)
+
+# Точка пересечения двух отрезков (x, y) или None (параллельные, совпадающие или не пересекаются)
+def segment_intersection(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    rx, ry = ax2 - ax1, ay2 - ay1
+    sx, sy = bx2 - bx1, by2 - by1
+    denom = rx * sy - ry * sx
+    if denom == 0: return None
+    qx, qy = bx1 - ax1, by1 - ay1
+    t = (qx * sy - qy * sx) / denom
+    u = (qx * ry - qy * rx) / denom
+    if 0 <= t <= 1 and 0 <= u <= 1:
+        return ax1 + t * rx, ay1 + t * ry
+    return None
+
+# Ближайшая к (mx, my) точка отрезка
+def closest_point_on_segment(mx, my, x1, y1, x2, y2):
+    l2 = (x1 - x2)**2 + (y1 - y2)**2
+    if l2 == 0: return x1, y1
+    t = max(0, min(1, ((mx - x1) * (x2 - x1) + (my - y1) * (y2 - y1)) / l2))
+    return x1 + t * (x2 - x1), y1 + t * (y2 - y1)
+
+# Отрезок целиком лежит в прямоугольнике (выделение рамкой "окном")
+def segment_inside_rect(x1, y1, x2, y2, min_x, min_y, max_x, max_y):
+    return (min_x <= x1 <= max_x and min_y <= y1 <= max_y and
+            min_x <= x2 <= max_x and min_y <= y2 <= max_y)
+
+# Отрезок касается прямоугольника (выделение "секущей" рамкой) - отсечение Лианга-Барски
+def segment_intersects_rect(x1, y1, x2, y2, min_x, min_y, max_x, max_y):
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+    # Для каждой из 4 сторон: p - скорость приближения к стороне, q - расстояние до нее
+    for p, q in ((-dx, x1 - min_x), (dx, max_x - x1), (-dy, y1 - min_y), (dy, max_y - y1)):
+        if p == 0:
+            # Отрезок параллелен стороне и лежит снаружи
+            if q < 0: return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1: return False
+                t0 = max(t0, t)
+            else:
+                if t < t0: return False
+                t1 = min(t1, t)
+    return True
+
 class Point:
+    # __slots__ убирает у каждого экземпляра собственный __dict__ (миллионы точек - заметная экономия памяти)
+    __slots__ = ('x', 'y')
+
     # Устанавливаем точку в декартовых по умолчанию
     def __init__(self, x=0.0, y=0.0):
         self.x = float(x)
@@ -28,47 +96,56 @@ class Point:
         return f"Point(x={self.x:.2f}, y={self.y:.2f})"
 
 class Segment:
+    __slots__ = ('_p1', '_p2', 'style_name', 'color', '_length', '_angle')
+
     # Инициализация отрезка по умолчанию
     def __init__(self, p1: Point, p2: Point, style_name = 'solid_main', color='black'):
-        self.p1 = p1
-        self.p2 = p2
+        self._p1 = p1
+        self._p2 = p2
         self.style_name = style_name # Ссылка на ключ в словаре стилей
         self.color = color
+        # Кэш длины и угла: считаются при первом обращении, сбрасываются при замене концов
+        self._length = None
+        self._angle = None
 
     # @property - декоратор для обращения к методу объекта без ()
+
+    # Концы отрезка. Точку, переданную в отрезок, считаем значением:
+    # чтобы сдвинуть конец, присваиваем новую точку (seg.p1 = Point(...)) - это сбрасывает кэш
+    @property
+    def p1(self):
+        return self._p1
+
+    @p1.setter
+    def p1(self, point):
+        self._p1 = point
+        self._length = self._angle = None
+
+    @property
+    def p2(self):
+        return self._p2
+
+    @p2.setter
+    def p2(self, point):
+        self._p2 = point
+        self._length = self._angle = None
     
     # Метод вычисляет и возвращает длину отрезка
     @property
     def length(self):
-        return math.sqrt((self.p2.x - self.p1.x)**2 + (self.p2.y - self.p1.y)**2)
+        if self._length is None:
+            self._length = math.hypot(self._p2.x - self._p1.x, self._p2.y - self._p1.y)
+        return self._length
 
     # Метод вычисляет и возвращает угол наклона отрезка в радианах
     @property
     def angle(self):
-        return math.atan2(self.p2.y - self.p1.y, self.p2.x - self.p1.x)
+        if self._angle is None:
+            self._angle = math.atan2(self._p2.y - self._p1.y, self._p2.x - self._p1.x)
+        return self._angle
     
     def distance_to_point(self, mx, my):
-        x1, y1 = self.p1.x, self.p1.y
-        x2, y2 = self.p2.x, self.p2.y
-        
-        # Длина отрезка в квадрате
-        l2 = (x1 - x2)**2 + (y1 - y2)**2
-        if l2 == 0: 
-            # Отрезок - это точка
-            return math.sqrt((mx - x1)**2 + (my - y1)**2)
-
-        # Проекция точки на прямую (параметр t от 0 до 1)
-        t = ((mx - x1) * (x2 - x1) + (my - y1) * (y2 - y1)) / l2
-        
-        # Ограничиваем t, чтобы не улететь за границы отрезка
-        t = max(0, min(1, t))
-        
-        # Координаты ближайшей точки на отрезке
-        proj_x = x1 + t * (x2 - x1)
-        proj_y = y1 + t * (y2 - y1)
-        
-        # Расстояние от курсора до проекции
-        return math.sqrt((mx - proj_x)**2 + (my - proj_y)**2)
+        return point_segment_distance(mx, my, self._p1.x, self._p1.y, self._p2.x, self._p2.y)
     
     def __repr__(self):
         return f"Segment({self.p1}, {self.p2}, style='{self.style_name}')"
\ No newline at end of file
@@ -0,0 +1,39 @@
+# logic/grid.py
+
+'''
+Адаптивная сетка.
+Шаг сетки на экране подбирается под зум: из кратных базового шага (state.grid_step) 1, 2, 5, 10, 20, 50, ...
+берется наименьший, при котором соседние линии отстоят не меньше чем на GRID_MIN_SPACING_PX пикселей.
+Так при сильном отдалении линий остается столько же, сколько помещается на экране, а не тысячи.
+Линии двух уровней: второстепенные (каждая) и основные (каждая major_every-я, рисуются заметнее);
+major_every подобран так, чтобы основной шаг тоже был "круглым": x1 -> x5, x2 -> x10, x5 -> x10.
+
+Линии задаются целым индексом i (координата = i * шаг), а не накоплением curr += step:
+нет накопления ошибки округления, ось - это ровно i == 0, основная линия - i % major_every == 0.
+'''
+
+import math
+
+# Минимальное расстояние между соседними линиями сетки на экране (пиксели)
+GRID_MIN_SPACING_PX = 8.0
+
+# Кратные базового шага внутри одного десятичного порядка -> через сколько линий идет основная
+STEP_MULTIPLIERS = {1: 5, 2: 5, 5: 2}
+
+def grid_levels(base_step, zoom, min_spacing_px=GRID_MIN_SPACING_PX):
+    """(шаг, major_every): наименьший шаг вида base_step * (1|2|5) * 10^k (k >= 0),
+    дающий на экране не меньше min_spacing_px, и период основных линий."""
+    if base_step * zoom >= min_spacing_px:
+        return base_step, STEP_MULTIPLIERS[1]
+    # Во сколько раз нужно укрупнить шаг; перебираем только нужный порядок и следующий
+    ratio = min_spacing_px / (base_step * zoom)
+    decade = 10 ** math.floor(math.log10(ratio))
+    for scale in (decade, decade * 10):
+        for multiplier, major_every in STEP_MULTIPLIERS.items():
+            if multiplier * scale >= ratio:
+                return base_step * multiplier * scale, major_every
+    return base_step * decade * 10, STEP_MULTIPLIERS[1]
+
+def line_indices(min_value, max_value, step):
+    """Индексы i линий сетки i * step, попадающих в [min_value, max_value]."""
+    return range(math.ceil(min_value / step), math.floor(max_value / step) + 1)
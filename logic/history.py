@@ -0,0 +1,246 @@
+# logic/history.py
+
+'''
+История действий для отмены/повтора (Undo/Redo).
+Каждое действие - объект команды, который хранит только изменения (дельту), а не снимок чертежа:
+    AddSegments      - ID добавленных отрезков (их записи снимаются только при отмене),
+    RemoveSegments   - записи удаленных отрезков (ID, координаты, индексы стиля и цвета),
+    ChangeAttributes - ID отрезков и их прежние индексы стиля или цвета,
+    DeleteStyle      - удаленный LineStyle и перекрашенные в стиль по умолчанию отрезки.
+Записи лежат в компактных массивах array, поэтому отмена стоит O(число измененных отрезков).
+Отмена удаления возвращает отрезки в те же слоты (те же ID), так что выделение и холст остаются согласованными.
+
+History ограничивает суммарный объем команд бюджетом памяти: самые старые команды вытесняются.
+'''
+
+from array import array
+from collections import deque
+from itertools import repeat
+
+# Бюджет памяти истории по умолчанию (байт)
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+# Оценка накладных расходов на одну команду (сам объект, массивы, заголовки)
+COMMAND_OVERHEAD_BYTES = 512
+
+def _array_bytes(arr):
+    return arr.itemsize * len(arr)
+
+class Command:
+    description = ""
+
+    def undo(self, state):
+        raise NotImplementedError
+
+    def redo(self, state):
+        raise NotImplementedError
+
+    def size_bytes(self):
+        return COMMAND_OVERHEAD_BYTES
+
+class _SegmentRecords:
+    """Записи отрезков в колонках: ID, координаты (по 4 числа), индексы стиля и цвета."""
+
+    def __init__(self):
+        self.ids = array('I')
+        self.coords = array('d')
+        self.style_ids = array('I')
+        self.color_ids = array('I')
+
+    def capture(self, store, seg_id):
+        self.ids.append(seg_id)
+        self.coords.extend(store.coords(seg_id))
+        self.style_ids.append(store.style_ids[seg_id])
+        self.color_ids.append(store.color_ids[seg_id])
+
+    def restore_all(self, state):
+        coords = self.coords
+        for i, seg_id in enumerate(self.ids):
+            state.restore_segment(seg_id, coords[4*i], coords[4*i + 1], coords[4*i + 2], coords[4*i + 3],
+                                  self.style_ids[i], self.color_ids[i])
+
+    def remove_all(self, state):
+        for seg_id in self.ids:
+            state.remove_segment_id(seg_id)
+
+    def size_bytes(self):
+        return sum(_array_bytes(a) for a in (self.ids, self.coords, self.style_ids, self.color_ids))
+
+class AddSegments(Command):
+    description = "Добавление отрезков"
+
+    def __init__(self, seg_ids):
+        # ID уже добавленных отрезков
+        self.ids = array('I', seg_ids)
+        self._records = None
+
+    def undo(self, state):
+        # Запоминаем записи только сейчас - пока команда не отменена, они живут в хранилище
+        self._records = _SegmentRecords()
+        for seg_id in self.ids:
+            self._records.capture(state.segments, seg_id)
+        self._records.remove_all(state)
+
+    def redo(self, state):
+        self._records.restore_all(state)
+        self._records = None
+
+    def size_bytes(self):
+        size = COMMAND_OVERHEAD_BYTES + _array_bytes(self.ids)
+        return size + (self._records.size_bytes() if self._records else 0)
+
+class RemoveSegments(Command):
+    description = "Удаление отрезков"
+
+    def __init__(self, store, seg_ids):
+        self._records = _SegmentRecords()
+        for seg_id in seg_ids:
+            if store.is_alive(seg_id):
+                self._records.capture(store, seg_id)
+
+    def undo(self, state):
+        self._records.restore_all(state)
+
+    def redo(self, state):
+        self._records.remove_all(state)
+
+    def size_bytes(self):
+        return COMMAND_OVERHEAD_BYTES + self._records.size_bytes()
+
+class ChangeAttributes(Command):
+    """Смена стиля ('style') или цвета ('color') группы отрезков."""
+
+    def __init__(self, store, seg_ids, attribute, new_value):
+        self.attribute = attribute
+        self.description = "Смена стиля" if attribute == 'style' else "Смена цвета"
+        self.ids = array('I', seg_ids)
+        column = self._column(store)
+        self.old_values = array('I', (column[seg_id] for seg_id in self.ids))
+        self.new_value = store.style_id(new_value) if attribute == 'style' else store.color_id(new_value)
+
+    def _column(self, store):
+        return store.style_ids if self.attribute == 'style' else store.color_ids
+
+    def undo(self, state):
+        # Через хранилище, а не в колонку напрямую - так обновляются обратные индексы стиль/цвет -> ID
+        state.segments.assign_ids(self.attribute, self.ids, self.old_values)
+        self._discard_chains(state)
+
+    def redo(self, state):
+        state.segments.assign_ids(self.attribute, self.ids, repeat(self.new_value))
+        self._discard_chains(state)
+
+    def _discard_chains(self, state):
+        # Цепочки непрерывных штрихов собираются из отрезков одного стиля - смена стиля их рвет и сшивает
+        if self.attribute == 'style':
+            state.chains.discard_many(self.ids)
+
+    def size_bytes(self):
+        return COMMAND_OVERHEAD_BYTES + _array_bytes(self.ids) + _array_bytes(self.old_values)
+
+class DeleteStyle(Command):
+    description = "Удаление стиля"
+
+    def __init__(self, state, style_name, default_style='solid_main'):
+        self.style_name = style_name
+        self.style = state.line_styles[style_name]
+        self.order = list(state.line_styles)  # Порядок стилей в словаре (для списков в интерфейсе)
+        self.default_style = default_style
+        self.was_current = (state.current_style_name == style_name)
+        self.restyle = ChangeAttributes(state.segments, state.segments.ids_with_style(style_name),
+                                        'style', default_style)
+
+    def undo(self, state):
+        styles = dict(state.line_styles)
+        styles[self.style_name] = self.style
+        state.line_styles.clear()
+        # Возвращаем стиль на прежнее место, новые стили (если появились) - в конец
+        state.line_styles.update((name, styles[name]) for name in self.order if name in styles)
+        state.line_styles.update(styles)
+        state.style_cache.invalidate()
+        self.restyle.undo(state)
+        if self.was_current:
+            state.current_style_name = self.style_name
+
+    def redo(self, state):
+        self.restyle.redo(state)
+        if state.current_style_name == self.style_name:
+            state.current_style_name = self.default_style
+        del state.line_styles[self.style_name]
+        state.style_cache.invalidate()
+
+    def size_bytes(self):
+        return COMMAND_OVERHEAD_BYTES + self.restyle.size_bytes()
+
+class History:
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._undo = deque()
+        self._redo = []
+        self._size = 0
+
+    def execute(self, state, command):
+        """Выполняет команду и записывает ее в историю."""
+        command.redo(state)
+        self.push(command)
+        return command
+
+    def push(self, command):
+        """Записывает в историю уже выполненную команду."""
+        # Новое действие отменяет возможность повтора
+        for cmd in self._redo:
+            self._size -= cmd.size_bytes()
+        self._redo.clear()
+        self._undo.append(command)
+        self._size += command.size_bytes()
+        self._evict()
+
+    def set_budget(self, budget_bytes):
+        """Меняет бюджет памяти; если история в него уже не помещается, самые старые действия вытесняются сразу."""
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def _evict(self):
+        # Самые старые команды уходят первыми; последнюю оставляем, даже если она больше бюджета
+        while self._size > self.budget_bytes and len(self._undo) > 1:
+            self._size -= self._undo.popleft().size_bytes()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self, state):
+        if not self._undo: return None
+        command = self._undo.pop()
+        self._size -= command.size_bytes()
+        command.undo(state)
+        # Размер мог измениться (AddSegments запоминает записи при отмене)
+        self._size += command.size_bytes()
+        self._redo.append(command)
+        self._evict_redo()
+        return command
+
+    def redo(self, state):
+        if not self._redo: return None
+        command = self._redo.pop()
+        self._size -= command.size_bytes()
+        command.redo(state)
+        self._size += command.size_bytes()
+        self._undo.append(command)
+        self._evict()
+        return command
+
+    def _evict_redo(self):
+        # Если бюджет превышен из-за отмененных команд - сначала жертвуем старой историей отмены
+        while self._size > self.budget_bytes and self._undo:
+            self._size -= self._undo.popleft().size_bytes()
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._size = 0
+
+    def size_bytes(self):
+        return self._size
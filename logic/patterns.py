@@ -0,0 +1,222 @@
+# logic/patterns.py
+
+'''
+Геометрия стилизованных линий: разбиение отрезков на штрихи и построение ломаных волны и зигзага.
+Единственный движок паттернов в программе - им пользуются рендерер, превью стилей в главном окне
+и в менеджере стилей, а также экспорт, поэтому на экране, в превью и в файле линия выглядит одинаково.
+
+Функции ничего не знают о холсте и работают в любых единицах:
+    - рендерер вызывает их в пикселях экрана (scale = зум),
+    - превью - в пикселях с фиксированным масштабом,
+    - экспорт в DXF/SVG - в мировых координатах (scale = 1).
+Размеры волны и излома заданы для scale = 1 (мировые единицы) и умножаются на scale.
+
+Пакетные функции (*_batch) принимают колонки x1s, y1s, x2s, y2s сразу для многих отрезков
+и возвращают (coords, offsets): все координаты подряд в array('d') и границы отрезков в них
+(координаты отрезка i - coords[offsets[i]:offsets[i + 1]]). Все, что не зависит от отрезка
+(таблица штрихов периода, отсчеты синусоиды), считается один раз на вызов, а положения
+штрихов и отсчетов - умножением индекса на шаг, без накопления ошибки.
+dashed_coords, wave_coords и zigzag_coords - обертки для одного отрезка.
+'''
+
+import math
+from array import array
+from itertools import repeat
+from logic.styles import expand_dash_pattern
+
+# Волна: шаг дискретизации, амплитуда и период синусоиды (в мировых единицах)
+WAVE_STEP = 1.0
+WAVE_AMPLITUDE = 0.6
+WAVE_FREQ = 1.0
+# Шаг дискретизации волны не меньше этого (в единицах вызова), чтобы не плодить точки
+WAVE_MIN_STEP = 0.1
+
+# Зигзаг: расстояние между изломами, длина и амплитуда излома (в мировых единицах)
+ZIGZAG_PERIOD = 8.0
+ZIGZAG_KINK_LEN = 2.4
+ZIGZAG_AMPLITUDE = 1.0
+
+def _unit(x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    length = math.sqrt(dx*dx + dy*dy)
+    if length == 0: return 0.0, 0.0, 0.0
+    return length, dx/length, dy/length
+
+def dash_table(pattern):
+    """(период, [(начало, конец), ...]) - рисуемые интервалы внутри одного периода паттерна.
+    Четные элементы паттерна - штрихи, нечетные - пробелы; паттерн нечетной длины повторяется дважды."""
+    if len(pattern) % 2:
+        pattern = tuple(pattern) * 2
+    intervals = []
+    position = 0.0
+    for i, value in enumerate(pattern):
+        if i % 2 == 0:
+            intervals.append((position, position + value))
+        position += value
+    return position, intervals
+
+def dash_spans(length, period, intervals, phase=0.0):
+    """Штрихи вдоль отрезка длины length как пары расстояний (a, b) от его начала.
+    period и intervals - из dash_table; phase - с какого места паттерна начинается отрезок
+    (для фазы, непрерывной вдоль цепочки отрезков)."""
+    spans = []
+    phase %= period
+    for k in range(math.ceil((length + phase) / period)):
+        base = k * period - phase
+        for start, end in intervals:
+            a = base + start
+            if a >= length: break
+            b = base + end
+            if b <= 0: continue
+            spans.append((a if a > 0 else 0.0, b if b < length else length))
+    return spans
+
+def dash_batch(x1s, y1s, x2s, y2s, pattern, phases=None):
+    """Штрихи многих отрезков по одному паттерну: coords - по 4 числа (x1, y1, x2, y2) на штрих.
+    phases - необязательная фаза паттерна в начале каждого отрезка (в тех же единицах)."""
+    period, intervals = dash_table(pattern)
+    out = []
+    offsets = array('I', [0])
+    if period <= 0:
+        # Вырожденный паттерн - рисуем сплошной
+        for x1, y1, x2, y2 in zip(x1s, y1s, x2s, y2s):
+            out += (x1, y1, x2, y2)
+            offsets.append(len(out))
+        return array('d', out), offsets
+
+    if phases is None:
+        phases = repeat(0.0)
+    for x1, y1, x2, y2, phase in zip(x1s, y1s, x2s, y2s, phases):
+        length, ux, uy = _unit(x1, y1, x2, y2)
+        for a, b in dash_spans(length, period, intervals, phase):
+            out += (x1 + ux*a, y1 + uy*a, x1 + ux*b, y1 + uy*b)
+        offsets.append(len(out))
+    return array('d', out), offsets
+
+def wave_batch(x1s, y1s, x2s, y2s, scale=1.0, max_points=None):
+    """Ломаные волны многих отрезков. max_points ограничивает число отсчетов на отрезок (для LOD)."""
+    step = max(WAVE_STEP * scale, WAVE_MIN_STEP)
+    amplitude = WAVE_AMPLITUDE * scale
+    freq = WAVE_FREQ / scale
+
+    # Общая таблица отсчетов (расстояние вдоль отрезка, смещение по нормали) для шага step, растет по мере надобности
+    table_t = []; table_o = []
+
+    out = []
+    offsets = array('I', [0])
+    for x1, y1, x2, y2 in zip(x1s, y1s, x2s, y2s):
+        length, ux, uy = _unit(x1, y1, x2, y2)
+        if length == 0:
+            out += (x1, y1, x2, y2)
+            offsets.append(len(out))
+            continue
+
+        seg_step = max(step, length / max_points) if max_points else step
+        count = math.ceil(length / seg_step)
+        if seg_step == step:
+            for i in range(len(table_t), count):
+                table_t.append(i * step)
+                table_o.append(amplitude * math.sin(i * step * freq))
+            ts, os_ = table_t[:count], table_o[:count]
+        else:
+            ts = [i * seg_step for i in range(count)]
+            os_ = [amplitude * math.sin(t * freq) for t in ts]
+
+        # Нормаль (-uy, ux): x = x1 + ux*t - uy*o, y = y1 + uy*t + ux*o
+        points = [0.0] * (2 * count)
+        points[0::2] = [x1 + ux*t - uy*o for t, o in zip(ts, os_)]
+        points[1::2] = [y1 + uy*t + ux*o for t, o in zip(ts, os_)]
+        out += points
+        out += (x2, y2)
+        offsets.append(len(out))
+    return array('d', out), offsets
+
+def zigzag_batch(x1s, y1s, x2s, y2s, scale=1.0, max_points=None):
+    """Ломаные с изломами многих отрезков. max_points ограничивает число точек на отрезок
+    (каждый излом дает 4 точки) - изломы прореживаются."""
+    period = ZIGZAG_PERIOD * scale
+    kink_len = ZIGZAG_KINK_LEN * scale
+    amplitude = ZIGZAG_AMPLITUDE * scale
+
+    out = []
+    offsets = array('I', [0])
+    for x1, y1, x2, y2 in zip(x1s, y1s, x2s, y2s):
+        length, ux, uy = _unit(x1, y1, x2, y2)
+        if length == 0:
+            out += (x1, y1, x2, y2)
+            offsets.append(len(out))
+            continue
+
+        seg_period = max(period, length * 4 / max_points) if max_points else period
+        cycle = seg_period + kink_len
+        # Смещение по нормали (-uy, ux) на амплитуду
+        ax, ay = -uy * amplitude, ux * amplitude
+
+        out += (x1, y1)
+        k = 0
+        while True:
+            d0 = k * cycle + seg_period
+            if d0 >= length:
+                out += (x2, y2)
+                break
+            out += (x1 + ux*d0, y1 + uy*d0)
+            if d0 + kink_len > length:
+                out += (x2, y2)
+                break
+            d1 = d0 + kink_len * 0.25
+            d2 = d0 + kink_len * 0.75
+            d3 = d0 + kink_len
+            out += (x1 + ux*d1 - ax, y1 + uy*d1 - ay,
+                    x1 + ux*d2 + ax, y1 + uy*d2 + ay,
+                    x1 + ux*d3, y1 + uy*d3)
+            k += 1
+        offsets.append(len(out))
+    return array('d', out), offsets
+
+def polyline_points(kind, length, scale=1.0, max_points=None):
+    """Сколько отсчетов получит волна (или начатых изломов - зигзаг) на отрезке длины length
+    при тех же scale и max_points, что в wave_batch/zigzag_batch."""
+    if length == 0: return 0
+    if kind == 'wave':
+        step = max(WAVE_STEP * scale, WAVE_MIN_STEP)
+        return math.ceil(length / (max(step, length / max_points) if max_points else step))
+    period = ZIGZAG_PERIOD * scale
+    seg_period = max(period, length * 4 / max_points) if max_points else period
+    if seg_period >= length: return 0
+    return math.ceil((length - seg_period) / (seg_period + ZIGZAG_KINK_LEN * scale))
+
+def style_kind(style):
+    """Тип геометрии стиля: 'solid', 'dashed', 'wave' или 'zigzag'."""
+    if style.base_type in ('wave', 'zigzag'):
+        return style.base_type
+    return 'dashed' if expand_dash_pattern(style) else 'solid'
+
+def style_geometry(kind, pattern, x1s, y1s, x2s, y2s, scale=1.0, max_points=None):
+    """Геометрия пачки отрезков одного типа: (coords, offsets) как у *_batch.
+    Для 'dashed' - штрихи по 4 числа (pattern уже в единицах вызова), для 'wave'/'zigzag' - по ломаной
+    на отрезок, для 'solid' - сами отрезки."""
+    if kind == 'dashed':
+        return dash_batch(x1s, y1s, x2s, y2s, pattern)
+    if kind == 'wave':
+        return wave_batch(x1s, y1s, x2s, y2s, scale, max_points)
+    if kind == 'zigzag':
+        return zigzag_batch(x1s, y1s, x2s, y2s, scale, max_points)
+    coords = array('d')
+    for segment in zip(x1s, y1s, x2s, y2s):
+        coords.extend(segment)
+    return coords, array('I', range(0, len(coords) + 1, 4))
+
+# --- ОДИН ОТРЕЗОК ---
+
+def dashed_coords(x1, y1, x2, y2, pattern):
+    """Штрихи отрезка по паттерну (штрих, пробел, штрих, ...) в тех же единицах: список (x1, y1, x2, y2)."""
+    coords, _ = dash_batch((x1,), (y1,), (x2,), (y2,), pattern)
+    return [tuple(coords[i:i + 4]) for i in range(0, len(coords), 4)]
+
+def wave_coords(x1, y1, x2, y2, scale=1.0, max_points=None):
+    """Плоский массив координат ломаной волны [x, y, x, y, ...]."""
+    return wave_batch((x1,), (y1,), (x2,), (y2,), scale, max_points)[0]
+
+def zigzag_coords(x1, y1, x2, y2, scale=1.0, max_points=None):
+    """Плоский массив координат ломаной с изломами [x, y, x, y, ...]."""
+    return zigzag_batch((x1,), (y1,), (x2,), (y2,), scale, max_points)[0]
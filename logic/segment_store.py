@@ -0,0 +1,385 @@
+# logic/segment_store.py
+
+'''
+Колоночное хранилище отрезков.
+Вместо списка объектов Segment (по ~5 объектов в куче на отрезок) координаты лежат в непрерывных
+массивах float64 (x1, y1, x2, y2), а стиль и цвет - в целочисленных колонках с индексами в таблицах имен.
+Удаленные слоты попадают в free-list и переиспользуются при следующих добавлениях.
+
+Обратные индексы стиль -> ID и цвет -> ID (множества ID по индексу стиля/цвета) строятся одним проходом
+по колонке при первом запросе (ids_with_style / ids_with_color) и дальше поддерживаются при каждом изменении,
+поэтому удаление стиля, выделение "всех отрезков стиля" и смена стиля группы стоят O(затронутых отрезков).
+Колонки style_ids / color_ids меняем только через set_style / set_color / assign_ids, иначе индексы отстанут.
+Любое изменение содержимого увеличивает version - по нему рендерер понимает, что данные кадра устарели.
+
+Снаружи отрезок выглядит как SegmentView - легкий фасад с тем же интерфейсом, что и у Segment
+(p1, p2, style_name, color, length, angle, distance_to_point), поэтому код Callbacks работает без изменений.
+'''
+
+import math
+from array import array
+from itertools import compress
+from operator import sub
+from logic.geometry import Point, point_segment_distance
+
+class SegmentView:
+    __slots__ = ('_store', 'id')
+
+    def __init__(self, store, seg_id):
+        self._store = store
+        self.id = seg_id
+
+    @property
+    def p1(self):
+        return Point(self._store.x1[self.id], self._store.y1[self.id])
+
+    @property
+    def p2(self):
+        return Point(self._store.x2[self.id], self._store.y2[self.id])
+
+    @property
+    def style_name(self):
+        return self._store.get_style(self.id)
+
+    @style_name.setter
+    def style_name(self, value):
+        self._store.set_style(self.id, value)
+
+    @property
+    def color(self):
+        return self._store.get_color(self.id)
+
+    @color.setter
+    def color(self, value):
+        self._store.set_color(self.id, value)
+
+    @property
+    def length(self):
+        s, i = self._store, self.id
+        return math.hypot(s.x2[i] - s.x1[i], s.y2[i] - s.y1[i])
+
+    @property
+    def angle(self):
+        s, i = self._store, self.id
+        return math.atan2(s.y2[i] - s.y1[i], s.x2[i] - s.x1[i])
+
+    def distance_to_point(self, mx, my):
+        return point_segment_distance(mx, my, *self._store.coords(self.id))
+
+    def __eq__(self, other):
+        return isinstance(other, SegmentView) and other.id == self.id and other._store is self._store
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"SegmentView(#{self.id}, {self.p1}, {self.p2}, style='{self.style_name}')"
+
+class SegmentStore:
+    def __init__(self):
+        # Колонки геометрии
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.x2 = array('d')
+        self.y2 = array('d')
+
+        # Колонки атрибутов: индексы в таблицах style_names / color_names
+        self.style_ids = array('I')
+        self.color_ids = array('I')
+
+        # 1 - слот занят, 0 - свободен
+        self.alive = bytearray()
+
+        self.style_names = []
+        self._style_lookup = {}
+        self.color_names = []
+        self._color_lookup = {}
+
+        self._free = array('I')   # free-list освобожденных слотов
+        self._stack = array('I')  # порядок добавления (для pop - удаления последнего)
+        self._count = 0
+
+        # Обратные индексы: индекс стиля/цвета -> множество ID живых отрезков (None - еще не построены)
+        self._style_members = None
+        self._color_members = None
+
+        # Счетчик изменений: растет при каждом добавлении, удалении и смене атрибутов
+        self.version = 0
+
+    # --- ТАБЛИЦЫ ИМЕН ---
+
+    def style_id(self, style_name):
+        sid = self._style_lookup.get(style_name)
+        if sid is None:
+            sid = self._style_lookup[style_name] = len(self.style_names)
+            self.style_names.append(style_name)
+        return sid
+
+    def color_id(self, color):
+        cid = self._color_lookup.get(color)
+        if cid is None:
+            cid = self._color_lookup[color] = len(self.color_names)
+            self.color_names.append(color)
+        return cid
+
+    # --- ДОБАВЛЕНИЕ / УДАЛЕНИЕ ---
+
+    def add(self, x1, y1, x2, y2, style_name='solid_main', color='black'):
+        sid, cid = self.style_id(style_name), self.color_id(color)
+        free = self._free
+        # Пропускаем слоты, которые уже успели снова занять (например, при восстановлении)
+        while free and self.alive[free[-1]]:
+            free.pop()
+
+        if free:
+            seg_id = free.pop()
+            self.x1[seg_id] = x1; self.y1[seg_id] = y1
+            self.x2[seg_id] = x2; self.y2[seg_id] = y2
+            self.style_ids[seg_id] = sid; self.color_ids[seg_id] = cid
+            self.alive[seg_id] = 1
+        else:
+            seg_id = len(self.alive)
+            self.x1.append(x1); self.y1.append(y1)
+            self.x2.append(x2); self.y2.append(y2)
+            self.style_ids.append(sid); self.color_ids.append(cid)
+            self.alive.append(1)
+
+        self._stack.append(seg_id)
+        self._count += 1
+        self.version += 1
+        if self._style_members is not None or self._color_members is not None:
+            self._index_add(seg_id, sid, cid)
+        return seg_id
+
+    def extend(self, x1s, y1s, x2s, y2s, style_names, colors):
+        """Пакетно добавляет отрезки из колонок (например, импорт DXF) в конец хранилища, мимо free-list.
+        Возвращает range их ID."""
+        start = len(self.alive)
+        count = len(x1s)
+        self.x1.extend(x1s); self.y1.extend(y1s)
+        self.x2.extend(x2s); self.y2.extend(y2s)
+        self.style_ids.extend(map(self.style_id, style_names))
+        self.color_ids.extend(map(self.color_id, colors))
+        self.alive.extend(b'\x01' * count)
+        self._stack.extend(range(start, start + count))
+        self._count += count
+        self.version += 1
+        # Обратные индексы проще построить заново при следующем запросе, чем дополнять по отрезку
+        self._style_members = self._color_members = None
+        return range(start, start + count)
+
+    def remove(self, seg_id):
+        if not self.is_alive(seg_id): return False
+        self._index_discard(seg_id)
+        self.alive[seg_id] = 0
+        self._free.append(seg_id)
+        self._count -= 1
+        self.version += 1
+        if len(self._stack) > 2 * self._count + 1024:
+            self._compact_stack()
+        return True
+
+    def pop(self):
+        """Удаляет последний добавленный живой отрезок и возвращает его ID (или None)."""
+        stack, alive = self._stack, self.alive
+        while stack:
+            seg_id = stack.pop()
+            if alive[seg_id]:
+                self.remove(seg_id)
+                return seg_id
+        return None
+
+    def last_id(self):
+        stack, alive = self._stack, self.alive
+        for i in range(len(stack) - 1, -1, -1):
+            if alive[stack[i]]: return stack[i]
+        return None
+
+    def _compact_stack(self):
+        # Оставляем только последнее вхождение каждого живого слота, сохраняя порядок
+        seen = set()
+        kept = []
+        for seg_id in reversed(self._stack):
+            if self.alive[seg_id] and seg_id not in seen:
+                seen.add(seg_id)
+                kept.append(seg_id)
+        kept.reverse()
+        self._stack = array('I', kept)
+
+    def restore(self, seg_id, x1, y1, x2, y2, style_id, color_id):
+        """Возвращает к жизни ранее удаленный слот с тем же ID (для отмены удаления).
+        style_id/color_id - индексы в таблицах имен (таблицы только растут, поэтому индексы не устаревают)."""
+        if self.is_alive(seg_id): return False
+        self.x1[seg_id] = x1; self.y1[seg_id] = y1
+        self.x2[seg_id] = x2; self.y2[seg_id] = y2
+        self.style_ids[seg_id] = style_id; self.color_ids[seg_id] = color_id
+        # Слот остается в free-list, но add() пропускает занятые слоты
+        self.alive[seg_id] = 1
+        self._stack.append(seg_id)
+        self._count += 1
+        self.version += 1
+        self._index_add(seg_id, style_id, color_id)
+        return True
+
+    def clear(self):
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+
+    def replace_columns(self, x1, y1, x2, y2, style_ids, color_ids, style_names, color_names):
+        """Заменяет содержимое хранилища готовыми колонками (например, прочитанными из файла) без дыр."""
+        count = len(x1)
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self.style_ids, self.color_ids = style_ids, color_ids
+        self.alive = bytearray(b'\x01') * count
+        self.style_names = list(style_names)
+        self._style_lookup = {name: i for i, name in enumerate(self.style_names)}
+        self.color_names = list(color_names)
+        self._color_lookup = {name: i for i, name in enumerate(self.color_names)}
+        self._free = array('I')
+        self._stack = array('I', range(count))
+        self._count = count
+        self._style_members = self._color_members = None
+        self.version += 1
+
+    def compact_columns(self):
+        """Колонки только живых отрезков (без дыр): (x1, y1, x2, y2, style_ids, color_ids)."""
+        columns = (self.x1, self.y1, self.x2, self.y2, self.style_ids, self.color_ids)
+        if self._count == len(self.alive):
+            return columns
+        return tuple(array(col.typecode, compress(col, self.alive)) for col in columns)
+
+    # --- ДОСТУП ---
+
+    def is_alive(self, seg_id):
+        return 0 <= seg_id < len(self.alive) and self.alive[seg_id] == 1
+
+    def coords(self, seg_id):
+        return self.x1[seg_id], self.y1[seg_id], self.x2[seg_id], self.y2[seg_id]
+
+    def get_style(self, seg_id):
+        return self.style_names[self.style_ids[seg_id]]
+
+    def set_style(self, seg_id, style_name):
+        self.assign_ids('style', (seg_id,), (self.style_id(style_name),))
+
+    def get_color(self, seg_id):
+        return self.color_names[self.color_ids[seg_id]]
+
+    def set_color(self, seg_id, color):
+        self.assign_ids('color', (seg_id,), (self.color_id(color),))
+
+    def assign_ids(self, attribute, seg_ids, values):
+        """Пакетно записывает индексы стиля ('style') или цвета ('color') отрезкам seg_ids.
+        values - индексы в таблице имен, по одному на отрезок (или itertools.repeat для одного на всех)."""
+        if attribute == 'style':
+            column, members = self.style_ids, self._style_members
+        else:
+            column, members = self.color_ids, self._color_members
+        self.version += 1
+        if members is None:
+            for seg_id, value in zip(seg_ids, values):
+                column[seg_id] = value
+            return
+        alive = self.alive
+        for seg_id, value in zip(seg_ids, values):
+            old = column[seg_id]
+            if old == value: continue
+            column[seg_id] = value
+            if alive[seg_id]:
+                members[old].discard(seg_id)
+                while len(members) <= value:
+                    members.append(set())
+                members[value].add(seg_id)
+
+    def ids(self):
+        """Итератор по ID живых отрезков."""
+        return compress(range(len(self.alive)), self.alive)
+
+    def ids_with_style(self, style_name):
+        """Множество ID живых отрезков данного стиля (копия обратного индекса - O(найденных), без сортировки)."""
+        sid = self._style_lookup.get(style_name)
+        if sid is None: return set()
+        members = self._members('style')
+        return set(members[sid]) if sid < len(members) else set()
+
+    def ids_with_color(self, color):
+        """Множество ID живых отрезков данного цвета (копия обратного индекса - O(найденных), без сортировки)."""
+        cid = self._color_lookup.get(color)
+        if cid is None: return set()
+        members = self._members('color')
+        return set(members[cid]) if cid < len(members) else set()
+
+    # --- ОБРАТНЫЕ ИНДЕКСЫ ---
+
+    def _members(self, attribute):
+        """Обратный индекс стилей или цветов; при первом запросе строится одним проходом по колонке."""
+        if attribute == 'style':
+            if self._style_members is None:
+                self._style_members = self._build_members(self.style_ids, len(self.style_names))
+            return self._style_members
+        if self._color_members is None:
+            self._color_members = self._build_members(self.color_ids, len(self.color_names))
+        return self._color_members
+
+    def _build_members(self, column, size):
+        members = [set() for _ in range(size)]
+        for seg_id, value in zip(self.ids(), compress(column, self.alive)):
+            members[value].add(seg_id)
+        return members
+
+    def _index_add(self, seg_id, sid, cid):
+        for members, value in ((self._style_members, sid), (self._color_members, cid)):
+            if members is None: continue
+            while len(members) <= value:
+                members.append(set())
+            members[value].add(seg_id)
+
+    def _index_discard(self, seg_id):
+        if self._style_members is not None:
+            self._style_members[self.style_ids[seg_id]].discard(seg_id)
+        if self._color_members is not None:
+            self._color_members[self.color_ids[seg_id]].discard(seg_id)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for seg_id in self.ids():
+            yield SegmentView(self, seg_id)
+
+    def __getitem__(self, seg_id):
+        return SegmentView(self, seg_id)
+
+    def __contains__(self, segment):
+        return isinstance(segment, SegmentView) and segment._store is self and self.is_alive(segment.id)
+
+    # --- ПАКЕТНЫЕ ЗАПРОСЫ ---
+
+    def _column(self, column):
+        # Без дыр в хранилище можно работать с колонкой напрямую
+        return column if self._count == len(self.alive) else compress(column, self.alive)
+
+    def bounds(self):
+        """(min_x, min_y, max_x, max_y) всех живых отрезков или None для пустого хранилища."""
+        if not self._count: return None
+        min_x = min(min(self._column(self.x1)), min(self._column(self.x2)))
+        max_x = max(max(self._column(self.x1)), max(self._column(self.x2)))
+        min_y = min(min(self._column(self.y1)), min(self._column(self.y2)))
+        max_y = max(max(self._column(self.y1)), max(self._column(self.y2)))
+        return min_x, min_y, max_x, max_y
+
+    def lengths(self):
+        """Длины живых отрезков в порядке ids() одним проходом map без циклов на Python."""
+        x1, y1, x2, y2 = map(self._column, (self.x1, self.y1, self.x2, self.y2))
+        return array('d', map(math.hypot, map(sub, x2, x1), map(sub, y2, y1)))
+
+    def hit_test(self, x, y, max_dist, ids=None):
+        """Ближайший к точке отрезок не дальше max_dist среди ids (по умолчанию - все). (ID, расстояние) или (None, None)."""
+        best_id, best_dist = None, None
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        for seg_id in (self.ids() if ids is None else ids):
+            dist = point_segment_distance(x, y, x1[seg_id], y1[seg_id], x2[seg_id], y2[seg_id])
+            if dist < max_dist and (best_dist is None or dist < best_dist):
+                best_id, best_dist = seg_id, dist
+        return best_id, best_dist
@@ -0,0 +1,107 @@
+# logic/selection.py
+
+'''
+Выделение отрезков.
+Хранит ID выделенных отрезков в словаре (упорядоченное множество): проверка "выделен ли",
+добавление и снятие выделения - O(1), а порядок выделения сохраняется (первый выделенный - "главный").
+Наружу отдает SegmentView, поэтому код, перебирающий выделение, не меняется.
+
+ids_in_screen_rect - выбор отрезков рамкой: "окно" (целиком внутри) или "секущая" (касается рамки).
+Рамка задается на экране, поэтому при повернутом виде в мире это повернутый прямоугольник:
+его углы переводятся в мир (screen_to_world), по их bounding box спрашивается пространственный индекс,
+а точная проверка кандидатов идет на экране, где рамка снова прямоугольник со сторонами по осям.
+'''
+
+from array import array
+from logic.segment_store import SegmentView
+from logic.geometry import segment_inside_rect, segment_intersects_rect
+
+class Selection:
+    def __init__(self, store):
+        self.store = store
+        self._ids = {}  # ID -> None, порядок вставки = порядок выделения
+
+    @staticmethod
+    def _id(segment):
+        return segment.id if isinstance(segment, SegmentView) else segment
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __bool__(self):
+        return bool(self._ids)
+
+    def __iter__(self):
+        store = self.store
+        for seg_id in self._ids:
+            yield store[seg_id]
+
+    def __contains__(self, segment):
+        return self._id(segment) in self._ids
+
+    def ids(self):
+        """Живое представление множества ID (поддерживает &, | с обычными множествами)."""
+        return self._ids.keys()
+
+    def first(self):
+        for seg_id in self._ids:
+            return self.store[seg_id]
+        return None
+
+    def add(self, segment):
+        self._ids[self._id(segment)] = None
+
+    def discard(self, segment):
+        self._ids.pop(self._id(segment), None)
+
+    def toggle(self, segment):
+        seg_id = self._id(segment)
+        if seg_id in self._ids:
+            del self._ids[seg_id]
+        else:
+            self._ids[seg_id] = None
+
+    def update(self, seg_ids):
+        self._ids.update(dict.fromkeys(seg_ids))
+
+    def replace(self, seg_ids):
+        self._ids = dict.fromkeys(seg_ids)
+
+    def clear(self):
+        self._ids = {}
+
+    def prune(self):
+        """Убирает ID отрезков, которых больше нет в хранилище (например, после отмены добавления)."""
+        is_alive = self.store.is_alive
+        if not all(map(is_alive, self._ids)):
+            self._ids = {seg_id: None for seg_id in self._ids if is_alive(seg_id)}
+
+    def style_names(self):
+        """Множество имен стилей выделенных отрезков (без создания SegmentView на каждый)."""
+        store = self.store
+        return {store.style_names[sid] for sid in set(map(store.style_ids.__getitem__, self._ids))}
+
+    def color_names(self):
+        store = self.store
+        return {store.color_names[cid] for cid in set(map(store.color_ids.__getitem__, self._ids))}
+
+def ids_in_screen_rect(store, index, view, x0, y0, x1, y1, crossing):
+    """ID отрезков в экранной рамке (x0, y0)-(x1, y1) для вида view (ViewTransform).
+    crossing=False - только целиком внутри рамки, True - все, что ее касается."""
+    min_sx, max_sx = min(x0, x1), max(x0, x1)
+    min_sy, max_sy = min(y0, y1), max(y0, y1)
+
+    # Углы рамки в мире (при повороте вида - повернутый прямоугольник) и их bounding box
+    wxs, wys = view.invert_many([min_sx, max_sx, max_sx, min_sx], [min_sy, min_sy, max_sy, max_sy])
+    candidates = list(index.query_rect(min(wxs), min(wys), max(wxs), max(wys)))
+    if not candidates: return []
+
+    # Концы кандидатов - на экран пакетом
+    sx1, sy1 = view.apply_many(array('d', map(store.x1.__getitem__, candidates)),
+                               array('d', map(store.y1.__getitem__, candidates)))
+    sx2, sy2 = view.apply_many(array('d', map(store.x2.__getitem__, candidates)),
+                               array('d', map(store.y2.__getitem__, candidates)))
+
+    test = segment_intersects_rect if crossing else segment_inside_rect
+    return [seg_id for seg_id, ax, ay, bx, by in zip(candidates, sx1, sy1, sx2, sy2)
+            if test(ax, ay, bx, by, min_sx, min_sy, max_sx, max_sy)]
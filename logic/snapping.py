@@ -0,0 +1,91 @@
+# logic/snapping.py
+
+'''
+Объектная привязка: притягивает курсор к характерным точкам чертежа.
+Виды привязки (в порядке приоритета):
+    endpoint     - концы отрезков,
+    intersection - пересечения отрезков,
+    midpoint     - середины отрезков,
+    nearest      - ближайшая точка на отрезке,
+    grid         - узлы сетки.
+Кандидаты берутся из пространственного индекса только в квадрате допуска вокруг курсора,
+а пересечения считаются лениво - попарно и лишь для ближайших к курсору отрезков,
+поэтому время привязки не зависит от размера чертежа.
+'''
+
+import math
+from dataclasses import dataclass
+from logic.geometry import point_segment_distance, segment_intersection, closest_point_on_segment
+from logic.grid import grid_levels
+
+SNAP_KINDS = ('endpoint', 'intersection', 'midpoint', 'nearest', 'grid')
+SNAP_PRIORITY = {kind: i for i, kind in enumerate(SNAP_KINDS)}
+
+# Допуск привязки в пикселях экрана
+SNAP_TOLERANCE_PX = 10
+
+# Пересечения ищем только среди стольких ближайших к курсору отрезков (перебор попарный)
+MAX_INTERSECTION_SEGMENTS = 24
+
+@dataclass(frozen=True)
+class SnapPoint:
+    x: float
+    y: float
+    kind: str
+
+class SnapEngine:
+    def __init__(self, state):
+        self.state = state
+        # Включенные виды привязки
+        self.kinds = set(SNAP_KINDS)
+
+    def snap(self, wx, wy, tolerance):
+        """Лучшая точка привязки в радиусе tolerance (мировые единицы) от (wx, wy) или None."""
+        store = self.state.segments
+        candidates = self.state.spatial_index.query_rect(wx - tolerance, wy - tolerance, wx + tolerance, wy + tolerance)
+
+        # Отрезки, реально проходящие в пределах допуска, от ближайшего к дальнему
+        near = []
+        for seg_id in candidates:
+            coords = store.coords(seg_id)
+            dist = point_segment_distance(wx, wy, *coords)
+            if dist <= tolerance:
+                near.append((dist, seg_id, coords))
+        near.sort()
+
+        best = None  # (приоритет, расстояние, SnapPoint)
+
+        def offer(x, y, kind):
+            nonlocal best
+            dist = math.hypot(x - wx, y - wy)
+            if dist > tolerance: return
+            key = (SNAP_PRIORITY[kind], dist)
+            if best is None or key < best[:2]:
+                best = (key[0], key[1], SnapPoint(x, y, kind))
+
+        kinds = self.kinds
+        for _, _, (x1, y1, x2, y2) in near:
+            if 'endpoint' in kinds:
+                offer(x1, y1, 'endpoint')
+                offer(x2, y2, 'endpoint')
+            if 'midpoint' in kinds:
+                offer((x1 + x2) / 2, (y1 + y2) / 2, 'midpoint')
+
+        if 'intersection' in kinds and (best is None or best[0] > SNAP_PRIORITY['intersection']):
+            closest = near[:MAX_INTERSECTION_SEGMENTS]
+            for i in range(len(closest)):
+                a = closest[i][2]
+                for j in range(i + 1, len(closest)):
+                    point = segment_intersection(*a, *closest[j][2])
+                    if point is not None:
+                        offer(point[0], point[1], 'intersection')
+
+        if 'nearest' in kinds and near:
+            offer(*closest_point_on_segment(wx, wy, *near[0][2]), 'nearest')
+
+        if 'grid' in kinds:
+            # Привязка к видимой сетке: шаг тот же, что выбирает адаптивная сетка при текущем зуме
+            step, _ = grid_levels(self.state.grid_step, self.state.zoom)
+            offer(round(wx / step) * step, round(wy / step) * step, 'grid')
+
+        return best[2] if best else None
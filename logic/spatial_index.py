@@ -0,0 +1,397 @@
+# logic/spatial_index.py
+
+'''
+Пространственный индекс отрезков на основе "рыхлой" (loose) равномерной сетки ячеек.
+Каждый отрезок регистрируется ровно в одной ячейке - той, где лежит его первая точка (p1).
+Запрос по прямоугольнику расширяется во все стороны на наибольший размер отрезка в индексе,
+поэтому ничего не теряется, а вставка, удаление и пакетная перестройка работают
+с одной ячейкой на отрезок.
+Отрезки длиннее max_cells_per_side ячеек хранятся отдельно ("крупные") и проверяются при каждом запросе.
+Если крупных становится слишком много (например, ячейка еще не подобрана под чертеж, нарисованный с нуля),
+индекс перестраивается с новым размером ячейки. Размер, на который расширяется запрос, пересчитывается
+(теми же порциями build_step), когда удален отрезок, который его задавал; до конца пересчета запрос
+расширяется на прежний размер - с запасом, но ничего не теряя.
+Время клика не зависит от размера всего чертежа.
+
+Сам индекс хранит только ключи (ID отрезков) в ячейках, а координаты берет через coords_of(ключ).
+Поэтому удалять ключ из индекса нужно до того, как его координаты станут недействительными.
+
+Пакетная перестройка (rebuild) считает только размер ячейки и размеры отрезков, а раскладку
+ключей по ячейкам (цикл на Python по каждому ключу - около 1.2 с на миллион) делает порциями
+в build_step, которые вызывающий код запускает в простое (см. Callbacks.schedule_index_build).
+Пока раскладка не закончена, запрос берет разложенную часть из ячеек, а остаток проверяет
+одним проходом по колонкам первых точек (map на C, без цикла на Python по ключам).
+Первый кадр после открытия файла - "показать все" - спрашивает прямоугольник, накрывающий
+весь чертеж, и получает все ключи сразу.
+'''
+
+import math
+from array import array
+from itertools import compress, repeat
+from operator import sub, le, ge, and_, truediv
+from logic.geometry import point_segment_distance
+
+# Сколько отрезков берем для оценки типичного размера при перестройке
+SAMPLE_SIZE = 10000
+
+# Ячейка (ix, iy) кодируется одним целым ix * CELL_STRIDE + iy: хеш int заметно дешевле хеша кортежа
+CELL_STRIDE = 1 << 32
+HALF_STRIDE = CELL_STRIDE // 2
+
+# Ячейка не мельче этой доли от наибольшей по модулю координаты чертежа: индексы ячеек остаются
+# далеко внутри [-HALF_STRIDE, HALF_STRIDE), и коды ячеек разных строк не совпадают
+MIN_CELL_FRACTION = 2.0 ** -28
+
+# Если крупных отрезков больше этой доли от всех (и всего их не меньше RETUNE_MIN_KEYS) - перестраиваем индекс
+# с размером ячейки под текущий чертеж. После перестройки крупных заведомо меньше 1/32 (ячейка - 4 средних размера,
+# крупный - больше 8 ячеек), поэтому перестройки не повторяются подряд
+RETUNE_LARGE_FRACTION = 0.25
+RETUNE_MIN_KEYS = 64
+
+# Сколько ключей раскладывает по ячейкам один шаг build_step (около 20 мс на Python - меньше кадра)
+BUILD_CHUNK = 10000
+
+class SpatialIndex:
+    def __init__(self, coords_of, cell_size=50.0, max_cells_per_side=8):
+        # coords_of(ключ) -> (x1, y1, x2, y2)
+        self.coords_of = coords_of
+        self.cell_size = float(cell_size)
+        # Отрезок, чей размер больше max_cells_per_side ячеек, хранится в отдельном множестве "крупных"
+        self.max_cells_per_side = max_cells_per_side
+
+        self._cells = {}    # код ячейки -> list(ключей)
+        self._large = set() # Ключи крупных отрезков, проверяются при каждом запросе
+        self._max_extent = 0.0 # Наибольший размер обычного отрезка (на него расширяется запрос)
+        self._extent_stale = False # Удален отрезок с наибольшим размером - _max_extent пора пересчитать
+        self._extent_scan = None   # Идущий пересчет: [ключи, позиция, наибольший размер среди пройденных]
+        self._count = 0
+
+        # Незаконченная раскладка после rebuild: (ключи, x1s, y1s, маска обычных отрезков) или None
+        self._pending = None
+        self._built = 0           # Сколько первых ключей из _pending уже разложено по ячейкам
+        self._bounds = None       # Границы всех ключей индекса, пока идет раскладка: [x0, y0, x1, y1]
+        self._inserted = set()    # Ключи, вставленные во время раскладки
+        self._dropped = set()     # Ключи, удаленные во время раскладки
+        self._tail_keys = None    # Множество неразложенных ключей (строится только для remove)
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, x, y):
+        cs = self.cell_size
+        return math.floor(x / cs), math.floor(y / cs)
+
+    @staticmethod
+    def _cell_key(ix, iy):
+        return ix * CELL_STRIDE + iy
+
+    @staticmethod
+    def _split_key(cell_key):
+        ix = (cell_key + HALF_STRIDE) // CELL_STRIDE
+        return ix, cell_key - ix * CELL_STRIDE
+
+    def _item_cell(self, key):
+        """Ячейка отрезка или None для крупного отрезка (и для отрезка, чью ячейку нельзя закодировать)."""
+        x1, y1, x2, y2 = self.coords_of(key)
+        if max(abs(x2 - x1), abs(y2 - y1)) > self.cell_size * self.max_cells_per_side:
+            return None
+        ix, iy = self._cell(x1, y1)
+        if not -HALF_STRIDE <= iy < HALF_STRIDE:
+            return None
+        return self._cell_key(ix, iy)
+
+    def insert(self, key):
+        # Новый ключ сразу кладется в свою ячейку - незаконченная раскладка ему не мешает
+        self._count += 1
+        x1, y1, x2, y2 = self.coords_of(key)
+        if self._pending is not None:
+            self._inserted.add(key)
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], x1, x2)
+            bounds[1] = min(bounds[1], y1, y2)
+            bounds[2] = max(bounds[2], x1, x2)
+            bounds[3] = max(bounds[3], y1, y2)
+
+        cell = self._item_cell(key)
+        if cell is None:
+            self._large.add(key)
+            if len(self._large) > RETUNE_LARGE_FRACTION * self._count and self._count >= RETUNE_MIN_KEYS:
+                self._retune()
+            return
+
+        extent = max(abs(x2 - x1), abs(y2 - y1))
+        self._max_extent = max(self._max_extent, extent)
+        if self._extent_scan is not None:
+            self._extent_scan[2] = max(self._extent_scan[2], extent)
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            self._cells[cell] = [key]
+        else:
+            bucket.append(key)
+
+    def remove(self, key):
+        """Удаляет ключ; KeyError, если его нет там, куда его положили бы insert/rebuild
+        (значит, ключа нет в индексе или его координаты изменились раньше удаления)."""
+        cell = self._item_cell(key)
+        bucket = self._cells.get(cell)
+        if cell is not None:
+            # Уходит отрезок наибольшего размера - размер, на который расширяется запрос, пересчитает build_step
+            x1, y1, x2, y2 = self.coords_of(key)
+            if max(abs(x2 - x1), abs(y2 - y1)) >= self._max_extent:
+                self._extent_stale = True
+        if self._extent_scan is not None:
+            # Снимок ключей пересчета мог устареть (слот удаленного отрезка переиспользуется) - начнем заново
+            self._extent_scan = None
+            self._extent_stale = True
+        if cell is None and key in self._large:
+            self._large.discard(key)
+        elif bucket is not None and key in bucket:
+            # В ячейке единицы ключей - линейное удаление из списка дешевле множества
+            bucket.remove(key)
+            if not bucket: del self._cells[cell]
+        elif self._in_tail(key):
+            # Ключ еще ждет раскладки - раскладка и запросы просто пропустят его
+            self._tail_keys.discard(key)
+        else:
+            raise KeyError(key)
+        if self._pending is not None:
+            # Запрос "весь чертеж" во время раскладки отдает ключи rebuild без удаленных
+            self._dropped.add(key)
+            self._inserted.discard(key)
+        self._count -= 1
+
+    def clear(self):
+        self._cells = {}
+        self._large = set()
+        self._max_extent = 0.0
+        self._extent_stale = False
+        self._extent_scan = None
+        self._count = 0
+        self._pending = None
+        self._built = 0
+        self._bounds = None
+        self._inserted = set()
+        self._dropped = set()
+        self._tail_keys = None
+
+    def rebuild(self, keys, columns=None):
+        """Перестраивает индекс по набору ключей; раскладку по ячейкам доделывают build_step (или finish_build).
+        columns - необязательные колонки (x1s, y1s, x2s, y2s), выровненные с keys: тогда координаты
+        не запрашиваются по одной через coords_of, а ячейки считаются пакетно через map
+        (так открытие файла с миллионом отрезков не упирается в индекс)."""
+        keys = keys if isinstance(keys, (range, list)) else list(keys)
+        if columns is None:
+            coords = [self.coords_of(key) for key in keys]
+            columns = tuple(array('d', (c[i] for c in coords)) for i in range(4))
+        x1s, y1s, x2s, y2s = columns
+        self.clear()
+        if not keys: return
+
+        # Подбираем размер ячейки под типичный размер отрезка (по выборке): в ячейке оказывается
+        # около десятка кандидатов, а словарь ячеек остается небольшим
+        step = max(1, len(keys) // SAMPLE_SIZE)
+        sample = list(map(max, map(abs, map(sub, x2s[::step], x1s[::step])),
+                               map(abs, map(sub, y2s[::step], y1s[::step]))))
+        mean_extent = sum(sample) / len(sample)
+        bounds = [min(min(x1s), min(x2s)), min(min(y1s), min(y2s)), max(max(x1s), max(x2s)), max(max(y1s), max(y2s))]
+        if mean_extent > 0:
+            self.cell_size = max(mean_extent * 4, max(map(abs, bounds)) * MIN_CELL_FRACTION, 1e-6)
+
+        limit = self.cell_size * self.max_cells_per_side
+        max_extent = max(max(map(abs, map(sub, x2s, x1s))), max(map(abs, map(sub, y2s, y1s))))
+        if max_extent <= limit:
+            small = None
+            self._max_extent = max_extent
+        else:
+            # Есть крупные отрезки - отделяем их маской
+            extents = array('d', map(max, map(abs, map(sub, x2s, x1s)), map(abs, map(sub, y2s, y1s))))
+            small = bytearray(map(le, extents, repeat(limit)))
+            self._large = set(compress(keys, map((1).__sub__, small)))
+            self._max_extent = max(compress(extents, small), default=0.0)
+
+        # Колонки копируем: хранилище может переиспользовать слоты до того, как дойдет до раскладки
+        self._pending = (keys, array('d', x1s), array('d', y1s), small)
+        self._bounds = bounds
+        self._count = len(keys)
+
+    def _keys(self):
+        """Все ключи индекса (во время раскладки - и еще не разложенные)."""
+        keys = list(self._large)
+        for bucket in self._cells.values():
+            keys.extend(bucket)
+        if self._pending is not None:
+            pending_keys, _, _, small = self._pending
+            tail = pending_keys[self._built:]
+            if small is not None:
+                # Крупные из остатка уже в _large
+                tail = compress(tail, small[self._built:])
+            dropped = self._dropped
+            keys.extend(key for key in tail if key not in dropped)
+        return keys
+
+    def _retune(self):
+        """Перестраивает индекс с размером ячейки под текущие отрезки (сразу, без раскладки в простое)."""
+        self.rebuild(self._keys())
+        self.finish_build()
+
+    def _extent_step(self, limit):
+        """Пересчет наибольшего размера обычного отрезка по limit ключей; True - пересчет не закончен."""
+        scan = self._extent_scan
+        if scan is None:
+            if not self._extent_stale: return False
+            self._extent_stale = False
+            scan = self._extent_scan = [self._keys(), 0, 0.0]
+        keys, start, extent = scan
+        coords_of = self.coords_of
+        large = self._large
+        for key in keys[start:start + limit]:
+            if key in large: continue
+            x1, y1, x2, y2 = coords_of(key)
+            extent = max(extent, abs(x2 - x1), abs(y2 - y1))
+        scan[1], scan[2] = start + limit, extent
+        if scan[1] < len(keys): return True
+        self._max_extent = extent
+        self._extent_scan = None
+        return self._extent_stale
+
+    @property
+    def building(self):
+        """True, пока у индекса есть отложенная работа для build_step (раскладка после rebuild или пересчет размера)."""
+        return self._pending is not None or self._extent_stale or self._extent_scan is not None
+
+    def build_step(self, limit=BUILD_CHUNK):
+        """Раскладывает по ячейкам следующие limit ключей после rebuild (а после нее - пересчитывает
+        размер, на который расширяется запрос); возвращает True, если работа еще осталась."""
+        if self._pending is None: return self._extent_step(limit)
+        keys, x1s, y1s, small = self._pending
+        start = self._built
+        stop = min(start + limit, len(keys))
+        chunk = keys[start:stop]
+
+        # Индексы ячеек первых точек считаются через map по той же формуле, что и в _cell: floor(x / cell_size)
+        cs = self.cell_size
+        floor = math.floor
+        ixs = map(floor, map(truediv, x1s[start:stop], repeat(cs)))
+        iys = array('q', map(floor, map(truediv, y1s[start:stop], repeat(cs))))
+
+        # keep[i] = 1 - ключ кладется в ячейку (None - все ключи порции)
+        keep = None if small is None else small[start:stop]
+        if iys and not (-HALF_STRIDE <= min(iys) and max(iys) < HALF_STRIDE):
+            # Ячейки, которые нельзя закодировать одним числом, уходят к крупным (как в insert)
+            fits = bytearray(-HALF_STRIDE <= iy < HALF_STRIDE for iy in iys)
+            self._large.update(key for key in compress(chunk, map((1).__sub__, fits)) if key not in self._dropped)
+            keep = fits if keep is None else bytearray(map(min, keep, fits))
+        if self._dropped:
+            alive = bytearray(map((1).__sub__, map(self._dropped.__contains__, chunk)))
+            keep = alive if keep is None else bytearray(map(min, keep, alive))
+
+        buckets = self._cells
+        get = buckets.get
+        stride = CELL_STRIDE
+        if keep is None:
+            for key, ix, iy in zip(chunk, ixs, iys):
+                cell = ix * stride + iy
+                bucket = get(cell)
+                if bucket is None: buckets[cell] = [key]
+                else: bucket.append(key)
+        else:
+            for key, ix, iy, is_kept in zip(chunk, ixs, iys, keep):
+                if not is_kept: continue
+                cell = ix * stride + iy
+                bucket = get(cell)
+                if bucket is None: buckets[cell] = [key]
+                else: bucket.append(key)
+
+        self._built = stop
+        if self._tail_keys is not None:
+            self._tail_keys.difference_update(chunk)
+        if stop < len(keys): return True
+
+        self._pending = None
+        self._built = 0
+        self._bounds = None
+        self._inserted = set()
+        self._dropped = set()
+        self._tail_keys = None
+        return self.building
+
+    def finish_build(self):
+        """Доводит раскладку до конца за один вызов (когда ждать простоя незачем)."""
+        while self.build_step(): pass
+
+    def _in_tail(self, key):
+        """Ждет ли ключ раскладки (множество остатка строится при первом удалении во время раскладки)."""
+        if self._pending is None: return False
+        if self._tail_keys is None:
+            self._tail_keys = set(self._pending[0][self._built:])
+            self._tail_keys.difference_update(self._dropped)
+        return key in self._tail_keys
+
+    def _query_tail(self, min_x, min_y, max_x, max_y):
+        """Еще не разложенные ключи, чья первая точка лежит в прямоугольнике (проход по колонкам)."""
+        keys, x1s, y1s, _ = self._pending
+        start = self._built
+        xs = x1s[start:]
+        # Сначала отбираем позиции по x через map, затем по y только среди них
+        positions = compress(range(start, len(keys)),
+                             map(and_, map(ge, xs, repeat(min_x)), map(le, xs, repeat(max_x))))
+        found = [keys[i] for i in positions if min_y <= y1s[i] <= max_y]
+        dropped = self._dropped
+        return [key for key in found if key not in dropped] if dropped else found
+
+    def query_rect(self, min_x, min_y, max_x, max_y):
+        """Возвращает множество ключей, чьи bounding box пересекают прямоугольник."""
+        pending = self._pending
+        if pending is not None:
+            # Прямоугольник накрывает весь чертеж (например, "показать все") - ячейки и проверка не нужны
+            bx0, by0, bx1, by1 = self._bounds
+            if min_x <= bx0 and min_y <= by0 and max_x >= bx1 and max_y >= by1:
+                result = set(pending[0])
+                result -= self._dropped
+                result |= self._inserted
+                return result
+
+        # Отрезок, чья первая точка лежит вне прямоугольника, все еще может в него заходить - расширяем на max_extent
+        reach = self._max_extent
+        ix0, iy0 = self._cell(min_x - reach, min_y - reach)
+        ix1, iy1 = self._cell(max_x + reach, max_y + reach)
+        result = set()
+        cells = self._cells
+
+        if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > len(cells):
+            # Прямоугольник больше, чем занятых ячеек - быстрее пройти по самим ячейкам
+            split_key = self._split_key
+            for cell, bucket in cells.items():
+                ix, iy = split_key(cell)
+                if ix0 <= ix <= ix1 and iy0 <= iy <= iy1:
+                    result.update(bucket)
+        else:
+            for ix in range(ix0, ix1 + 1):
+                row = ix * CELL_STRIDE
+                for iy in range(iy0, iy1 + 1):
+                    bucket = cells.get(row + iy)
+                    if bucket: result.update(bucket)
+
+        result.update(self._large)
+        if pending is not None:
+            result.update(self._query_tail(min_x - reach, min_y - reach, max_x + reach, max_y + reach))
+
+        # Ячейки дают лишь кандидатов - отсекаем по точному bounding box
+        coords_of = self.coords_of
+        hits = set()
+        for key in result:
+            x1, y1, x2, y2 = coords_of(key)
+            if not (max(x1, x2) < min_x or min(x1, x2) > max_x or
+                    max(y1, y2) < min_y or min(y1, y2) > max_y):
+                hits.add(key)
+        return hits
+
+    def nearest(self, x, y, max_dist):
+        """Возвращает (ключ, расстояние) ближайшего отрезка не дальше max_dist или (None, None)."""
+        best_key, best_dist = None, None
+        coords_of = self.coords_of
+        for key in self.query_rect(x - max_dist, y - max_dist, x + max_dist, y + max_dist):
+            dist = point_segment_distance(x, y, *coords_of(key))
+            if dist < max_dist and (best_dist is None or dist < best_dist):
+                best_key, best_dist = key, dist
+        return best_key, best_dist
@@ -10,15 +10,29 @@
 '''
 
 from logic.styles import GOST_STYLES
+from logic.spatial_index import SpatialIndex
+from logic.segment_store import SegmentStore
+from logic.chains import ChainIndex
+from logic.style_cache import ResolvedStyleCache
+from logic.history import History
+from logic.selection import Selection
 
 class AppState:
     def __init__(self):
         self.app_mode = 'IDLE'
         
-        # LIFO-очередь для хранения построенных отрезков
-        self.segments = []
+        # Колоночное хранилище построенных отрезков (ID -> координаты, стиль, цвет)
+        self.segments = SegmentStore()
         
-        self.selected_segments = []
+        # Пространственный индекс отрезков по их ID (для быстрого поиска по клику и отсечения)
+        # Меняем segments только через методы AppState (add_segment, remove_segment_id, restore_segment...), чтобы индекс не отставал
+        self.spatial_index = SpatialIndex(self.segments.coords)
+
+        # Цепочки соединенных отрезков для штрихов с непрерывной фазой (строятся лениво, по индексу)
+        self.chains = ChainIndex(self.segments, self.spatial_index)
+        
+        # Выделенные отрезки (упорядоченное множество ID, отдает SegmentView)
+        self.selected_segments = Selection(self.segments)
         
         # Временный отрезок для предпросмотра в реальном времени
         self.preview_segment = None
@@ -32,11 +46,20 @@ class AppState:
         # Активные точки, которые нужно отрисовывать на холсте
         self.active_p1 = None
         self.active_p2 = None
+
+        # Объектная привязка (F3) и текущая точка привязки под курсором (SnapPoint или None)
+        self.snap_enabled = True
+        self.snap_point = None
         
         # Настройки камеры и вида
+        # Счетчик версий камеры: растет при каждом изменении pan/zoom/rotation (см. свойства ниже)
+        self.view_version = 0
         self.pan_x, self.pan_y = 0, 0   # Смещение камеры
         self.zoom = 5.0 # Зум камеры
         self.grid_step = 10 # Шаг сетки
+
+        # Ограничение частоты перерисовки (кадров в секунду)
+        self.max_fps = 60
         self.rotation = 0.0
         
         # Настройки цветов
@@ -53,4 +76,116 @@ class AppState:
         self.mm_to_px_ratio = 3.78
 
         self.current_style_name = 'solid_main'  # Текущий выбранный стиль для НОВЫХ объектов (храним ключ словаря)
-        self.line_styles = GOST_STYLES.copy()   # Словарь всех загруженных стилей
\ No newline at end of file
+        self.line_styles = GOST_STYLES.copy()   # Словарь всех загруженных стилей
+        # Кэш толщин и паттернов в пикселях; сбрасывать при любом изменении line_styles
+        self.style_cache = ResolvedStyleCache(self)
+
+        # История отмены/повтора и ее бюджет памяти (МБ); самые старые действия вытесняются
+        self.history_budget_mb = 64
+        self.history = History(self.history_budget_mb * 1024 * 1024)
+
+    def set_history_budget(self, budget_mb):
+        self.history_budget_mb = budget_mb
+        self.history.set_budget(budget_mb * 1024 * 1024)
+
+    # --- КАМЕРА ---
+    # Любое присваивание pan_x/pan_y/zoom/rotation увеличивает view_version,
+    # по которому CoordinateConverter понимает, что кэшированную матрицу вида пора пересобрать
+
+    @property
+    def pan_x(self): return self._pan_x
+
+    @pan_x.setter
+    def pan_x(self, value):
+        self._pan_x = value
+        self.view_version += 1
+
+    @property
+    def pan_y(self): return self._pan_y
+
+    @pan_y.setter
+    def pan_y(self, value):
+        self._pan_y = value
+        self.view_version += 1
+
+    @property
+    def zoom(self): return self._zoom
+
+    @zoom.setter
+    def zoom(self, value):
+        self._zoom = value
+        self.view_version += 1
+
+    @property
+    def rotation(self): return self._rotation
+
+    @rotation.setter
+    def rotation(self, value):
+        self._rotation = value
+        self.view_version += 1
+
+    # --- ИЗМЕНЕНИЕ СПИСКА ОТРЕЗКОВ (с синхронизацией индекса) ---
+
+    def add_segment(self, segment):
+        """Добавляет отрезок (Segment или любой объект с p1/p2/style_name/color) и возвращает его SegmentView."""
+        seg_id = self.segments.add(segment.p1.x, segment.p1.y, segment.p2.x, segment.p2.y,
+                                   segment.style_name, segment.color)
+        self.spatial_index.insert(seg_id)
+        self.chains.discard(seg_id)
+        return self.segments[seg_id]
+
+    def add_segment_columns(self, x1s, y1s, x2s, y2s, style_names, colors):
+        """Пакетно добавляет отрезки из колонок (импорт) и один раз перестраивает индекс; возвращает range их ID."""
+        seg_ids = self.segments.extend(x1s, y1s, x2s, y2s, style_names, colors)
+        self.rebuild_spatial_index()
+        return seg_ids
+
+    def remove_segment(self, segment):
+        if segment in self.segments:
+            self.remove_segment_id(segment.id)
+
+    def remove_segment_id(self, seg_id):
+        if self.segments.is_alive(seg_id):
+            self.chains.discard(seg_id)
+            self.spatial_index.remove(seg_id)
+            self.segments.remove(seg_id)
+
+    def restore_segment(self, seg_id, x1, y1, x2, y2, style_id, color_id):
+        """Возвращает удаленный отрезок в его прежний слот (используется историей отмены)."""
+        if self.segments.restore(seg_id, x1, y1, x2, y2, style_id, color_id):
+            self.spatial_index.insert(seg_id)
+            self.chains.discard(seg_id)
+
+    def pop_segment(self):
+        seg_id = self.segments.last_id()
+        if seg_id is None: return None
+        self.chains.discard(seg_id)
+        self.spatial_index.remove(seg_id)
+        self.segments.pop()
+        return self.segments[seg_id]
+
+    def find_nearest_segment(self, wx, wy, max_dist):
+        seg_id, _ = self.spatial_index.nearest(wx, wy, max_dist)
+        return None if seg_id is None else self.segments[seg_id]
+
+    def replace_drawing(self, line_styles, base_thickness_mm, columns, style_names, color_names):
+        """Заменяет весь чертеж (например, при открытии файла): стили, толщину S и отрезки."""
+        self.line_styles.clear()
+        self.line_styles.update(line_styles)
+        self.style_cache.invalidate()
+        self.base_thickness_mm = base_thickness_mm
+        if self.current_style_name not in self.line_styles:
+            self.current_style_name = 'solid_main'
+
+        self.selected_segments.clear()
+        self.preview_segment = None
+        # ID старого чертежа ничего не значат для нового - историю начинаем заново
+        self.history.clear()
+        self.segments.replace_columns(*columns, style_names, color_names)
+        self.rebuild_spatial_index()
+
+    def rebuild_spatial_index(self):
+        """Пакетно перестраивает индекс по всем живым отрезкам (заодно подбирая размер ячейки под чертеж)."""
+        x1, y1, x2, y2, _, _ = self.segments.compact_columns()
+        self.spatial_index.rebuild(list(self.segments.ids()), (x1, y1, x2, y2))
+        self.chains.reset()
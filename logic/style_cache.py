@@ -0,0 +1,66 @@
+# logic/style_cache.py
+
+'''
+Кэш "разрешенных" стилей.
+Для пары (стиль, зум, толщина S) один раз вычисляет все, что нужно рендереру:
+толщину линии в пикселях, расшифрованный и отмасштабированный паттерн штрихов и тип геометрии.
+Кэш сбрасывается через invalidate(), когда меняется словарь state.line_styles (менеджер стилей).
+'''
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from logic.styles import expand_dash_pattern
+from logic.patterns import WAVE_AMPLITUDE, ZIGZAG_AMPLITUDE
+
+# Сколько записей держим, прежде чем очистить кэш (каждый новый зум - новая запись)
+MAX_ENTRIES = 512
+
+@dataclass(frozen=True)
+class ResolvedStyle:
+    line_width: int
+    dash_pattern_px: Optional[Tuple[float, ...]] # Штрихи/пробелы в пикселях экрана (None - без штрихов)
+    kind: str                                    # 'solid', 'dashed', 'wave' или 'zigzag'
+    smallest_px: Optional[float]                 # Самый мелкий элемент паттерна в пикселях (для LOD)
+    dash_pattern_world: Optional[Tuple[float, ...]] = None # Тот же паттерн в мировых единицах (для цепочек)
+
+class ResolvedStyleCache:
+    def __init__(self, state):
+        self.state = state
+        self._cache = {}
+        # Растет при каждом сбросе: по нему рендерер понимает, что стили могли измениться
+        self.generation = 0
+
+    def invalidate(self):
+        self._cache.clear()
+        self.generation += 1
+
+    def resolve(self, style_name, zoom, thickness_mm):
+        """ResolvedStyle для стиля или None, если такого стиля нет."""
+        key = (style_name, zoom, thickness_mm)
+        resolved = self._cache.get(key)
+        if resolved is None:
+            style = self.state.line_styles.get(style_name)
+            if style is None: return None
+            if len(self._cache) >= MAX_ENTRIES:
+                self._cache.clear()
+            resolved = self._cache[key] = self._resolve(style, zoom, thickness_mm)
+        return resolved
+
+    def _resolve(self, style, zoom, thickness_mm):
+        # --- ПЕРЕВОД ММ -> ПИКСЕЛИ ---
+        s_px = thickness_mm * self.state.mm_to_px_ratio
+        # Основная линия: S, тонкая: S / 2 (но не меньше 1 пикселя)
+        line_width = max(1, int(s_px)) if style.is_main else max(1, int(s_px / 2))
+
+        if style.base_type == 'wave':
+            return ResolvedStyle(line_width, None, 'wave', WAVE_AMPLITUDE * zoom)     # амплитуда волны
+        if style.base_type == 'zigzag':
+            return ResolvedStyle(line_width, None, 'zigzag', ZIGZAG_AMPLITUDE * zoom) # амплитуда излома
+
+        pattern = expand_dash_pattern(style)
+        if pattern:
+            # Масштабируем паттерн по зуму
+            world = tuple(float(val) for val in pattern)
+            scaled = tuple(val * zoom for val in world)
+            return ResolvedStyle(line_width, scaled, 'dashed', min(scaled), world)
+        return ResolvedStyle(line_width, None, 'solid', None)
@@ -74,4 +74,19 @@ GOST_STYLES = {
         limits=(5, 30, 4, 6),
         base_type='dash_dot_dot'
     )
-}
\ No newline at end of file
+}
+
+# Расшифровка паттерна в последовательность "штрих, пробел, штрих, пробел..." (в мм) по base_type
+def expand_dash_pattern(style):
+    if not style.dash_pattern:
+        return None
+    main_dash, main_gap = style.dash_pattern[0], style.dash_pattern[1]
+
+    if style.base_type == 'dash_dot_dot':
+        part = main_gap / 5.0
+        return (main_dash, part, part, part, part, part)
+    elif style.base_type == 'dash_dot':
+        part = main_gap / 3.0
+        return (main_dash, part, part, part)
+    else: # 'dashed' или любой другой по умолчанию
+        return (main_dash, main_gap)
@@ -0,0 +1,132 @@
+# ui/display_list.py
+
+'''
+Список команд рисования (display list) между Renderer и холстом.
+Renderer сначала только считает геометрию и складывает команды в DisplayList, ничего не зная о Tk,
+а TkSubmitter затем одним проходом воспроизводит их на tk.Canvas (или на заглушке с тем же интерфейсом).
+
+DisplayList хранит команды в колонках:
+    kinds    - индекс типа примитива (KINDS: line, text, oval, rectangle, polygon),
+    coords   - все координаты подряд (array('d')), offsets - начало координат каждой команды,
+    styles   - индекс ключа стиля; ключ - кортеж пар (опция, значение) для create_*, повторяющиеся ключи
+               хранятся один раз (style_keys / style_options),
+    owners   - ID владельца команды (например, отрезка) или NO_OWNER, чтобы после отправки
+               раздать созданные элементы холста их владельцам.
+Список сравним (==) и копируется пачками (extend), поэтому его можно кэшировать между кадрами,
+сравнивать или отдавать другому бэкенду (например, растеризатору без окна).
+'''
+
+from array import array
+
+KINDS = ('line', 'text', 'oval', 'rectangle', 'polygon')
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+
+# Владелец команды не задан
+NO_OWNER = -1
+
+def style_key(**options):
+    """Ключ стиля из опций create_* (порядок аргументов не важен)."""
+    return tuple(sorted(options.items()))
+
+class DisplayList:
+    def __init__(self):
+        self.kinds = array('B')
+        self.coords = array('d')
+        self.offsets = array('I', [0])
+        self.styles = array('I')
+        self.owners = array('q')
+
+        self.style_keys = []     # индекс стиля -> ключ
+        self.style_options = []  # индекс стиля -> словарь опций (готов для **kwargs)
+        self._style_index = {}   # ключ -> индекс стиля
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __eq__(self, other):
+        if not isinstance(other, DisplayList): return NotImplemented
+        return (self.kinds == other.kinds and self.coords == other.coords and self.owners == other.owners
+                and [self.style_keys[i] for i in self.styles] == [other.style_keys[i] for i in other.styles])
+
+    def clear(self):
+        self.__init__()
+
+    def style_id(self, key):
+        """Индекс ключа стиля (ключ регистрируется при первом обращении)."""
+        index = self._style_index.get(key)
+        if index is None:
+            index = len(self.style_keys)
+            self._style_index[key] = index
+            self.style_keys.append(key)
+            self.style_options.append(dict(key))
+        return index
+
+    def add(self, kind, coords, key, owner=NO_OWNER):
+        """Добавляет команду: kind из KINDS, coords - плоская последовательность x, y, ...; key - см. style_key."""
+        self.kinds.append(KIND_INDEX[kind])
+        self.coords.extend(coords)
+        self.offsets.append(len(self.coords))
+        self.styles.append(self.style_id(key))
+        self.owners.append(owner)
+
+    def add_lines(self, segments, key, owner=NO_OWNER):
+        """Пачка отдельных линий одного стиля: segments - последовательность (x1, y1, x2, y2)."""
+        if not segments: return
+        style = self.style_id(key)
+        coords, offsets = self.coords, self.offsets
+        for seg in segments:
+            coords.extend(seg)
+            offsets.append(len(coords))
+        count = len(segments)
+        self.kinds.extend([KIND_INDEX['line']] * count)
+        self.styles.extend([style] * count)
+        self.owners.extend([owner] * count)
+
+    def add_line_run(self, coords, key, owner=NO_OWNER):
+        """Пачка отдельных линий одного стиля из плоского массива: по 4 числа (x1, y1, x2, y2) на линию."""
+        count = len(coords) // 4
+        if not count: return
+        style = self.style_id(key)
+        base = len(self.coords)
+        self.coords.extend(coords)
+        self.offsets.extend(range(base + 4, base + 4 * count + 1, 4))
+        self.kinds.extend([KIND_INDEX['line']] * count)
+        self.styles.extend([style] * count)
+        self.owners.extend([owner] * count)
+
+    def extend(self, other):
+        """Дописывает команды другого списка (индексы стилей пересчитываются)."""
+        remap = [self.style_id(key) for key in other.style_keys]
+        base = len(self.coords)
+        self.kinds.extend(other.kinds)
+        self.coords.extend(other.coords)
+        self.offsets.extend(offset + base for offset in other.offsets[1:])
+        self.styles.extend(remap[i] for i in other.styles)
+        self.owners.extend(other.owners)
+
+    def __iter__(self):
+        """Команды по одной: (тип, координаты, опции, владелец)."""
+        coords, offsets, options = self.coords, self.offsets, self.style_options
+        for i, kind in enumerate(self.kinds):
+            yield KINDS[kind], coords[offsets[i]:offsets[i + 1]], options[self.styles[i]], self.owners[i]
+
+class TkSubmitter:
+    """Воспроизводит DisplayList на холсте; тонкая прослойка, вся геометрия уже посчитана."""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+
+    def submit(self, display_list):
+        """Создает элементы холста и возвращает их ID в порядке команд."""
+        creators = [getattr(self.canvas, 'create_' + kind) for kind in KINDS]
+        coords, offsets, options, styles = display_list.coords, display_list.offsets, display_list.style_options, display_list.styles
+        return [creators[kind](*coords[offsets[i]:offsets[i + 1]], **options[styles[i]])
+                for i, kind in enumerate(display_list.kinds)]
+
+    def submit_owned(self, display_list):
+        """Как submit, но группирует созданные элементы по владельцам: {владелец: [ID элементов]}."""
+        owned = {}
+        for owner, item in zip(display_list.owners, self.submit(display_list)):
+            if owner != NO_OWNER:
+                owned.setdefault(owner, []).append(item)
+        return owned
@@ -8,8 +8,11 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import colorchooser 
-import math
-from logic.styles import GOST_STYLES
+from ui.thumbnails import ThumbnailCache
+
+# Размер образца стиля в панели свойств (пиксели)
+STYLE_PREVIEW_WIDTH = 200
+STYLE_PREVIEW_HEIGHT = 40
 
 class MainWindow:
     def __init__(self, root, callbacks):
@@ -56,6 +59,16 @@ class MainWindow:
         self.canvas.bind("<Button-3>", callbacks.show_context_menu) 
 
         self.root.bind("<F11>", callbacks.toggle_fullscreen)
+        self.root.bind("<F3>", callbacks.on_toggle_snap)
+        self.root.bind("<Control-P>", callbacks.on_toggle_profiler)
+        self.root.bind("<Control-o>", callbacks.on_open_file)
+        self.root.bind("<Control-s>", callbacks.on_save_file)
+        # Заглавные буквы - на случай Caps Lock; Ctrl+Shift+Z точнее <Control-Z>, поэтому Tk выберет повтор
+        self.root.bind("<Control-z>", callbacks.on_undo)
+        self.root.bind("<Control-Z>", callbacks.on_undo)
+        self.root.bind("<Control-y>", callbacks.on_redo)
+        self.root.bind("<Control-Y>", callbacks.on_redo)
+        self.root.bind("<Control-Shift-Z>", callbacks.on_redo)
         self.root.bind("<Escape>", callbacks.on_escape_key)
         
         self.root.bind("<plus>", callbacks.on_zoom_in)
@@ -107,9 +120,23 @@ class MainWindow:
         root.config(menu=menubar)
         
         file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Открыть...", accelerator="Ctrl+O", command=callbacks.on_open_file)
+        file_menu.add_command(label="Сохранить...", accelerator="Ctrl+S", command=callbacks.on_save_file)
+        file_menu.add_separator()
+        file_menu.add_command(label="Импорт DXF...", command=callbacks.on_import_dxf)
+        file_menu.add_command(label="Экспорт в DXF/SVG...", command=callbacks.on_export)
+        file_menu.add_separator()
         file_menu.add_command(label="Выход", command=root.quit)
         menubar.add_cascade(label="Файл", menu=file_menu)
         
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Отменить", accelerator="Ctrl+Z", command=callbacks.on_undo)
+        edit_menu.add_command(label="Повторить", accelerator="Ctrl+Y", command=callbacks.on_redo)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Выделить по стилю", command=callbacks.on_select_by_style)
+        edit_menu.add_command(label="Выделить по цвету", command=callbacks.on_select_by_color)
+        menubar.add_cascade(label="Правка", menu=edit_menu)
+
         style_menu = tk.Menu(menubar, tearoff=0)
         style_menu.add_command(label="Менеджер стилей...", command=callbacks.on_open_style_manager)
         menubar.add_cascade(label="Стили", menu=style_menu)
@@ -125,6 +152,13 @@ class MainWindow:
         view_menu.add_command(label="Повернуть вправо", command=callbacks.on_rotate_right)
         view_menu.add_separator()
         view_menu.add_command(label="Сбросить вид", command=callbacks.on_reset_view)
+        view_menu.add_separator()
+        view_menu.add_command(label="Объектная привязка вкл/выкл", accelerator="F3", command=callbacks.on_toggle_snap)
+        view_menu.add_separator()
+        self.profiler_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="Профилирование кадров", accelerator="Ctrl+Shift+P",
+                                  variable=self.profiler_var, command=callbacks.on_toggle_profiler)
+        view_menu.add_command(label="Сохранить профиль...", command=callbacks.on_dump_profile)
         
         menubar.add_cascade(label="Вид", menu=view_menu)
 
@@ -137,8 +171,19 @@ class MainWindow:
         ttk.Separator(parent, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=2)
         self.status_angle = ttk.Label(parent, text="Angle: 0.0°", width=15)
         self.status_angle.pack(side=tk.LEFT, padx=5)
+        ttk.Separator(parent, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=2)
+        self.status_render = ttk.Label(parent, text="Отрезки: 0 / отсечено 0", width=28)
+        self.status_render.pack(side=tk.LEFT, padx=5)
         self.status_mode = ttk.Label(parent, text="Режим: Ожидание", anchor=tk.E)
         self.status_mode.pack(side=tk.RIGHT, padx=5, fill=tk.X, expand=True)
+        # Сводка профилировщика кадров: видна только при включенном профилировании
+        self.status_profile = ttk.Label(parent, text="")
+
+    def show_profile_status(self, visible):
+        if visible:
+            self.status_profile.pack(side=tk.LEFT, padx=5, after=self.status_render)
+        else:
+            self.status_profile.pack_forget()
 
     def create_context_menu(self, root, callbacks):
         self.context_menu = tk.Menu(root, tearoff=0)
@@ -153,33 +198,26 @@ class MainWindow:
         style_frame = ttk.LabelFrame(parent, text="Стиль линии")
         style_frame.pack(padx=5, pady=5, fill=tk.X)
         
-        # Фиксированная ширина канваса
-        self.prop_preview_canvas = tk.Canvas(style_frame, width=200, height=40, bg="white", relief="sunken", borderwidth=1)
-        self.prop_preview_canvas.pack(padx=5, pady=(5, 0))
-        # Обновление превью при отрисовке
-        self.prop_preview_canvas.bind("<Configure>", lambda e: self.update_style_preview(self.callbacks.state.current_style_name))
-        
-        # Список стилей
-        self.style_ids = [] # Ключи
-        style_names = []
-        # Сортировка
-        sorted_items = sorted(GOST_STYLES.items(), key=lambda x: (x[1].is_custom, x[1].display_name))
-        for key, style in sorted_items:
-            style_names.append(style.display_name)
-            self.style_ids.append(key)
+        # Миниатюры стилей: маленькие - для списка выбора, крупная - образец в панели (1 мм = mm_to_px_ratio пикселей).
+        # Картинки строятся один раз и пересоздаются, только когда меняется сам стиль или толщина S
+        state = callbacks.state
+        self.style_thumbnails = ThumbnailCache(state)
+        self.preview_thumbnails = ThumbnailCache(state, STYLE_PREVIEW_WIDTH, STYLE_PREVIEW_HEIGHT, state.mm_to_px_ratio)
 
-        self.style_combobox = ttk.Combobox(style_frame, values=style_names, state="readonly")
+        # Пустая картинка того же размера - когда показывать нечего (без нее надпись сожмется)
+        self._blank_preview = tk.PhotoImage(width=STYLE_PREVIEW_WIDTH, height=STYLE_PREVIEW_HEIGHT)
+        self.prop_preview_label = tk.Label(style_frame, image=self._blank_preview, bg="white", relief="sunken", borderwidth=1)
+        self.prop_preview_label.pack(padx=5, pady=(5, 0))
         
-        # Начальное значение
-        current = callbacks.state.current_style_name
-        if current in self.style_ids:
-            idx = self.style_ids.index(current)
-            self.style_combobox.current(idx)
-        elif self.style_ids:
-            self.style_combobox.current(0)
-            
-        self.style_combobox.pack(fill=tk.X, padx=5, pady=5)
-        self.style_combobox.bind("<<ComboboxSelected>>", callbacks.on_style_selected)
+        # Список стилей: кнопка с выпадающим меню, у каждого пункта - миниатюра стиля
+        self.style_ids = [] # Ключи
+        self.style_index = -1 # Индекс выбранного стиля в style_ids (-1 - не выбран, например "Разные")
+        self.style_picker = ttk.Menubutton(style_frame, compound=tk.LEFT)
+        # Миниатюры пунктов подгружаются при первом открытии меню
+        self.style_menu = tk.Menu(self.style_picker, tearoff=0, postcommand=self._load_style_thumbnails)
+        self.style_picker['menu'] = self.style_menu
+        self.style_picker.pack(fill=tk.X, padx=5, pady=5)
+        self.refresh_style_picker(state.line_styles)
         
         ttk.Button(style_frame, text="Настроить стили...", command=callbacks.on_open_style_manager).pack(fill=tk.X, padx=5, pady=(0, 5))
 
@@ -214,6 +252,14 @@ class MainWindow:
         ttk.Entry(grid_frame, textvariable=self.grid_step_var, width=5).pack(side=tk.LEFT, padx=5)
         ttk.Button(grid_frame, text="Применить", command=callbacks.on_apply_settings).pack(side=tk.LEFT, padx=5)
         
+        # --- ИСТОРИЯ ---
+        history_frame = ttk.LabelFrame(parent, text="История отмены")
+        history_frame.pack(padx=5, pady=5, fill=tk.X)
+        self.history_budget_var = tk.StringVar(value=str(state.history_budget_mb))
+        ttk.Label(history_frame, text="Память, МБ:").pack(side=tk.LEFT, padx=(0,5))
+        ttk.Entry(history_frame, textvariable=self.history_budget_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Button(history_frame, text="Применить", command=callbacks.on_apply_history_budget).pack(side=tk.LEFT, padx=5)
+
         # --- ЦВЕТА ---
         color_frame = ttk.LabelFrame(parent, text="Цвета")
         color_frame.pack(padx=5, pady=5, fill=tk.X)
@@ -255,172 +301,55 @@ class MainWindow:
 
     # --- ОБНОВЛЕНИЕ ИНТЕРФЕЙСА ---
 
-    def refresh_style_combobox_values(self, styles_dict):
+    def refresh_style_picker(self, styles_dict):
         """Обновляет список стилей в выпадающем меню."""
         sorted_items = sorted(styles_dict.items(), key=lambda x: (x[1].is_custom, x[1].display_name))
         
-        style_names = []
-        self.style_ids = [] 
-        
-        for key, style in sorted_items:
-            style_names.append(style.display_name)
-            self.style_ids.append(key)
-        
-        self.style_combobox['values'] = style_names
+        self.style_ids = [key for key, _ in sorted_items]
+        self.style_menu.delete(0, tk.END)
+        for i, (key, style) in enumerate(sorted_items):
+            self.style_menu.add_command(label=style.display_name, compound=tk.LEFT,
+                                        command=lambda i=i: self._on_style_picked(i))
         
         # Восстанавливаем выбор (или сбрасываем)
-        current_text = self.style_combobox.get()
-        
-        # Пробуем найти текущий стиль по тексту или по ID
         current_id = self.callbacks.state.current_style_name
         if current_id in self.style_ids:
-             idx = self.style_ids.index(current_id)
-             self.style_combobox.current(idx)
-        elif style_names and current_text != "Разные":
-             self.style_combobox.current(0)
+            self._show_style(self.style_ids.index(current_id))
+        elif self.style_ids and self.style_picker.cget('text') != "Разные":
+            self._show_style(0)
+
+    def refresh_style_combobox_values(self, styles_dict):
+        """Прежнее имя refresh_style_picker (до замены Combobox на меню с миниатюрами)."""
+        self.refresh_style_picker(styles_dict)
+
+    def _load_style_thumbnails(self):
+        # Готовые миниатюры берутся из кэша, новые и измененные стили растеризуются здесь один раз
+        for i, key in enumerate(self.style_ids):
+            self.style_menu.entryconfigure(i, image=self.style_thumbnails.get(key))
+
+    def _show_style(self, idx):
+        self.style_index = idx
+        key = self.style_ids[idx]
+        style = self.callbacks.state.line_styles[key]
+        self.style_picker.config(text=style.display_name, image=self.style_thumbnails.get(key))
+
+    def _on_style_picked(self, idx):
+        self._show_style(idx)
+        self.callbacks.on_style_selected()
 
     def set_style_selection(self, style_name_or_text):
-        """Устанавливает текст в выпадающем списке и обновляет превью."""
+        """Устанавливает выбранный стиль в списке и обновляет превью."""
         # Если передан ID стиля
         if style_name_or_text in self.callbacks.state.line_styles:
             if style_name_or_text in self.style_ids:
-                idx = self.style_ids.index(style_name_or_text)
-                self.style_combobox.current(idx)
+                self._show_style(self.style_ids.index(style_name_or_text))
             self.update_style_preview(style_name_or_text)
         else:
             # Если передано "Разные"
-            self.style_combobox.set(style_name_or_text)
-            self.prop_preview_canvas.delete("all")
-
-    # --- ГЕНЕРАТОРЫ (Те же, что и везде) ---
-    def _generate_dashed_coords(self, x1, y1, x2, y2, pattern, px_ratio):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return []
-        
-        # ТЕПЕРЬ ЭТО ОТДЕЛЬНЫЕ СТРОКИ
-        ux, uy = dx/length, dy/length
-        scaled_pattern = [float(val) * px_ratio for val in pattern]
-        
-        lines = []
-        current_dist = 0
-        pat_idx = 0
-        
-        while current_dist < length:
-            segment_len = scaled_pattern[pat_idx % len(scaled_pattern)]
-            is_draw = (pat_idx % 2 == 0)
-            draw_len = min(segment_len, length - current_dist)
-            
-            if is_draw:
-                lines.append((x1 + ux*current_dist, y1 + uy*current_dist, 
-                              x1 + ux*(current_dist+draw_len), y1 + uy*(current_dist+draw_len)))
-            current_dist += segment_len
-            pat_idx += 1
-        return lines
-
-    def _generate_wave_coords(self, x1, y1, x2, y2):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return [x1, y1, x2, y2]
-        
-        # ТЕПЕРЬ ЭТО ОТДЕЛЬНЫЕ СТРОКИ
-        ux, uy = dx/length, dy/length
-        nx, ny = -uy, ux
-        
-        points = []
-        step = 5
-        amplitude = 3
-        freq = 0.2
-        
-        t = 0
-        while t < length:
-            offset = amplitude * math.sin(t * freq)
-            points.extend([x1 + ux*t + nx*offset, y1 + uy*t + ny*offset])
-            t += step
-        points.extend([x2, y2])
-        return points
-
-    def _generate_zigzag_coords(self, x1, y1, x2, y2):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return [x1, y1, x2, y2]
-        
-        # ТЕПЕРЬ ЭТО ОТДЕЛЬНЫЕ СТРОКИ
-        ux, uy = dx/length, dy/length
-        nx, ny = -uy, ux
-        
-        points = [x1, y1]
-        period = 40
-        kink_len = 12
-        amplitude = 5
-        
-        current_dist = 0
-        while current_dist < length:
-            dist_to_next_kink = min(length, current_dist + period)
-            points.extend([x1 + ux*dist_to_next_kink, y1 + uy*dist_to_next_kink])
-            current_dist = dist_to_next_kink
-            
-            if current_dist + kink_len <= length:
-                d1 = current_dist + kink_len * 0.25
-                d2 = current_dist + kink_len * 0.75
-                d3 = current_dist + kink_len
-                
-                points.extend([
-                    x1 + ux*d1 - nx*amplitude, y1 + uy*d1 - ny*amplitude,
-                    x1 + ux*d2 + nx*amplitude, y1 + uy*d2 + ny*amplitude,
-                    x1 + ux*d3, y1 + uy*d3
-                ])
-                current_dist += kink_len
-            else:
-                points.extend([x2, y2])
-                break
-        return points
+            self.style_index = -1
+            self.style_picker.config(text=style_name_or_text, image='')
+            self.prop_preview_label.config(image=self._blank_preview)
 
     def update_style_preview(self, style_name):
-        self.prop_preview_canvas.delete("all")
-        style = self.callbacks.state.line_styles.get(style_name)
-        if not style: return
-
-        w = self.prop_preview_canvas.winfo_width(); w = 200 if w < 10 else w
-        h = self.prop_preview_canvas.winfo_height(); cy = h / 2
-        x1, y1 = 10, cy; x2, y2 = w-10, cy
-
-        px_ratio = 3.78 
-        s_px = self.callbacks.state.base_thickness_mm * px_ratio
-        width = max(1, int(s_px)) if style.is_main else max(1, int(s_px / 2))
-
-        dash_pattern = None
-        if style.dash_pattern:
-            d, g = style.dash_pattern
-            # Дублирующая проверка (для надежности)
-            # Сначала проверяем base_type (новое)
-            if getattr(style, 'base_type', 'solid') == 'dash_dot_dot':
-                part = g/5.0; dash_pattern = [d, part, part, part, part, part]
-            elif getattr(style, 'base_type', 'solid') == 'dash_dot':
-                part = g/3.0; dash_pattern = [d, part, part, part]
-            # Если base_type не помог, проверяем имя (старое)
-            elif style.name == 'dash_dot_dot':
-                part = g/5.0; dash_pattern = [d, part, part, part, part, part]
-            elif style.name.startswith('dash_dot_'): 
-                part = g/3.0; dash_pattern = [d, part, part, part]
-            else: 
-                dash_pattern = [d, g]
-
-        draw_complex = False; coords = []; smooth = False
-        
-        base_type = getattr(style, 'base_type', 'solid')
-        
-        if base_type == 'wave' or style.name == 'solid_wave': 
-            coords = self._generate_wave_coords(x1, y1, x2, y2); draw_complex = True; smooth = True
-        elif base_type == 'zigzag' or style.name == 'solid_zigzag': 
-            coords = self._generate_zigzag_coords(x1, y1, x2, y2); draw_complex = True; smooth = False
-        elif dash_pattern:
-            segments = self._generate_dashed_coords(x1, y1, x2, y2, dash_pattern, px_ratio)
-            for seg in segments: self.prop_preview_canvas.create_line(seg[0], seg[1], seg[2], seg[3], width=width, fill='black', capstyle=tk.ROUND)
-            return
-        else:
-            self.prop_preview_canvas.create_line(x1, y1, x2, y2, width=width, fill='black', capstyle=tk.ROUND)
-            return
-
-        if draw_complex and len(coords) >= 4:
-            self.prop_preview_canvas.create_line(*coords, width=width, fill='black', capstyle=tk.ROUND, smooth=smooth)
\ No newline at end of file
+        image = self.preview_thumbnails.get(style_name)
+        self.prop_preview_label.config(image=image if image is not None else self._blank_preview)
@@ -0,0 +1,47 @@
+# ui/progress_dialog.py
+
+'''
+Модальное окошко с полосой прогресса и кнопкой "Отмена" для долгих фоновых операций.
+'''
+
+import tkinter as tk
+from tkinter import ttk
+
+class ProgressDialog(tk.Toplevel):
+    def __init__(self, parent, title, text, on_cancel):
+        super().__init__(parent)
+        self.title(title)
+        self.resizable(False, False)
+        self.on_cancel = on_cancel
+
+        self.transient(parent)
+        self.grab_set()
+
+        frame = ttk.Frame(self, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.label = ttk.Label(frame, text=text)
+        self.label.pack(anchor=tk.W)
+
+        self.progress = ttk.Progressbar(frame, orient=tk.HORIZONTAL, length=320, mode='determinate', maximum=100)
+        self.progress.pack(fill=tk.X, pady=10)
+
+        self.btn_cancel = ttk.Button(frame, text="Отмена", command=self.cancel)
+        self.btn_cancel.pack(side=tk.RIGHT)
+
+        # Закрытие крестиком = отмена
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def set_progress(self, fraction, text=None):
+        self.progress['value'] = max(0.0, min(1.0, fraction)) * 100
+        if text is not None:
+            self.label.config(text=text)
+
+    def cancel(self):
+        self.btn_cancel.config(state='disabled')
+        self.label.config(text="Отмена...")
+        self.on_cancel()
+
+    def close(self):
+        self.grab_release()
+        self.destroy()
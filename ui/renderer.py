@@ -4,10 +4,81 @@
 Этот класс умеет брать данные из state (точки, линии) и физически рисовать их на tkinter.Canvas. 
 Он рисует сетку, оси координат и сами отрезки. 
 Он знает, как нарисовать линию определенного цвета и толщины, но не решает когда это делать.
+
+Рисование идет в два этапа: методы emit_* только считают геометрию и складывают команды в DisplayList
+(ui/display_list.py), а TkSubmitter создает по ним элементы холста. Удаление, move/scale и порядок слоев
+остаются прямыми вызовами холста - это операции над уже созданными элементами.
 '''
 
 import math
-import tkinter as tk
+from itertools import compress, repeat
+from operator import lt, mul, sub
+from logic.styles import expand_dash_pattern
+from logic.patterns import style_kind, style_geometry, polyline_points
+from logic.grid import grid_levels, line_indices
+from ui.display_list import DisplayList, TkSubmitter, NO_OWNER
+
+# Запас (в пикселях) вокруг видимой области при отсечении:
+# толстые линии, подсветка выделения и амплитуда волн/изломов могут выступать за bounding box отрезка
+CULL_MARGIN_PX = 20
+
+# --- Политика детализации (LOD) при сильном отдалении ---
+# Отрезок короче этого (в пикселях) не рисуется вовсе
+LOD_SKIP_PX = 0.5
+# Отрезок короче этого рисуется одной сплошной линией независимо от стиля
+LOD_SIMPLE_PX = 4.0
+# Если самый мелкий элемент паттерна (штрих, пробел, амплитуда волны/излома) меньше этого - рисуем сплошной
+LOD_PATTERN_PX = 2.0
+# Предел числа точек ломаной для волны/зигзага: длинные отрезки получают прореженную ломаную
+LOD_MAX_POINTS = 2000
+# Наименьший размер ячейки (в пикселях) для мелких отрезков. Ячейки привязаны к миру, их размер - степень двойки
+# мировых единиц, на экране от AGGREGATE_CELL_PX до 2*AGGREGATE_CELL_PX. Отрезок короче ячейки не получает
+# собственных элементов холста: каждую ячейку рисует один отрезок-представитель своим цветом и толщиной.
+# Так при сильном отдалении число элементов ограничено площадью экрана,
+# а подписи (_segment_signature) считаются только для отрезков, которые рисуются по отдельности
+AGGREGATE_CELL_PX = 4.0
+# Запас отсечения (в пикселях) для ячеек: не меньше наибольшей ячейки на экране. Отрезок, ушедший из вида,
+# лежит дальше этого запаса от экрана, а с ним и вся его ячейка - на это опирается Renderer._aggregate_step
+AGGREGATE_MARGIN_PX = 2 * AGGREGATE_CELL_PX
+
+# Основные линии сетки темнее второстепенных на эту долю
+GRID_MAJOR_DARKEN = 0.15
+
+# Маркер объектной привязки: полуразмер в пикселях и цвет
+SNAP_MARKER_PX = 6
+SNAP_MARKER_COLOR = '#FF8C00'
+
+def _line_key(color, width, tags, capstyle='round', smooth=None):
+    """Ключ стиля линии для DisplayList (опции create_line)."""
+    key = [('fill', color), ('width', width)]
+    if capstyle: key.append(('capstyle', capstyle))
+    if smooth is not None: key.append(('smooth', smooth))
+    key.append(('tags', tags))
+    return tuple(key)
+
+def _darken(color, amount=GRID_MAJOR_DARKEN):
+    """Цвет '#rrggbb', затемненный на долю amount (именованные цвета Tk возвращаются как есть)."""
+    if not (isinstance(color, str) and len(color) == 7 and color.startswith('#')):
+        return color
+    r, g, b = (int(int(color[k:k + 2], 16) * (1 - amount)) for k in (1, 3, 5))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def _text_key(text, font, color, tags):
+    return (('text', text), ('font', font), ('fill', color), ('anchor', 'nw'), ('tags', tags))
+
+def emit_style_sample(dl, style, x1, y1, x2, y2, scale, width, pattern=None, color='black', tags=()):
+    """Образец стиля для превью: отрезок (x1, y1)-(x2, y2) в пикселях; штрихи, волна и изломы
+    строятся тем же движком, что и на холсте, с масштабом scale (пикселей на мм).
+    pattern - паттерн в мм вместо паттерна стиля (например, еще не примененные значения)."""
+    kind = style_kind(style) if pattern is None else ('dashed' if pattern else 'solid')
+    if pattern is None: pattern = expand_dash_pattern(style)
+    scaled = tuple(float(value) * scale for value in pattern) if pattern else None
+    coords, _ = style_geometry(kind, scaled, (x1,), (y1,), (x2,), (y2,), scale)
+    key = _line_key(color, width, tags, smooth={'wave': True, 'zigzag': False}.get(kind))
+    if kind in ('dashed', 'solid'):
+        dl.add_line_run(coords, key)
+    else:
+        dl.add('line', coords, key)
 
 class Renderer:
     def __init__(self, canvas, state, converter):
@@ -15,51 +86,93 @@ class Renderer:
         self.state = state
         self.converter = converter
 
+        # Статистика последнего кадра. Видимые отрезки делятся на нарисованные по отдельности, пропущенные LOD
+        # (не получили ни одного элемента) и слитые в ячейки мелких отрезков (aggregate_cells ячеек);
+        # остальные отсечены. submitted_count - сколько элементов холста создано в этом кадре
+        self.visible_count = 0
+        self.drawn_count = 0
+        self.skipped_count = 0
+        self.aggregated_count = 0
+        self.aggregate_cells = 0
+        self.culled_count = 0
+        self.submitted_count = 0
+
+        # Retained-режим: ID отрезка -> (подпись, [ID элементов холста]) и ViewTransform прошлого кадра
+        self._segment_items = {}
+        # Отрезки из _segment_items, которым LOD не дал ни одного элемента
+        self._skipped = set()
+        self._last_view = None
+        # Ячейки мелких отрезков: ключ ячейки -> код представителя (ID, стиль, цвет) и ключ ячейки -> [ID элементов];
+        # размер ячейки в мировых единицах, толщины стилей и версия данных, под которые они построены;
+        # видимые отрезки прошлого кадра и те из них, что рисуются по отдельности
+        self._aggregate_reps = {}
+        self._aggregate_items = {}
+        self._aggregate_cell = None
+        self._aggregate_widths = None
+        self._aggregate_version = None
+        self._aggregate_visible = None
+        self._detailed = set()
+        # Все, кроме сдвига камеры, от чего зависят подписи отрезков (зум, поворот, версии данных, стилей и цепочек, толщина S).
+        # Совпал с прошлым кадром - подписи уже нарисованных отрезков не изменились, их не пересчитываем
+        self._signature_inputs = None
+        # Ключ (вид, шаг, цвет), под который построен слой сетки на холсте
+        self._grid_key = None
+
+        # Отправка команд на холст и список команд последнего кадра (только созданное в этом кадре)
+        self.submitter = TkSubmitter(canvas)
+        self.display_list = None
+
+        # FrameProfiler, пока профилирование включено (см. app/profiler.py), иначе None
+        self.profiler = None
+
     def clear(self):
         self.canvas.delete("all")
 
-    def draw_grid_and_axes(self):
-        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
-        if w < 2 or h < 2: return
+    def get_visible_world_rect(self):
+        """Возвращает (min_x, min_y, max_x, max_y) видимой области в мировых координатах или None."""
+        w, h = self.converter.canvas_size()
+        if w < 2 or h < 2: return None
 
-        corners = [
-            self.converter.screen_to_world(0, 0),
-            self.converter.screen_to_world(w, 0),
-            self.converter.screen_to_world(w, h),
-            self.converter.screen_to_world(0, h)
-        ]
+        # При повороте вида экран - это повернутый прямоугольник, берем bounding box его углов
+        xs, ys = self.converter.screen_to_world_many((0, w, w, 0), (0, 0, h, h))
         
-        min_wx = min(p[0] for p in corners); max_wx = max(p[0] for p in corners)
-        min_wy = min(p[1] for p in corners); max_wy = max(p[1] for p in corners)
+        min_wx = min(xs); max_wx = max(xs)
+        min_wy = min(ys); max_wy = max(ys)
+        return min_wx, min_wy, max_wx, max_wy
+
+    def emit_grid_and_axes(self, dl):
+        rect = self.get_visible_world_rect()
+        if rect is None: return
+        min_wx, min_wy, max_wx, max_wy = rect
 
-        step = self.state.grid_step
+        # Шаг подбирается под зум, чтобы линии не сливались; каждая major_every-я линия - основная
+        step, major_every = grid_levels(self.state.grid_step, self.state.zoom)
         infinity = max(max_wx - min_wx, max_wy - min_wy) * 2 + 1000
 
+        # Собираем концы всех линий сетки и переводим их на экран одним пакетом.
+        # Координата линии - целый индекс * шаг, без накопления ошибки; ось - индекс 0
+        line_x = []; line_y = []; line_index = []
+
         # Вертикальные
-        start_x = math.floor(min_wx / step) * step
-        curr_x = start_x
-        while curr_x <= max_wx:
-            p1 = self.converter.world_to_screen(curr_x, -infinity)
-            p2 = self.converter.world_to_screen(curr_x, infinity)
-            color = 'black' if abs(curr_x) < 1e-9 else self.state.grid_color
-            width = 2 if abs(curr_x) < 1e-9 else 1
-            self.canvas.create_line(p1[0], p1[1], p2[0], p2[1], fill=color, width=width)
-            curr_x += step
+        for i in line_indices(min_wx, max_wx, step):
+            line_x += (i * step, i * step); line_y += (-infinity, infinity)
+            line_index.append(i)
 
         # Горизонтальные
-        start_y = math.floor(min_wy / step) * step
-        curr_y = start_y
-        while curr_y <= max_wy:
-            p1 = self.converter.world_to_screen(-infinity, curr_y)
-            p2 = self.converter.world_to_screen(infinity, curr_y)
-            color = 'black' if abs(curr_y) < 1e-9 else self.state.grid_color
-            width = 2 if abs(curr_y) < 1e-9 else 1
-            self.canvas.create_line(p1[0], p1[1], p2[0], p2[1], fill=color, width=width)
-            curr_y += step
+        for i in line_indices(min_wy, max_wy, step):
+            line_x += (-infinity, infinity); line_y += (i * step, i * step)
+            line_index.append(i)
+
+        screen_xs, screen_ys = self.converter.world_to_screen_many(line_x, line_y)
+        minor_key = _line_key(self.state.grid_color, 1, ('grid',), capstyle=None)
+        major_key = _line_key(_darken(self.state.grid_color), 1, ('grid',), capstyle=None)
+        axis_key = _line_key('black', 2, ('grid',), capstyle=None)
+        for n, i in enumerate(line_index):
+            j = 2 * n
+            key = axis_key if i == 0 else major_key if i % major_every == 0 else minor_key
+            dl.add('line', (screen_xs[j], screen_ys[j], screen_xs[j + 1], screen_ys[j + 1]), key)
             
         # Оси
-        x_pos = self.converter.world_to_screen(step * 3, 0)
-        y_pos = self.converter.world_to_screen(0, step * 3)
         font_style = ("Arial", 10, "bold")
         world_width = max_wx - min_wx
         world_height = max_wy - min_wy
@@ -71,204 +184,450 @@ class Renderer:
                 lbl_x_pos = max_wx - pad_x
                 lbl_x_pos = max(lbl_x_pos, step * 2)
                 sx, sy = self.converter.world_to_screen(lbl_x_pos, 0)
-                self.canvas.create_text(sx, sy + 5, text="X", font=font_style, fill="red", anchor="nw")
+                dl.add('text', (sx, sy + 5), _text_key("X", font_style, "red", ('grid',)))
 
         if min_wx < 0 < max_wx:
             if max_wy > 0:
                 lbl_y_pos = max_wy - pad_y
                 lbl_y_pos = max(lbl_y_pos, step * 2)
                 sx, sy = self.converter.world_to_screen(0, lbl_y_pos)
-                self.canvas.create_text(sx + 5, sy, text="Y", font=font_style, fill="green", anchor="nw")
+                dl.add('text', (sx + 5, sy), _text_key("Y", font_style, "green", ('grid',)))
 
-    # Генератор для ПУНКТИРНЫХ линий
-    def _generate_dashed_coords(self, x1, y1, x2, y2, pattern):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return []
-        
-        ux, uy = dx/length, dy/length
-        
-        # Масштабируем паттерн по зуму
-        zoom = self.state.zoom
-        scaled_pattern = [float(val) * zoom for val in pattern]
-        
-        lines = []
-        current_dist = 0
-        pat_idx = 0
-        
-        while current_dist < length:
-            segment_len = scaled_pattern[pat_idx % len(scaled_pattern)]
-            
-            # Логика: Четные индексы (0, 2, 4...) - РИСУЕМ
-            # Нечетные индексы (1, 3, 5...) - ПРОПУСКАЕМ (пробел)
-            is_draw = (pat_idx % 2 == 0)
-            
-            draw_len = min(segment_len, length - current_dist)
-            
-            if is_draw:
-                px_start = x1 + ux * current_dist
-                py_start = y1 + uy * current_dist
-                px_end = x1 + ux * (current_dist + draw_len)
-                py_end = y1 + uy * (current_dist + draw_len)
-                lines.append((px_start, py_start, px_end, py_end))
-            
-            current_dist += segment_len
-            pat_idx += 1
-            
-        return lines
+    def _lod_mode(self, resolved, screen_length):
+        """Уровень детализации отрезка: 'skip', 'simple' (одна сплошная линия) или 'full'."""
+        if screen_length < LOD_SKIP_PX:
+            return 'skip'
+        if screen_length < LOD_SIMPLE_PX or resolved is None:
+            return 'simple'
+        # Самый мелкий элемент паттерна (штрих, пробел, амплитуда) неразличим - рисуем сплошной
+        if resolved.smallest_px is not None and resolved.smallest_px < LOD_PATTERN_PX:
+            return 'simple'
+        return 'full'
 
-    def _generate_wave_coords(self, x1, y1, x2, y2):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return [x1, y1, x2, y2]
-        
-        ux, uy = dx/length, dy/length
-        nx, ny = -uy, ux
-        
-        points = []
-        zoom = self.state.zoom
-        step = 5 * (zoom / 5.0)
-        amplitude = 3 * (zoom / 5.0)
-        freq = 0.2 / (zoom / 5.0)
-        if step < 0.1: step = 0.1
-        
-        t = 0
-        while t < length:
-            offset = amplitude * math.sin(t * freq)
-            bx = x1 + ux * t
-            by = y1 + uy * t
-            px = bx + nx * offset
-            py = by + ny * offset
-            points.extend([px, py])
-            t += step
-            
-        points.extend([x2, y2])
-        return points
+    def _resolve_style(self, style_name):
+        return self.state.style_cache.resolve(style_name, self.state.zoom, self.state.base_thickness_mm)
 
-    def _generate_zigzag_coords(self, x1, y1, x2, y2):
-        dx, dy = x2 - x1, y2 - y1
-        length = math.sqrt(dx*dx + dy*dy)
-        if length == 0: return [x1, y1, x2, y2]
-        
-        ux, uy = dx/length, dy/length
-        nx, ny = -uy, ux
-        
-        points = [x1, y1]
-        zoom = self.state.zoom
-        period = 40 * (zoom / 5.0)
-        kink_len = 12 * (zoom / 5.0)
-        amplitude = 5 * (zoom / 5.0)
-        
-        current_dist = 0
-        while current_dist < length:
-            dist_to_next_kink = min(length, current_dist + period)
-            bx = x1 + ux * dist_to_next_kink
-            by = y1 + uy * dist_to_next_kink
-            points.extend([bx, by])
-            current_dist = dist_to_next_kink
-            
-            if current_dist + kink_len <= length:
-                d1 = current_dist + kink_len * 0.25
-                px1 = x1 + ux * d1 - nx * amplitude
-                py1 = y1 + uy * d1 - ny * amplitude
-                d2 = current_dist + kink_len * 0.75
-                px2 = x1 + ux * d2 + nx * amplitude
-                py2 = y1 + uy * d2 + ny * amplitude
-                d3 = current_dist + kink_len
-                px3 = x1 + ux * d3
-                py3 = y1 + uy * d3
-                points.extend([px1, py1, px2, py2, px3, py3])
-                current_dist += kink_len
+    def emit_segments(self, dl, style_names, colors, screen, tags=(), owners=None,
+                      override_color=None, override_width=None):
+        """Складывает в dl команды пачки отрезков. screen - их концы на экране (sx1, sy1, sx2, sy2),
+        переведенные пакетом для всего кадра; owners - ID отрезков, которым достанутся элементы холста.
+        Штрихи, волны и изломы считаются движком паттернов (logic/patterns.py) одним вызовом на группу
+        отрезков с одинаковой геометрией стиля, а не по отрезку. Штрихи отрезков чертежа берутся из таблиц
+        их цепочек (logic/chains.py): фаза паттерна не начинается заново на каждом отрезке."""
+        keys = {}    # (цвет, толщина, тип) -> ключ стиля DisplayList
+        groups = {}  # (тип, паттерн в пикселях, паттерн в мировых единицах) -> [(концы, ключ, владелец)]
+        for n, (style_name, color, coords) in enumerate(zip(style_names, colors, screen)):
+            owner = owners[n] if owners is not None else NO_OWNER
+            draw_color = override_color if override_color else color
+
+            # Толщина, паттерн и тип геометрии берутся из кэша разрешенных стилей
+            resolved = self._resolve_style(style_name)
+            if override_width:
+                line_width, kind = override_width, 'solid'
             else:
-                points.extend([x2, y2])
-                break
-        return points
+                line_width = resolved.line_width if resolved else 1
+                # LOD: мелкие отрезки и неразличимые паттерны упрощаем до одной сплошной линии
+                lod = self._lod_mode(resolved, math.hypot(coords[2] - coords[0], coords[3] - coords[1]))
+                if lod == 'skip': continue
+                kind = resolved.kind if lod == 'full' else 'solid'
 
-    def draw_segment(self, segment, override_color=None, override_width=None):
-        draw_color = override_color if override_color else segment.color
-        style = self.state.line_styles.get(segment.style_name)
-        
-        line_width = 1
-        dash_pattern = None
-        is_complex_geo = False
-        
-        if style:
-            # --- ПЕРЕВОД ММ -> ПИКСЕЛИ ---
-            s_px = self.state.base_thickness_mm * self.state.mm_to_px_ratio
-            
-            if style.is_main:
-                # Основная линия: S (но не меньше 1 пикселя)
-                line_width = max(1, int(s_px))
+            key = keys.get((draw_color, line_width, kind))
+            if key is None:
+                smooth = {'wave': True, 'zigzag': False}.get(kind)
+                key = keys[(draw_color, line_width, kind)] = _line_key(draw_color, line_width, tags, smooth=smooth)
+
+            if kind == 'solid':
+                dl.add('line', coords, key, owner)
             else:
-                # Тонкая линия: S / 2 (но не меньше 1 пикселя)
-                line_width = max(1, int(s_px / 2))
-            
-            # --- ЛОГИКА РАСШИФРОВКИ ПАТТЕРНА ---
-            # Логика паттернов на основе base_type
-            if style.dash_pattern:
-                main_dash = style.dash_pattern[0]
-                main_gap = style.dash_pattern[1]
-                
-                if style.base_type == 'dash_dot_dot':
-                    part = main_gap / 5.0
-                    dash_pattern = [main_dash, part, part, part, part, part]
-                elif style.base_type == 'dash_dot':
-                    part = main_gap / 3.0
-                    dash_pattern = [main_dash, part, part, part]
-                else: # 'dashed' или любой другой по умолчанию
-                    dash_pattern = [main_dash, main_gap]
-            
-            # Логика сложных линий
-            if style.base_type in ['wave', 'zigzag']:
-                is_complex_geo = True
-
-        if override_width:
-            line_width = override_width
-            dash_pattern = None
-            is_complex_geo = False
-
-        sx1, sy1 = self.converter.world_to_screen(segment.p1.x, segment.p1.y)
-        sx2, sy2 = self.converter.world_to_screen(segment.p2.x, segment.p2.y)
-
-        # 1. ВОЛНЫ/ЗИГЗАГИ
-        if is_complex_geo:
-            coords = []
-            smooth_flag = False
-            if style.base_type == 'wave': # Проверяем тип!
-                coords = self._generate_wave_coords(sx1, sy1, sx2, sy2)
-                smooth_flag = True
-            elif style.base_type == 'zigzag':
-                coords = self._generate_zigzag_coords(sx1, sy1, sx2, sy2)
-                smooth_flag = False
-            
-            if len(coords) >= 4:
-                self.canvas.create_line(*coords, fill=draw_color, width=line_width, capstyle=tk.ROUND, smooth=smooth_flag)
-                return 
-
-        # 2. ПУНКТИРЫ (Умная генерация)
-        if dash_pattern:
-            segments_list = self._generate_dashed_coords(sx1, sy1, sx2, sy2, dash_pattern)
-            for seg in segments_list:
-                self.canvas.create_line(seg[0], seg[1], seg[2], seg[3], 
-                                      fill=draw_color, width=line_width, capstyle=tk.ROUND)
-        
-        # 3. СПЛОШНАЯ
-        else:
-            self.canvas.create_line(sx1, sy1, sx2, sy2, 
-                                  fill=draw_color, width=line_width, capstyle=tk.ROUND)
+                groups.setdefault((kind, resolved.dash_pattern_px, resolved.dash_pattern_world), []).append((coords, key, owner))
+
+        zoom = self.state.zoom
+        chains = self.state.chains
+        for (kind, pattern, pattern_world), members in groups.items():
+            if kind == 'dashed':
+                # Отрезки чертежа - штрихи из таблицы их цепочки (фаза непрерывна вдоль цепочки),
+                # остальные (предпросмотр) - с начала паттерна
+                loose = []
+                for coords, key, owner in members:
+                    if owner == NO_OWNER:
+                        loose.append((coords, key, owner))
+                        continue
+                    sx1, sy1, sx2, sy2 = coords
+                    dx, dy = sx2 - sx1, sy2 - sy1
+                    fractions = chains.dash_fractions(owner, pattern_world)
+                    out = [0.0] * (2 * len(fractions))
+                    out[0::4] = [sx1 + dx*f for f in fractions[0::2]]
+                    out[1::4] = [sy1 + dy*f for f in fractions[0::2]]
+                    out[2::4] = [sx1 + dx*f for f in fractions[1::2]]
+                    out[3::4] = [sy1 + dy*f for f in fractions[1::2]]
+                    dl.add_line_run(out, key, owner)
+                members = loose
+                if not members: continue
+            x1s, y1s, x2s, y2s = zip(*(coords for coords, _, _ in members))
+            # LOD: не больше LOD_MAX_POINTS отсчетов волны/зигзага на отрезок
+            out, offsets = style_geometry(kind, pattern, x1s, y1s, x2s, y2s, zoom, LOD_MAX_POINTS)
+            for i, (_, key, owner) in enumerate(members):
+                part = out[offsets[i]:offsets[i + 1]]
+                if kind == 'dashed':
+                    dl.add_line_run(part, key, owner)
+                else:
+                    dl.add('line', part, key, owner)
+
+    def emit_segment(self, dl, style_name, color, screen_coords, override_color=None, override_width=None,
+                     tags=(), owner=NO_OWNER):
+        """То же для одного отрезка."""
+        self.emit_segments(dl, (style_name,), (color,), (screen_coords,), tags, (owner,),
+                           override_color, override_width)
+
+    def _segments_to_screen(self, segments):
+        """Переводит концы всех отрезков на экран за один пакетный проход."""
+        xs = []; ys = []
+        for seg in segments:
+            xs += (seg.p1.x, seg.p2.x); ys += (seg.p1.y, seg.p2.y)
+        return self._pairs_to_screen(xs, ys)
+
+    def _ids_to_screen(self, seg_ids):
+        """То же для отрезков хранилища: координаты читаются прямо из колонок."""
+        store = self.state.segments
+        x1, y1, x2, y2 = store.x1, store.y1, store.x2, store.y2
+        xs = []; ys = []
+        for i in seg_ids:
+            xs += (x1[i], x2[i]); ys += (y1[i], y2[i])
+        return self._pairs_to_screen(xs, ys)
 
-    def draw_point(self, point, size=4, color='black'):
+    def _pairs_to_screen(self, xs, ys):
+        screen_xs, screen_ys = self.converter.world_to_screen_many(xs, ys)
+        return [(screen_xs[j], screen_ys[j], screen_xs[j + 1], screen_ys[j + 1]) for j in range(0, len(screen_xs), 2)]
+
+    def emit_point(self, dl, point, size=4, color='black'):
         x, y = self.converter.world_to_screen(point.x, point.y)
-        self.canvas.create_oval(x - size, y - size, x + size, y + size, fill=color, outline=color)
+        dl.add('oval', (x - size, y - size, x + size, y + size), (('fill', color), ('outline', color), ('tags', ('overlay',))))
 
-    def render_scene(self):
+    def emit_snap_marker(self, dl):
+        """Маркер объектной привязки: квадрат - конец, треугольник - середина, крест - пересечение,
+        ромб - ближайшая точка, плюс - узел сетки."""
+        snap = self.state.snap_point
+        if snap is None: return
+        x, y = self.converter.world_to_screen(snap.x, snap.y)
+        r = SNAP_MARKER_PX
+        shape_key = (('fill', ''), ('outline', SNAP_MARKER_COLOR), ('width', 2), ('tags', ('snap',)))
+        line_key = _line_key(SNAP_MARKER_COLOR, 2, ('snap',), capstyle=None)
+        if snap.kind == 'endpoint':
+            dl.add('rectangle', (x - r, y - r, x + r, y + r), shape_key)
+        elif snap.kind == 'midpoint':
+            dl.add('polygon', (x, y - r, x + r, y + r, x - r, y + r), shape_key)
+        elif snap.kind == 'nearest':
+            dl.add('polygon', (x, y - r, x + r, y, x, y + r, x - r, y), shape_key)
+        elif snap.kind == 'intersection':
+            dl.add_lines(((x - r, y - r, x + r, y + r), (x - r, y + r, x + r, y - r)), line_key)
+        else:
+            dl.add_lines(((x - r, y, x + r, y), (x, y - r, x, y + r)), line_key)
+
+    def draw_snap_marker(self):
+        """Перерисовывает только маркер привязки - отдельно от кадра (тег 'snap')."""
+        self.canvas.delete('snap')
+        dl = DisplayList()
+        self.emit_snap_marker(dl)
+        self.submitter.submit(dl)
+
+    def get_visible_segments(self):
+        """ID отрезков, чей bounding box попадает в видимую область (с запасом CULL_MARGIN_PX и AGGREGATE_MARGIN_PX)."""
+        rect = self.get_visible_world_rect()
+        if rect is None: return set()
+        min_wx, min_wy, max_wx, max_wy = rect
+        margin = max(CULL_MARGIN_PX, AGGREGATE_MARGIN_PX) / self.state.zoom
+        return self.state.spatial_index.query_rect(min_wx - margin, min_wy - margin, max_wx + margin, max_wy + margin)
+
+    def _segment_signature(self, seg_id):
+        """Все, от чего зависит внешний вид отрезка, кроме камеры. Изменилась подпись - пересоздаем элементы.
+        Уровень LOD тоже входит в подпись: при переходе порога зума отрезок перестраивается.
+        Фаза штрихов в цепочке и число точек волны/зигзага (прореживание LOD_MAX_POINTS) - тоже."""
+        store = self.state.segments
+        style = self.state.line_styles.get(store.get_style(seg_id))
+        style_key = (style.is_main, style.dash_pattern, style.base_type) if style else None
+        x1, y1, x2, y2 = store.coords(seg_id)
+        resolved = self._resolve_style(store.get_style(seg_id))
+        zoom = self.state.zoom
+        screen_length = math.hypot(x2 - x1, y2 - y1) * zoom
+        lod = self._lod_mode(resolved, screen_length)
+        detail = None
+        if lod == 'full':
+            if resolved.kind == 'dashed':
+                # Штрихи зависят и от положения отрезка в цепочке: дорисовали соседа - фаза сдвинулась
+                detail = self.state.chains.phase(seg_id)
+            elif resolved.kind in ('wave', 'zigzag'):
+                # Сменилось число точек ломаной - растягивать старую через canvas.scale нельзя, строим заново
+                detail = polyline_points(resolved.kind, screen_length, zoom, LOD_MAX_POINTS)
+        return ((x1, y1, x2, y2), store.style_ids[seg_id], store.color_ids[seg_id],
+                style_key, self.state.base_thickness_mm, lod, detail)
+
+    def _apply_view_change(self, old_view, new_view):
+        """Переносит уже нарисованные отрезки под новую камеру через canvas.move/scale.
+        Возвращает False, если так сделать нельзя (изменился поворот) и нужна полная перерисовка."""
+        if new_view.rotation != old_view.rotation:
+            return False
+
+        # Экранная точка мирового (0, 0) - центр подобия между старым и новым видом
+        old_ox, old_oy = old_view.e, old_view.f
+        new_ox, new_oy = new_view.e, new_view.f
+
+        factor = new_view.zoom / old_view.zoom
+        if factor != 1.0:
+            # Паттерны (штрихи, волны, изломы) масштабируются с зумом линейно, поэтому scale точен
+            self.canvas.scale('segment', old_ox, old_oy, factor, factor)
+        if new_ox != old_ox or new_oy != old_oy:
+            self.canvas.move('segment', new_ox - old_ox, new_oy - old_oy)
+        return True
+
+    def _aggregate_cell_size(self):
+        """Размер ячейки мелких отрезков в мировых единицах. Это степень двойки, поэтому при небольшом зуме
+        и ячейки, и набор мелких отрезков остаются прежними: их элементы масштабируются вместе с остальными
+        (_apply_view_change), а не строятся заново."""
+        return 2.0 ** math.ceil(math.log2(AGGREGATE_CELL_PX / self.state.zoom))
+
+    def _split_by_detail(self, ids, cell):
+        """Делит отрезки на детальные (не короче ячейки cell, мировые единицы) и мелкие.
+        Длины считаются пакетно через map по колонкам хранилища. Возвращает
+        (множество детальных ID, [ID мелких], x1 мелких, y1 мелких); ID мелких - по возрастанию."""
+        store = self.state.segments
+        ids = sorted(ids)
+        x1s = list(map(store.x1.__getitem__, ids)); y1s = list(map(store.y1.__getitem__, ids))
+        x2s = map(store.x2.__getitem__, ids); y2s = map(store.y2.__getitem__, ids)
+        lengths = map(math.hypot, map(sub, x2s, x1s), map(sub, y2s, y1s))
+        small = bytearray(map(lt, lengths, repeat(cell)))
+        detailed = set(compress(ids, map((1).__sub__, small)))
+        return detailed, list(compress(ids, small)), list(compress(x1s, small)), list(compress(y1s, small))
+
+    @staticmethod
+    def _cell_keys(xs, ys, cell):
+        """Ключи ячеек (ix, iy) для точек."""
+        inv = 1.0 / cell
+        floor = math.floor
+        return zip(map(floor, map(mul, xs, repeat(inv))), map(floor, map(mul, ys, repeat(inv))))
+
+    def _cell_codes(self, seg_ids):
+        """Представители ячеек: (ID, индекс стиля, индекс цвета). Кортежи сравниваются по ID."""
+        store = self.state.segments
+        return zip(seg_ids, map(store.style_ids.__getitem__, seg_ids), map(store.color_ids.__getitem__, seg_ids))
+
+    def _update_detail(self, visible, cell):
+        """Делит видимые отрезки на детальные (self._detailed) и мелкие, раскладывает мелкие по ячейкам
+        (по первой точке) и удаляет элементы ячеек, которые опустели или сменили представителя.
+        Возвращает [(ключ ячейки, код представителя)] для ячеек, которые нужно нарисовать.
+        Если с прошлого кадра не изменились ни данные (SegmentStore.version), ни ячейки, обрабатываются
+        только отрезки, которые вошли в вид или ушли из него; иначе - все видимые."""
+        store = self.state.segments
+        # Толщина по индексу стиля - одна на стиль за кадр
+        widths = [resolved.line_width if resolved else 1
+                  for resolved in map(self._resolve_style, store.style_names)]
+        if cell != self._aggregate_cell or widths != self._aggregate_widths:
+            # Другие ячейки или другие толщины стилей - старые элементы ячеек больше не подходят
+            for canvas_items in self._aggregate_items.values():
+                self.canvas.delete(*canvas_items)
+            self._aggregate_reps = {}
+            self._aggregate_items = {}
+            self._aggregate_cell = cell
+            self._aggregate_widths = widths
+            self._aggregate_version = None
+
+        last = self._aggregate_visible
+        self._aggregate_visible = visible
+        if self._aggregate_version == store.version:
+            entering = visible - last
+            leaving = last - visible
+            # Сдвиг вида меняет немного отрезков по краям; если сменилось больше половины - дешевле пересчитать все
+            if 2 * (len(entering) + len(leaving)) < len(visible):
+                return self._aggregate_step(visible, cell, entering, leaving)
+        self._aggregate_version = store.version
+        return self._aggregate_full(visible, cell)
+
+    def _aggregate_full(self, visible, cell):
+        """Ячейки всех видимых мелких отрезков заново; старые ячейки сравниваются с новыми целиком."""
+        reps, agg = self._aggregate_reps, self._aggregate_items
+        detailed, tiny_ids, tiny_x, tiny_y = self._split_by_detail(visible, cell)
+        self._detailed = detailed
+        # ID идут по возрастанию, поэтому представитель ячейки - отрезок с наибольшим ID (не зависит от порядка обхода)
+        cells = dict(zip(self._cell_keys(tiny_x, tiny_y, cell), self._cell_codes(tiny_ids)))
+
+        # Разница со старыми ячейками - операциями над множествами, без цикла по всем ячейкам
+        changed = list(cells.items() - reps.items())
+        stale = reps.keys() - cells.keys()
+        stale.update(key for key, _ in changed if key in reps)
+        for key in stale:
+            del reps[key]
+            self.canvas.delete(*agg.pop(key))
+        return changed
+
+    def _aggregate_step(self, visible, cell, entering, leaving):
+        """Ячейки обновляются только по вошедшим в вид и ушедшим из него отрезкам (данные не менялись)."""
+        store = self.state.segments
+        detailed, reps = self._detailed, self._aggregate_reps
+        updates = {}  # ключ ячейки -> новый код представителя (None - ячейка опустела)
+
+        # Ушел представитель - убираем ячейку. Его первая точка дальше AGGREGATE_MARGIN_PX от экрана, ячейка не больше
+        # этого запаса, поэтому оставшиеся в ней мелкие отрезки целиком за экраном. Когда ячейка вернется
+        # на экран, представитель снова войдет в вид и станет представителем (он больше всех, кто не уходил)
+        tiny_leaving = [seg_id for seg_id in leaving if seg_id not in detailed]
+        detailed -= leaving
+        xs = map(store.x1.__getitem__, tiny_leaving); ys = map(store.y1.__getitem__, tiny_leaving)
+        for seg_id, key in zip(tiny_leaving, self._cell_keys(xs, ys, cell)):
+            code = updates[key] if key in updates else reps.get(key)
+            if code is not None and code[0] == seg_id:
+                updates[key] = None
+
+        # Вошедший отрезок с большим ID становится представителем своей ячейки
+        new_detailed, tiny_ids, tiny_x, tiny_y = self._split_by_detail(entering, cell)
+        detailed |= new_detailed
+        for key, code in zip(self._cell_keys(tiny_x, tiny_y, cell), self._cell_codes(tiny_ids)):
+            current = updates[key] if key in updates else reps.get(key)
+            if current is None or code > current:
+                updates[key] = code
+
+        changed = []
+        for key, code in updates.items():
+            if reps.get(key) == code: continue
+            if key in reps:
+                del reps[key]
+                self.canvas.delete(*self._aggregate_items.pop(key))
+            if code is not None:
+                changed.append((key, code))
+        return changed
+
+    def _emit_aggregate(self, dl, new_cells):
+        """Представители новых ячеек - сплошными линиями (тег 'segment', чтобы двигаться вместе с отрезками)."""
+        if not new_cells: return
+        store = self.state.segments
+        screen = self._ids_to_screen([code[0] for _, code in new_cells])
+        keys = {}
+        for (_, (seg_id, style_id, color_id)), coords in zip(new_cells, screen):
+            key = keys.get((style_id, color_id))
+            if key is None:
+                width = self._aggregate_widths[style_id]
+                key = keys[style_id, color_id] = _line_key(store.color_names[color_id], width, ('segment', 'aggregate'))
+            dl.add('line', coords, key, seg_id)
+
+    def invalidate(self):
+        """Сбрасывает все удерживаемые элементы - следующий кадр строится с нуля."""
         self.clear()
-        self.draw_grid_and_axes()
-        for seg in self.state.selected_segments:
-            self.draw_segment(seg, override_color='#00FFFF', override_width=max(4, self.state.base_thickness_mm + 6))
-        for segment in self.state.segments:
-            self.draw_segment(segment)
-        if self.state.preview_segment:
-            self.draw_segment(self.state.preview_segment, override_color='blue')
-        if self.state.active_p1: self.draw_point(self.state.active_p1)
-        if self.state.active_p2: self.draw_point(self.state.active_p2)
\ No newline at end of file
+        self._segment_items = {}
+        self._skipped = set()
+        self._aggregate_reps = {}
+        self._aggregate_items = {}
+        self._aggregate_version = None
+        self._signature_inputs = None
+        self._last_view = None
+        self._grid_key = None
+
+    def render_scene(self):
+        # Подсветка выделения, предпросмотр и точки - немногочисленны, их перерисовываем каждый кадр
+        self.canvas.delete('halo', 'overlay')
+        dl = DisplayList()
+        profiler = self.profiler
+        # Цепочки штрихов строятся не дольше бюджета кадра; недостроенные рисуются с фазой 0
+        chains = self.state.chains
+        chains_pending = chains.deferred
+        chains.begin_frame()
+
+        view = self.converter.get_transform()
+        # Слой сетки пересобирается, только если изменились вид, шаг или цвет сетки
+        grid_key = (view, self.state.grid_step, self.state.grid_color)
+        if grid_key != self._grid_key:
+            self.canvas.delete('grid')
+            self.emit_grid_and_axes(dl)
+            self._grid_key = grid_key
+        if profiler is not None: profiler.mark('grid')
+        if self._last_view is not None and view is not self._last_view:
+            if not self._apply_view_change(self._last_view, view):
+                self.canvas.delete('segment')
+                self._segment_items = {}
+                self._skipped = set()
+                self._aggregate_reps = {}
+                self._aggregate_items = {}
+                self._aggregate_version = None
+        self._last_view = view
+
+        visible = self.get_visible_segments()
+
+        # Мелкие отрезки отделяем пакетно (без подписи на каждый) и рисуем ячейками
+        cell = self._aggregate_cell_size()
+        aggregate_new = self._update_detail(visible, cell)
+        detailed = self._detailed
+
+        # Удаляем элементы отрезков, которые ушли из вида, стали мелкими или были удалены из чертежа
+        items = self._segment_items
+        for seg_id in [seg_id for seg_id in items if seg_id not in detailed]:
+            self.canvas.delete(*items.pop(seg_id)[1])
+            self._skipped.discard(seg_id)
+
+        # Создаем только новые и изменившиеся отрезки; подпись считаем только для тех, что рисуются по отдельности.
+        # Если с прошлого кадра камера только сдвинулась, подписи нарисованных отрезков прежние - считаем лишь новые
+        store = self.state.segments
+        signature_inputs = (view.zoom, view.rotation, store.version, self.state.style_cache.generation,
+                            self.state.base_thickness_mm, chains.version)
+        # Пока цепочки достраиваются, проверяем и нарисованные отрезки - им может достаться настоящая фаза
+        moved_only = signature_inputs == self._signature_inputs and not chains_pending
+        self._signature_inputs = signature_inputs
+        to_create = []
+        for seg_id in detailed:
+            entry = items.get(seg_id)
+            if entry is not None and moved_only: continue
+            signature = self._segment_signature(seg_id)
+            if entry is not None:
+                if entry[0] == signature: continue
+                self.canvas.delete(*entry[1])
+            to_create.append((seg_id, signature))
+
+        # Пересечение множеств: не перебираем все выделенное, если его больше, чем видно
+        halos = list(self.state.selected_segments.ids() & visible)
+
+        # Концы всех отрезков кадра (новых и подсвеченных) переводим на экран одним пакетом
+        screen = self._ids_to_screen([seg_id for seg_id, _ in to_create] + halos)
+
+        new_ids = [seg_id for seg_id, _ in to_create]
+        self.emit_segments(dl, list(map(store.get_style, new_ids)), list(map(store.get_color, new_ids)),
+                           screen[:len(new_ids)], tags=('segment',), owners=new_ids)
+        self._emit_aggregate(dl, aggregate_new)
+        if profiler is not None: profiler.mark('segments')
+
+        halo_width = max(4, self.state.base_thickness_mm + 6)
+        self.emit_segments(dl, list(map(store.get_style, halos)), list(map(store.get_color, halos)),
+                           screen[len(new_ids):], tags=('halo',), override_color='#00FFFF', override_width=halo_width)
+        if profiler is not None: profiler.mark('halo')
+        preview = self.state.preview_segment
+        if preview:
+            self.emit_segment(dl, preview.style_name, preview.color, self._segments_to_screen([preview])[0],
+                              override_color='blue', tags=('overlay',))
+        if profiler is not None: profiler.mark('preview')
+        if self.state.active_p1: self.emit_point(dl, self.state.active_p1)
+        if self.state.active_p2: self.emit_point(dl, self.state.active_p2)
+        if profiler is not None: profiler.mark('points')
+
+        # Вся геометрия кадра посчитана - отправляем ее на холст и раздаем элементы отрезкам
+        owned = self.submitter.submit_owned(dl)
+        skipped = self._skipped
+        for seg_id, signature in to_create:
+            canvas_items = owned.get(seg_id)
+            items[seg_id] = (signature, canvas_items or [])
+            if canvas_items: skipped.discard(seg_id)
+            else: skipped.add(seg_id)
+        for key, code in aggregate_new:
+            self._aggregate_reps[key] = code
+            self._aggregate_items[key] = owned.get(code[0], [])
+        self.display_list = dl
+        chains.end_frame()
+
+        self.visible_count = len(visible)
+        self.skipped_count = len(skipped)
+        self.drawn_count = len(detailed) - self.skipped_count
+        self.aggregated_count = len(visible) - len(detailed)
+        self.aggregate_cells = len(self._aggregate_reps)
+        self.culled_count = len(self.state.segments) - len(visible)
+        self.submitted_count = len(dl)
+        if profiler is not None: profiler.mark('submit')
+
+        # Порядок слоев: сетка, подсветка, отрезки, предпросмотр и точки
+        self.canvas.tag_lower('halo')
+        self.canvas.tag_lower('grid')
+        self.canvas.tag_raise('overlay')
+        # Кадр мог сдвинуть вид - маркер привязки ставим заново
+        self.draw_snap_marker()
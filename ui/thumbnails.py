@@ -0,0 +1,101 @@
+# ui/thumbnails.py
+
+'''
+Миниатюры стилей линий (tk.PhotoImage) для списков выбора стиля.
+Образец стиля строится той же функцией emit_style_sample, что и превью, в DisplayList,
+а затем растеризуется сюда без холста (rasterize) - картинка не требует элементов Canvas
+и показывается в меню, в дереве стилей или в надписи без перерисовки при каждом выборе.
+
+ThumbnailCache создает миниатюру при первом запросе и хранит ее вместе с подписью стиля
+(тип, паттерн, основная ли линия, толщина в пикселях). Изменился стиль - изменилась подпись, и пересоздается
+только его миниатюра; остальные остаются как были. Кэш держит ссылки на PhotoImage: Tk удаляет картинку,
+как только на нее не остается ссылок из Python.
+'''
+
+import math
+import tkinter as tk
+from logic.styles import expand_dash_pattern
+from ui.display_list import DisplayList
+from ui.renderer import emit_style_sample
+
+# Размер миниатюры в списках (пиксели) и масштаб образца (пикселей на мм)
+THUMB_WIDTH = 72
+THUMB_HEIGHT = 16
+THUMB_SCALE = 2.5
+
+# Отступ образца от краев картинки по горизонтали (пиксели)
+THUMB_MARGIN = 4
+
+def rasterize(display_list, width, height, ink=(0, 0, 0), paper=(255, 255, 255)):
+    """Растеризует линии DisplayList в данные для PhotoImage.put: строки вида "{#rrggbb ...}".
+    Все команды рисуются цветом ink с толщиной из их опции width; края сглаживаются по расстоянию
+    от центра пикселя до отрезка, концы - круглые (как capstyle='round')."""
+    coverage = [[0.0] * width for _ in range(height)]
+    for kind, coords, options, _ in display_list:
+        if kind != 'line': continue
+        half = float(options.get('width', 1)) / 2
+        reach = half + 0.5
+        for i in range(0, len(coords) - 2, 2):
+            x1, y1, x2, y2 = coords[i:i + 4]
+            dx, dy = x2 - x1, y2 - y1
+            length_sq = dx*dx + dy*dy
+            # Обходим только пиксели рядом с отрезком
+            for py in range(max(0, int(min(y1, y2) - reach)), min(height, int(max(y1, y2) + reach) + 1)):
+                row = coverage[py]
+                cy = py + 0.5
+                for px in range(max(0, int(min(x1, x2) - reach)), min(width, int(max(x1, x2) + reach) + 1)):
+                    cx = px + 0.5
+                    t = ((cx - x1)*dx + (cy - y1)*dy) / length_sq if length_sq else 0.0
+                    t = 0.0 if t < 0 else (1.0 if t > 1 else t)
+                    dist = math.hypot(cx - x1 - dx*t, cy - y1 - dy*t)
+                    value = reach - dist
+                    if value > row[px]:
+                        row[px] = 1.0 if value > 1 else value
+
+    def mix(c):
+        return '#%02x%02x%02x' % tuple(round(p + (i - p) * c) for i, p in zip(ink, paper))
+    return ' '.join('{' + ' '.join(mix(c) for c in row) + '}' for row in coverage)
+
+class ThumbnailCache:
+    def __init__(self, state, width=THUMB_WIDTH, height=THUMB_HEIGHT, scale=THUMB_SCALE):
+        self.state = state
+        self.width = width
+        self.height = height
+        self.scale = scale  # пикселей на мм
+        self._images = {}   # ключ стиля -> (подпись, PhotoImage)
+
+    def _line_width(self, style):
+        s_px = self.state.base_thickness_mm * self.scale
+        return max(1, int(s_px)) if style.is_main else max(1, int(s_px / 2))
+
+    def _signature(self, style):
+        return (style.base_type, expand_dash_pattern(style), style.is_main, self._line_width(style))
+
+    def get(self, style_key):
+        """Миниатюра стиля (PhotoImage) или None, если такого стиля нет."""
+        style = self.state.line_styles.get(style_key)
+        if style is None:
+            self._images.pop(style_key, None)
+            return None
+        signature = self._signature(style)
+        entry = self._images.get(style_key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        line_width = signature[3]
+        dl = DisplayList()
+        # Линию нечетной толщины ставим на центр ряда пикселей, иначе она размажется на два ряда
+        cy = self.height // 2 + (0.5 if line_width % 2 else 0.0)
+        emit_style_sample(dl, style, THUMB_MARGIN, cy, self.width - THUMB_MARGIN, cy, self.scale, line_width)
+        # Старую картинку стиля перерисовываем на месте - виджеты, которые ее показывают, обновятся сами
+        image = entry[1] if entry is not None else tk.PhotoImage(width=self.width, height=self.height)
+        image.put(rasterize(dl, self.width, self.height), to=(0, 0))
+        self._images[style_key] = (signature, image)
+        return image
+
+    def discard(self, style_key=None):
+        """Забывает миниатюру стиля (без аргумента - все миниатюры)."""
+        if style_key is None:
+            self._images.clear()
+        else:
+            self._images.pop(style_key, None)